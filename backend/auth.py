@@ -1,14 +1,19 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import hashlib
 import hmac
 import json
+import time
 from urllib.parse import unquote
 from config import settings
 from database import get_db
@@ -27,6 +32,48 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+class PasswordPoolBusy(Exception):
+    pass
+
+class PasswordPool:
+    """Runs bcrypt on a small dedicated thread pool.
+
+    bcrypt holds a thread for tens of milliseconds; on the event loop that
+    stalls every request on the worker. At most ``max_pending`` calls may be
+    queued or running; beyond that ``run`` fails fast with ``PasswordPoolBusy``
+    instead of letting a login burst queue up without bound.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordPoolBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+password_pool = PasswordPool(
+    workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -44,9 +91,72 @@ def verify_token(token: str) -> Optional[dict]:
     except JWTError:
         return None
 
+@lru_cache(maxsize=4)
+def telegram_secret_key(bot_token: str) -> bytes:
+    """HMAC key for init data checks; derived once per bot token."""
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+class InitDataMemo:
+    """Bounded memo of verified init data, keyed by a digest of the raw string.
+
+    A MiniApp session sends the same init data with every request, so repeats
+    skip parsing and the HMAC. Entries expire ``max_age`` seconds after the
+    init data's ``auth_date``; init data already older than that is verified
+    every time and never memoized.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_age: int = 86400):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(secret_key: bytes, init_data: str) -> bytes:
+        # Bound to the bot token, so rotating it invalidates every entry
+        return hashlib.sha256(secret_key + init_data.encode()).digest()
+
+    def get(self, key: bytes) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    def set(self, key: bytes, auth_date: Optional[str], user: dict):
+        try:
+            expires_at = int(auth_date) + self.max_age
+        except (TypeError, ValueError):
+            return
+        if expires_at <= time.time():
+            return
+        self._entries[key] = (expires_at, dict(user))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+init_data_memo = InitDataMemo(
+    max_entries=settings.telegram_init_data_memo_size,
+    max_age=settings.telegram_init_data_max_age,
+)
+
 def verify_telegram_webapp_data(init_data: str) -> Optional[dict]:
     """Verify Telegram WebApp init data"""
     try:
+        secret_key = telegram_secret_key(settings.telegram_bot_token)
+        memo_key = init_data_memo.key(secret_key, init_data)
+        user_data = init_data_memo.get(memo_key)
+        if user_data is not None:
+            return user_data
+
         # Parse the init data
         data = {}
         for item in init_data.split('&'):
@@ -57,17 +167,7 @@ def verify_telegram_webapp_data(init_data: str) -> Optional[dict]:
         received_hash = data.pop('hash', '')
         
         # Create data check string
-        data_check_arr = []
-        for key in sorted(data.keys()):
-            data_check_arr.append(f"{key}={data[key]}")
-        data_check_string = '\n'.join(data_check_arr)
-        
-        # Create secret key
-        secret_key = hmac.new(
-            "WebAppData".encode(),
-            settings.telegram_bot_token.encode(),
-            hashlib.sha256
-        ).digest()
+        data_check_string = '\n'.join(f"{key}={data[key]}" for key in sorted(data))
         
         # Calculate hash
         calculated_hash = hmac.new(
@@ -77,16 +177,57 @@ def verify_telegram_webapp_data(init_data: str) -> Optional[dict]:
         ).hexdigest()
         
         # Verify hash
-        if calculated_hash == received_hash:
+        if hmac.compare_digest(calculated_hash, received_hash):
             # Parse user data
             if 'user' in data:
                 user_data = json.loads(data['user'])
+                init_data_memo.set(memo_key, data.get('auth_date'), user_data)
                 return user_data
         
         return None
     except Exception:
         return None
 
+SESSION_TOKEN_TYPE = "telegram_session"
+
+class TelegramSession(NamedTuple):
+    user_id: int
+    telegram_id: str
+
+def create_session_token(user_id: int, telegram_id: str, expires_delta: Optional[timedelta] = None) -> str:
+    """Short-lived MiniApp token; carries ``uid``/``tid`` rather than ``sub`` so it is never accepted as an admin token."""
+    return create_access_token(
+        {"typ": SESSION_TOKEN_TYPE, "uid": user_id, "tid": telegram_id},
+        expires_delta or timedelta(minutes=settings.session_token_expire_minutes)
+    )
+
+def verify_session_token(token: str) -> Optional[TelegramSession]:
+    payload = verify_token(token)
+    if payload is None or payload.get("typ") != SESSION_TOKEN_TYPE:
+        return None
+    user_id = payload.get("uid")
+    telegram_id = payload.get("tid")
+    if not isinstance(user_id, int) or not isinstance(telegram_id, str):
+        return None
+    return TelegramSession(user_id, telegram_id)
+
+async def get_telegram_session(x_telegram_session: Optional[str] = Header(None)) -> Optional[TelegramSession]:
+    """MiniApp session from the X-Telegram-Session header, trusted without a DB lookup.
+
+    Returns None when the header is absent so callers can fall back to init
+    data; an invalid or expired token is a 401, telling the client to exchange
+    its init data again.
+    """
+    if not x_telegram_session:
+        return None
+    session = verify_session_token(x_telegram_session)
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired session token"
+        )
+    return session
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db)
@@ -105,8 +246,10 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
     
+    # Served from user_cache: role and is_active changes evict it on every
+    # worker via USER_CHANGED, and cache_user_ttl bounds anything missed
     user = await crud.get_user(db, user_id=user_id)
-    if user is None:
+    if user is None or not user.is_active:
         raise credentials_exception
     
     return user
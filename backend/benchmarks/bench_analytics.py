@@ -0,0 +1,160 @@
+"""Dashboard latency for the sequential vs single-pass concurrent get_analytics_data.
+
+Seeds a synthetic clicks table (millions of rows by default) with generate_series,
+then times both implementations. Run from the backend directory:
+
+    python -m benchmarks.bench_analytics --clicks 2000000 --runs 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from decimal import Decimal
+from typing import Any, Dict
+
+from sqlalchemy import delete, desc, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import models
+from database import AsyncSessionLocal, engine
+
+BENCH_PAGE = "__bench_analytics__"
+
+
+async def legacy_get_analytics_data(db: AsyncSession) -> Dict[str, Any]:
+    """The original implementation: seven sequential queries plus recent orders."""
+    # Total orders
+    total_orders_result = await db.execute(select(func.count(models.Order.id)))
+    total_orders = total_orders_result.scalar()
+    
+    # Total revenue
+    total_revenue_result = await db.execute(select(func.sum(models.Order.paid_amount)))
+    total_revenue = total_revenue_result.scalar() or Decimal('0')
+    
+    # Total clicks
+    total_clicks_result = await db.execute(select(func.count(models.Click.id)))
+    total_clicks = total_clicks_result.scalar()
+    
+    # Unique visitors (count of unique user_ids + unique ip_addresses for non-logged users)
+    unique_users_result = await db.execute(select(func.count(func.distinct(models.Click.user_id))))
+    unique_users = unique_users_result.scalar() or 0
+    
+    unique_ips_result = await db.execute(
+        select(func.count(func.distinct(models.Click.ip_address)))
+        .where(models.Click.user_id.is_(None))
+    )
+    unique_ips = unique_ips_result.scalar() or 0
+    
+    unique_visitors = unique_users + unique_ips
+    
+    # Total page views (count of all page views)
+    page_views_result = await db.execute(
+        select(func.count(models.Click.id))
+        .where(models.Click.action == 'page_view')
+    )
+    total_page_views = page_views_result.scalar() or 0
+    
+    # Conversion rate
+    conversion_rate = (total_orders / total_clicks * 100) if total_clicks > 0 else 0
+    
+    # Top products
+    top_products_result = await db.execute(
+        select(
+            models.Product.name,
+            func.count(models.Order.id).label('order_count'),
+            func.sum(models.Order.paid_amount).label('revenue')
+        )
+        .join(models.Order)
+        .group_by(models.Product.id, models.Product.name)
+        .order_by(desc('order_count'))
+        .limit(5)
+    )
+    top_products = [
+        {
+            'name': row.name,
+            'order_count': row.order_count,
+            'revenue': float(row.revenue or 0)
+        }
+        for row in top_products_result.fetchall()
+    ]
+    
+    # Recent orders
+    recent_orders = await crud.get_orders(db, limit=10)
+    
+    return {
+        'total_orders': total_orders,
+        'total_revenue': float(total_revenue),
+        'total_clicks': total_clicks,
+        'unique_visitors': unique_visitors,
+        'total_page_views': total_page_views,
+        'conversion_rate': round(conversion_rate, 2),
+        'top_products': top_products,
+        'recent_orders': recent_orders
+    }
+
+
+async def seed(clicks: int):
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                """
+                INSERT INTO clicks (page, action, ip_address, user_agent, created_at)
+                SELECT :page,
+                       CASE WHEN g % 3 = 0 THEN 'page_view' ELSE 'click' END,
+                       '10.' || (g % 250) || '.' || (g / 250 % 250) || '.' || (g % 97),
+                       'bench',
+                       now() - (g % 525600) * interval '1 minute'
+                FROM generate_series(1, :n) AS g
+                """
+            ),
+            {"page": BENCH_PAGE, "n": clicks},
+        )
+        await conn.execute(text("ANALYZE clicks"))
+
+
+async def time_runs(label: str, runs: int, fn) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - started)
+    median = statistics.median(samples)
+    print(f"{label:<12} median {median * 1000:8.1f} ms  (min {min(samples) * 1000:.1f} ms)")
+    return median
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clicks", type=int, default=2_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    args = parser.parse_args()
+
+    engine.echo = False
+    print(f"Seeding {args.clicks:,} clicks...")
+    await seed(args.clicks)
+
+    async def legacy():
+        async with AsyncSessionLocal() as db:
+            await legacy_get_analytics_data(db)
+
+    async def current():
+        async with AsyncSessionLocal() as db:
+            await crud.get_analytics_data(db, session_factory=AsyncSessionLocal)
+
+    try:
+        await current()  # warm the pool and the buffer cache
+        before = await time_runs("sequential", args.runs, legacy)
+        after = await time_runs("concurrent", args.runs, current)
+        print(f"speedup      {before / after:.1f}x")
+    finally:
+        if not args.keep:
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(models.Click).where(models.Click.page == BENCH_PAGE))
+                await db.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
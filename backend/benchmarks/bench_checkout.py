@@ -0,0 +1,114 @@
+"""Checkout latency under concurrency: the old multi-transaction path vs crud.checkout.
+
+"legacy" replays what create_order used to do: look the user up, create it
+(commit + refresh), load the product, insert the order (commit + refresh).
+"checkout" is one upsert plus one INSERT ... SELECT ... RETURNING and a single
+commit. Every checkout uses a fresh Telegram id and the lookup caches are
+cleared first, so neither path gets cache hits. Run from the backend directory:
+
+    python -m benchmarks.bench_checkout --orders 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import delete, select
+
+import crud
+import models
+import schemas
+from database import AsyncSessionLocal, engine
+from services.cache import clear_caches
+
+BENCH_PREFIX = "bench-checkout-"
+
+
+async def legacy_checkout(db, order: schemas.OrderCreate, telegram_id: str, profile: schemas.UserUpdate):
+    result = await db.execute(select(models.User).where(models.User.telegram_id == telegram_id))
+    user = result.scalar_one_or_none()
+    if user is None:
+        user = models.User(telegram_id=telegram_id, **profile.dict(exclude_unset=True))
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+    result = await db.execute(select(models.Product).where(models.Product.id == order.product_id))
+    product = result.scalar_one()
+    db_order = models.Order(
+        user_id=user.id,
+        product_id=product.id,
+        payment_type=order.payment_type,
+        total_amount=product.installment_price if order.payment_type == models.PaymentType.INSTALLMENT else product.price,
+        installment_months=order.installment_months
+    )
+    if order.payment_type == models.PaymentType.INSTALLMENT and order.installment_months:
+        db_order.next_payment_date = datetime.utcnow() + timedelta(days=30)
+    db.add(db_order)
+    await db.commit()
+    await db.refresh(db_order)
+    return db_order
+
+
+async def run(label: str, fn, product_id: int, orders: int, concurrency: int, offset: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    order = schemas.OrderCreate(product_id=product_id, payment_type=models.PaymentType.FULL)
+    samples = []
+
+    async def one(i: int):
+        profile = schemas.UserUpdate(username=f"bench{i}", first_name="Bench")
+        async with semaphore:
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                await fn(db, order, f"{BENCH_PREFIX}{offset + i}", profile)
+            samples.append(time.perf_counter() - started)
+
+    clear_caches()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(orders)))
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{label:<9} {orders / elapsed:8,.0f} orders/s  "
+        f"p50 {statistics.median(samples) * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms"
+    )
+    return statistics.median(samples)
+
+
+async def cleanup(product_id: int):
+    async with AsyncSessionLocal() as db:
+        user_ids = select(models.User.id).where(models.User.telegram_id.like(f"{BENCH_PREFIX}%"))
+        await db.execute(delete(models.Order).where(models.Order.user_id.in_(user_ids)))
+        await db.execute(delete(models.User).where(models.User.telegram_id.like(f"{BENCH_PREFIX}%")))
+        await db.execute(delete(models.Product).where(models.Product.id == product_id))
+        await db.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    args = parser.parse_args()
+
+    engine.echo = False
+    async with AsyncSessionLocal() as db:
+        product = models.Product(name="Bench checkout", type=models.ProductType.COURSE, price=Decimal("100.00"))
+        db.add(product)
+        await db.commit()
+        product_id = product.id
+
+    try:
+        legacy = await run("legacy", legacy_checkout, product_id, args.orders, args.concurrency, 0)
+        single = await run("checkout", crud.checkout, product_id, args.orders, args.concurrency, args.orders)
+        print(f"p50 speedup {legacy / single:.1f}x")
+    finally:
+        if not args.keep:
+            await cleanup(product_id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
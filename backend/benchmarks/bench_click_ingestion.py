@@ -0,0 +1,79 @@
+"""Clicks/sec for direct per-click inserts vs the write-behind click buffer.
+
+Run from the backend directory against the configured database:
+
+    python -m benchmarks.bench_click_ingestion --clicks 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import delete
+
+import crud
+import models
+import schemas
+from database import AsyncSessionLocal, engine
+from services.click_buffer import ClickBuffer
+
+BENCH_PAGE = "__bench_click_ingestion__"
+
+
+async def run_direct(clicks: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    click = schemas.ClickCreate(page=BENCH_PAGE, action="page_view")
+
+    async def one():
+        async with semaphore:
+            async with AsyncSessionLocal() as db:
+                await crud.create_click(db, click=click, ip_address="127.0.0.1", user_agent="bench")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(clicks)))
+    return time.perf_counter() - started
+
+
+async def run_buffered(clicks: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    buffer = ClickBuffer(AsyncSessionLocal, max_size=clicks, batch_size=500, flush_interval=0.5)
+    await buffer.start()
+
+    async def one():
+        async with semaphore:
+            await buffer.put(page=BENCH_PAGE, action="page_view", ip_address="127.0.0.1", user_agent="bench")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(clicks)))
+    accepted = time.perf_counter() - started
+    await buffer.stop()
+    persisted = time.perf_counter() - started
+    print(f"  buffered: accepted in {accepted:.3f}s, persisted in {persisted:.3f}s")
+    return persisted
+
+
+async def cleanup():
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(models.Click).where(models.Click.page == BENCH_PAGE))
+        await db.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clicks", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    engine.echo = False
+    try:
+        direct = await run_direct(args.clicks, args.concurrency)
+        print(f"direct:   {args.clicks / direct:,.0f} clicks/sec ({direct:.3f}s)")
+        buffered = await run_buffered(args.clicks, args.concurrency)
+        print(f"buffered: {args.clicks / buffered:,.0f} clicks/sec ({buffered:.3f}s)")
+        print(f"speedup:  {direct / buffered:.1f}x")
+    finally:
+        await cleanup()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
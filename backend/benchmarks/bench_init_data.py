@@ -0,0 +1,69 @@
+"""Telegram init data verifications/sec: full check vs memoized repeat.
+
+Needs no database. "cold" verifies distinct init data strings (parse, sort,
+HMAC each time); "memoized" re-verifies the same strings, as a MiniApp
+session does on every request. Run from the backend directory:
+
+    python -m benchmarks.bench_init_data --sessions 1000 --rounds 20
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import quote
+
+from auth import init_data_memo, verify_telegram_webapp_data
+from config import settings
+
+BENCH_TOKEN = "123456:bench-token"
+
+
+def signed_init_data(telegram_id: int) -> str:
+    data = {
+        "auth_date": str(int(time.time())),
+        "query_id": f"AAH{telegram_id}",
+        "user": json.dumps(
+            {"id": telegram_id, "first_name": "Bench", "username": f"bench{telegram_id}", "language_code": "en"},
+            separators=(",", ":"),
+        ),
+    }
+    data_check_string = "\n".join(f"{k}={data[k]}" for k in sorted(data))
+    secret_key = hmac.new(b"WebAppData", BENCH_TOKEN.encode(), hashlib.sha256).digest()
+    signature = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return "&".join([f"{quote(k)}={quote(v)}" for k, v in data.items()] + [f"hash={signature}"])
+
+
+def rate(label: str, samples, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for init_data in samples:
+            assert verify_telegram_webapp_data(init_data) is not None
+    elapsed = time.perf_counter() - started
+    per_second = len(samples) * rounds / elapsed
+    print(f"{label:<10} {per_second:12,.0f} verifications/s  ({elapsed / (len(samples) * rounds) * 1e6:.2f} us each)")
+    return per_second
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1000, help="distinct init data strings")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    settings.telegram_bot_token = BENCH_TOKEN
+    samples = [signed_init_data(100_000 + i) for i in range(args.sessions)]
+
+    init_data_memo.max_entries = 0  # memo disabled: every call does the full check
+    cold = rate("cold", samples, args.rounds)
+
+    init_data_memo.max_entries = max(args.sessions, 1)
+    init_data_memo.clear()
+    for init_data in samples:
+        verify_telegram_webapp_data(init_data)
+    memoized = rate("memoized", samples, args.rounds)
+    print(f"speedup {memoized / cold:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
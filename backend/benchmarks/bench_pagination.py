@@ -0,0 +1,107 @@
+"""Latency of page 1 vs a deep page of /api/analytics/clicks, OFFSET vs keyset cursor.
+
+Seeds a synthetic clicks table with generate_series, makes sure the
+(created_at, id) index exists, then times crud.get_clicks both ways. Run from
+the backend directory:
+
+    python -m benchmarks.bench_pagination --clicks 1000000 --page 1000 --limit 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import delete, select, text
+
+import crud
+import models
+from database import AsyncSessionLocal, engine
+
+BENCH_PAGE = "__bench_pagination__"
+
+
+async def seed(clicks: int):
+    async with engine.begin() as conn:
+        for index in models.Click.__table__.indexes:
+            await conn.run_sync(lambda sync_conn, index=index: index.create(sync_conn, checkfirst=True))
+        await conn.execute(
+            text(
+                """
+                INSERT INTO clicks (page, action, ip_address, user_agent, created_at)
+                SELECT :page, 'page_view', '10.0.0.1', 'bench', now() - g * interval '1 second'
+                FROM generate_series(1, :n) AS g
+                """
+            ),
+            {"page": BENCH_PAGE, "n": clicks},
+        )
+        await conn.execute(text("ANALYZE clicks"))
+
+
+async def cursor_for_page(page: int, limit: int):
+    """Cursor a client would hold after walking to ``page``: the sort key of the previous page's last row."""
+    if page <= 1:
+        return None
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.Click.created_at, models.Click.id)
+            .order_by(models.Click.created_at.desc(), models.Click.id.desc())
+            .offset((page - 1) * limit - 1)
+            .limit(1)
+        )
+        return tuple(result.one())
+
+
+async def time_runs(label: str, runs: int, fn) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - started)
+    median = statistics.median(samples)
+    print(f"{label:<22} median {median * 1000:8.2f} ms  (min {min(samples) * 1000:.2f} ms)")
+    return median
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clicks", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    args = parser.parse_args()
+
+    engine.echo = False
+    print(f"Seeding {args.clicks:,} clicks...")
+    await seed(args.clicks)
+    deep_cursor = await cursor_for_page(args.page, args.limit)
+
+    def offset_page(page: int):
+        async def run():
+            async with AsyncSessionLocal() as db:
+                await crud.get_clicks(db, skip=(page - 1) * args.limit, limit=args.limit)
+        return run
+
+    def cursor_page(cursor):
+        async def run():
+            async with AsyncSessionLocal() as db:
+                await crud.get_clicks(db, limit=args.limit, cursor=cursor)
+        return run
+
+    try:
+        await offset_page(1)()  # warm the pool and the buffer cache
+        first = await time_runs("offset page 1", args.runs, offset_page(1))
+        deep_offset = await time_runs(f"offset page {args.page}", args.runs, offset_page(args.page))
+        await time_runs("cursor page 1", args.runs, cursor_page(None))
+        deep_keyset = await time_runs(f"cursor page {args.page}", args.runs, cursor_page(deep_cursor))
+        print(f"page {args.page} / page 1: offset {deep_offset / first:.1f}x, cursor {deep_keyset / first:.1f}x")
+    finally:
+        if not args.keep:
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(models.Click).where(models.Click.page == BENCH_PAGE))
+                await db.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""Provider call latency: a new aiohttp session per call vs the pooled PaymentAdapter.
+
+Needs no database or provider account. A local aiohttp app stands in for the
+provider's payment_intents endpoint. "per-call" opens and closes a
+ClientSession for every request, as PaymentAdapter used to, so each call
+pays TCP (and with --tls, TLS) setup; "pooled" goes through
+get_payment_adapter(), whose session keeps connections alive. --tls serves
+HTTPS with a throwaway self-signed certificate (needs the openssl CLI). Run
+from the backend directory:
+
+    python -m benchmarks.bench_payment_adapter --calls 2000 --concurrency 10 --tls
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+from config import settings
+
+
+def self_signed_cert(directory: str):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+            "-keyout", key, "-out", cert,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+async def start_fake_provider(latency: float, cert: str = None, key: str = None):
+    import ssl
+    from aiohttp import web
+
+    async def get_intent(request):
+        if latency:
+            await asyncio.sleep(latency)
+        return web.json_response({"id": request.match_info["payment_id"], "status": "succeeded"})
+
+    app = web.Application()
+    app.router.add_get("/payment_intents/{payment_id}", get_intent)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    ssl_context = None
+    if cert:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(cert, key)
+    site = web.TCPSite(runner, "127.0.0.1", 0, ssl_context=ssl_context)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"{'https' if cert else 'http'}://127.0.0.1:{port}"
+
+
+async def per_call_get_payment(adapter, payment_id: str):
+    import aiohttp
+
+    headers = {"Authorization": adapter._get_auth_header(), "Content-Type": "application/json"}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{adapter.base_url}/payment_intents/{payment_id}", headers=headers) as response:
+            return await response.json()
+
+
+async def run(label: str, fn, calls: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await fn(f"pi_{i}")
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{label:<9} {calls / elapsed:8,.0f} calls/s  "
+        f"p50 {statistics.median(samples) * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms"
+    )
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated provider processing time")
+    parser.add_argument("--tls", action="store_true", help="serve HTTPS with a self-signed certificate")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert = key = None
+        if args.tls:
+            cert, key = self_signed_cert(directory)
+            # aiohttp builds its verifying SSL context on import, so trust the cert first
+            os.environ["SSL_CERT_FILE"] = cert
+        from services.payment_adapter import close_payment_adapter, get_payment_adapter
+
+        settings.payment_api_key = getattr(settings, "payment_api_key", None) or "sk_bench"
+        runner, base_url = await start_fake_provider(args.latency_ms / 1000, cert, key)
+        adapter = get_payment_adapter()
+        adapter.base_url = base_url
+        try:
+            per_call = await run("per-call", lambda pid: per_call_get_payment(adapter, pid), args.calls, args.concurrency)
+            pooled = await run("pooled", adapter.get_payment, args.calls, args.concurrency)
+            print(f"saved per call (p50) {(per_call - pooled) * 1000:.2f} ms, {per_call / pooled:.1f}x")
+        finally:
+            await close_payment_adapter()
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -13,15 +13,35 @@ class Settings(BaseSettings):
     secret_key: str = "your-super-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    session_token_expire_minutes: int = 15  # MiniApp session tokens are trusted without a user lookup until they expire
 
     # YooKassa
     yookassa_shop_id: Optional[str] = None
     yookassa_secret_key: Optional[str] = None
     yookassa_webhook_url: Optional[str] = ""
 
+    # Payment provider HTTP client (one pooled session per process)
+    payment_http_pool_size: int = 100
+    payment_http_pool_size_per_host: int = 20
+    payment_http_keepalive_timeout: float = 30.0  # seconds an idle connection is kept open
+    payment_http_dns_cache_ttl: int = 300  # seconds
+    payment_http_connect_timeout: float = 5.0
+    payment_http_read_timeout: float = 20.0
+    payment_http_total_timeout: float = 30.0
+
     # Telegram
     telegram_bot_token: Optional[str] = None
     telegram_admin_chat_id: Optional[str] = None
+    telegram_init_data_max_age: int = 86400  # seconds after auth_date a verified init data stays memoized
+    telegram_init_data_memo_size: int = 10000
+    telegram_global_rate_per_second: float = 25.0  # Bot API allows about 30 messages/s overall
+    telegram_chat_rate_per_minute: float = 20.0  # and 20/min into a group chat
+    telegram_chat_burst: int = 3
+    telegram_coalesce_window: float = 1.0  # seconds same-kind notifications wait to be merged into a digest
+    telegram_digest_max_lines: int = 30
+    telegram_send_max_attempts: int = 5  # sends per message, counting resends after 429
+    telegram_http_pool_size: int = 20
+    telegram_http_timeout: float = 15.0  # seconds
 
     # App Settings
     app_name: str = "AI Store"
@@ -36,6 +56,90 @@ class Settings(BaseSettings):
         "*"  # Allow all during development
     ]
 
+    # Click ingestion (write-behind buffer)
+    click_buffer_enabled: bool = True
+    click_buffer_max_size: int = 10000
+    click_buffer_batch_size: int = 500
+    click_buffer_flush_interval: float = 1.0  # seconds
+    click_buffer_put_timeout: float = 0.05  # seconds to wait for room before rejecting
+    click_buffer_max_attempts: int = 5  # per batch while the database is unreachable
+    click_buffer_retry_base: float = 0.5  # seconds, doubled per attempt
+    click_buffer_retry_max: float = 30.0
+    click_batch_max_events: int = 500
+    click_batch_max_bytes: int = 1024 * 1024
+
+    # Analytics rollups
+    rollup_refresh_enabled: bool = True
+    rollup_refresh_interval: float = 60.0  # seconds
+    rollup_settle_seconds: int = 30
+    unique_visitors_exact_max_hours: int = 24  # ranges up to this length are counted exactly
+    timeseries_max_buckets: int = 10000
+
+    # Catalog cache
+    catalog_cache_max_entries: int = 512
+    catalog_cache_control: str = "public, max-age=30"
+
+    # Dashboard snapshot cache
+    dashboard_cache_ttl: float = 30.0  # seconds
+    dashboard_cache_refresh_ahead: float = 5.0  # recompute in the background this long before expiry
+    dashboard_cache_max_entries: int = 64
+
+    # Funnel cache
+    funnel_cache_max_entries: int = 256
+    funnel_cache_open_ttl: float = 60.0  # seconds, for windows that are still open
+    funnel_cache_closed_ttl: float = 3600.0  # seconds, for windows in the past
+
+    # Analytics warehouse (Parquet snapshots queried with DuckDB)
+    warehouse_enabled: bool = False
+    warehouse_dir: str = "warehouse"
+    warehouse_export_interval: float = 300.0  # seconds
+    warehouse_export_batch_size: int = 10000
+    warehouse_max_concurrent_queries: int = 2
+    warehouse_duckdb_threads: int = 2
+    warehouse_duckdb_memory_limit: str = "512MB"
+
+    # Admin exports
+    export_batch_size: int = 1000  # rows fetched per server-side cursor round trip
+
+    # Cache invalidation bus
+    invalidation_backend: str = "redis"  # "redis", or "memory" for a single process
+    invalidation_channel: str = "ai_store:invalidate"
+    invalidation_fallback_ttl: float = 30.0  # seconds; local caches are flushed this often while Redis is down
+
+    # Lookup caches (products and users by id / Telegram id)
+    cache_enabled: bool = True
+    cache_redis_enabled: bool = False  # share cached rows between workers through Redis
+    cache_local_max_entries: int = 10000  # per namespace
+    cache_product_ttl: float = 300.0  # seconds
+    cache_user_ttl: float = 60.0  # seconds
+
+    # Login protection
+    login_ip_rate_per_minute: float = 10.0
+    login_ip_burst: int = 10
+    login_email_rate_per_minute: float = 5.0
+    login_email_burst: int = 5
+    password_hash_workers: int = 2  # threads dedicated to bcrypt
+    password_hash_max_pending: int = 8  # bcrypt calls queued or running before logins get 503
+
+    # Payment webhooks (stored on receipt, processed by background workers)
+    webhook_queue_enabled: bool = True  # False processes events inside the webhook request
+    webhook_workers: int = 4
+    webhook_poll_interval: float = 1.0  # seconds between polls when no event is due
+    webhook_lease_seconds: float = 60.0  # a claimed event is retried if not finished within this
+    webhook_max_attempts: int = 8
+    webhook_retry_base: float = 2.0  # seconds before the first retry, doubled per attempt
+    webhook_retry_max: float = 300.0
+
+    # Transactional outbox (notifications delivered after the state change commits)
+    outbox_dispatcher_enabled: bool = True
+    outbox_batch_size: int = 100  # messages claimed per round
+    outbox_concurrency: int = 100  # deliveries in flight per batch; Telegram sends are rate limited downstream
+    outbox_poll_interval: float = 1.0  # seconds
+    outbox_lease_seconds: float = 60.0
+    outbox_max_attempts: int = 10
+    outbox_retry_base: float = 5.0  # seconds before the first retry, doubled per attempt
+    outbox_retry_max: float = 900.0
+
     # Tuna.am
     tuna_subdomain: Optional[str] = None
 
@@ -1,17 +1,62 @@
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, desc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import select, insert, update, delete, func, and_, or_, case, desc, literal, literal_column, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import List, NamedTuple, Optional, Dict, Any, AsyncIterator, Iterable, Sequence, Tuple
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+import asyncio
+from config import settings
+from services.hyperloglog import HyperLogLog
+from pagination import Cursor, paginate
+from services.dashboard_cache import dashboard_cache
+from services.invalidation import invalidation_bus, PRODUCT_CHANGED, USER_CHANGED, ORDER_CHANGED
+from services.cache import cached, create_cache, invalidate_cached
+from database import after_commit, in_unit_of_work
 import models
 import schemas
 
+# Lookup caches: rows come back detached, so callers must not rely on lazy relationships
+product_cache = create_cache("product", models.Product, ttl=settings.cache_product_ttl)
+user_cache = create_cache("user", models.User, ttl=settings.cache_user_ttl)
+user_by_telegram_id_cache = create_cache("user_by_telegram_id", models.User, ttl=settings.cache_user_ttl)
+# Writes on other workers arrive over the bus; only this process's tier needs evicting
+invalidation_bus.subscribe(PRODUCT_CHANGED, lambda event: product_cache.invalidate_local(event.id))
+for _cache in (user_cache, user_by_telegram_id_cache):
+    invalidation_bus.subscribe(USER_CHANGED, lambda event, cache=_cache: cache.invalidate_local(event.id))
+
+_CHANGE_MODELS = {PRODUCT_CHANGED: models.Product, USER_CHANGED: models.User}
+
+def _changed(kind: str, obj_id: Optional[int]):
+    """After-commit callback: evict the row from the lookup caches and tell every worker."""
+    async def publish():
+        model = _CHANGE_MODELS.get(kind)
+        if model is not None and obj_id is not None:
+            await invalidate_cached(model, obj_id)
+        invalidation_bus.publish(kind, obj_id)
+    return publish
+
+async def _commit(db: AsyncSession, *on_commit):
+    """Finish a write. Inside a request's unit of work (see ``database.get_db``)
+    only flush, as the request commits once at the end; otherwise commit now.
+    ``on_commit`` callbacks run once the data is committed either way."""
+    if in_unit_of_work(db):
+        await db.flush()
+        for callback in on_commit:
+            after_commit(db, callback)
+    else:
+        await db.commit()
+        for callback in on_commit:
+            await callback()
+
 # User CRUD
+@cached(user_cache, key="user_id")
 async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
     result = await db.execute(select(models.User).where(models.User.id == user_id))
     return result.scalar_one_or_none()
 
+@cached(user_by_telegram_id_cache, key="telegram_id")
 async def get_user_by_telegram_id(db: AsyncSession, telegram_id: str) -> Optional[models.User]:
     result = await db.execute(select(models.User).where(models.User.telegram_id == telegram_id))
     return result.scalar_one_or_none()
@@ -23,8 +68,43 @@ async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.Use
 async def create_user(db: AsyncSession, user: schemas.UserCreate) -> models.User:
     db_user = models.User(**user.dict())
     db.add(db_user)
-    await db.commit()
-    await db.refresh(db_user)
+    await db.flush()
+    await _commit(db, _changed(USER_CHANGED, db_user.id))
+    return db_user
+
+async def _upsert_telegram_user(db: AsyncSession, telegram_id: str, profile: schemas.UserUpdate) -> Tuple[models.User, bool]:
+    """Return the user for a Telegram id and whether the row was written.
+
+    A locally cached user with the same profile costs no query; otherwise one
+    INSERT ... ON CONFLICT (telegram_id) DO UPDATE ... RETURNING. Not committed.
+    """
+    fields = profile.dict(exclude_unset=True)
+    cached_user = user_by_telegram_id_cache.peek(telegram_id)
+    if cached_user is not None and all(getattr(cached_user, field) == value for field, value in fields.items()):
+        return cached_user, False
+
+    stmt = pg_insert(models.User).values(telegram_id=telegram_id, **fields)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.User.telegram_id],
+        set_={field: stmt.excluded[field] for field in fields} or {"telegram_id": stmt.excluded.telegram_id}
+    ).returning(models.User)
+    result = await db.execute(stmt, execution_options={"populate_existing": True})
+    return result.scalar_one(), True
+
+def _user_written(db_user: models.User):
+    publish = _changed(USER_CHANGED, db_user.id)
+
+    async def on_commit():
+        await publish()
+        user_cache.put(db_user.id, db_user)
+        user_by_telegram_id_cache.put(db_user.telegram_id, db_user)
+    return on_commit
+
+async def upsert_telegram_user(db: AsyncSession, telegram_id: str, profile: schemas.UserUpdate) -> models.User:
+    """Get the user for a Telegram id, creating it or refreshing its profile as needed."""
+    db_user, written = await _upsert_telegram_user(db, telegram_id, profile)
+    if written:
+        await _commit(db, _user_written(db_user))
     return db_user
 
 async def update_user(db: AsyncSession, user_id: int, user_update: schemas.UserUpdate) -> Optional[models.User]:
@@ -33,19 +113,19 @@ async def update_user(db: AsyncSession, user_id: int, user_update: schemas.UserU
     if db_user:
         for field, value in user_update.dict(exclude_unset=True).items():
             setattr(db_user, field, value)
-        await db.commit()
-        await db.refresh(db_user)
+        await _commit(db, _changed(USER_CHANGED, user_id))
     return db_user
 
 # Product CRUD
-async def get_products(db: AsyncSession, skip: int = 0, limit: int = 100, active_only: bool = True) -> List[models.Product]:
+async def get_products(db: AsyncSession, skip: int = 0, limit: int = 100, active_only: bool = True, cursor: Optional[Cursor] = None) -> List[models.Product]:
     query = select(models.Product)
     if active_only:
         query = query.where(models.Product.is_active == True)
-    query = query.offset(skip).limit(limit).order_by(models.Product.created_at.desc())
+    query = paginate(query, models.Product, skip=skip, limit=limit, cursor=cursor)
     result = await db.execute(query)
     return result.scalars().all()
 
+@cached(product_cache, key="product_id")
 async def get_product(db: AsyncSession, product_id: int) -> Optional[models.Product]:
     result = await db.execute(select(models.Product).where(models.Product.id == product_id))
     return result.scalar_one_or_none()
@@ -53,8 +133,8 @@ async def get_product(db: AsyncSession, product_id: int) -> Optional[models.Prod
 async def create_product(db: AsyncSession, product: schemas.ProductCreate) -> models.Product:
     db_product = models.Product(**product.dict())
     db.add(db_product)
-    await db.commit()
-    await db.refresh(db_product)
+    await db.flush()
+    await _commit(db, _changed(PRODUCT_CHANGED, db_product.id))
     return db_product
 
 async def update_product(db: AsyncSession, product_id: int, product_update: schemas.ProductUpdate) -> Optional[models.Product]:
@@ -63,8 +143,7 @@ async def update_product(db: AsyncSession, product_id: int, product_update: sche
     if db_product:
         for field, value in product_update.dict(exclude_unset=True).items():
             setattr(db_product, field, value)
-        await db.commit()
-        await db.refresh(db_product)
+        await _commit(db, _changed(PRODUCT_CHANGED, product_id))
     return db_product
 
 async def delete_product(db: AsyncSession, product_id: int) -> bool:
@@ -72,19 +151,19 @@ async def delete_product(db: AsyncSession, product_id: int) -> bool:
     db_product = result.scalar_one_or_none()
     if db_product:
         db_product.is_active = False
-        await db.commit()
+        await _commit(db, _changed(PRODUCT_CHANGED, product_id))
         return True
     return False
 
 # Order CRUD
-async def get_orders(db: AsyncSession, skip: int = 0, limit: int = 100, user_id: Optional[int] = None) -> List[models.Order]:
+async def get_orders(db: AsyncSession, skip: int = 0, limit: int = 100, user_id: Optional[int] = None, cursor: Optional[Cursor] = None) -> List[models.Order]:
     query = select(models.Order).options(
         selectinload(models.Order.user),
         selectinload(models.Order.product)
     )
     if user_id:
         query = query.where(models.Order.user_id == user_id)
-    query = query.offset(skip).limit(limit).order_by(models.Order.created_at.desc())
+    query = paginate(query, models.Order, skip=skip, limit=limit, cursor=cursor)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -100,28 +179,43 @@ async def get_order(db: AsyncSession, order_id: int) -> Optional[models.Order]:
     )
     return result.scalar_one_or_none()
 
-async def create_order(db: AsyncSession, order: schemas.OrderCreate, user_id: int) -> models.Order:
-    # Get product to calculate total amount
-    product = await get_product(db, order.product_id)
-    if not product:
+async def create_order(db: AsyncSession, order: schemas.OrderCreate, user_id: int, user: Optional[models.User] = None) -> models.Order:
+    """Insert an order priced from the product row in one INSERT ... SELECT ... RETURNING, then commit.
+
+    ``user`` and ``product`` are attached from the lookup caches for the
+    response; pass ``user`` when the caller already has it.
+    """
+    installment = order.payment_type == models.PaymentType.INSTALLMENT
+    next_payment_date = datetime.utcnow() + timedelta(days=30) if installment and order.installment_months else None
+    columns = models.Order.__table__.c
+    priced = select(
+        literal(user_id, columns.user_id.type),
+        models.Product.id,
+        literal(order.payment_type, columns.payment_type.type),
+        models.Product.installment_price if installment else models.Product.price,
+        literal(order.installment_months, columns.installment_months.type),
+        literal(next_payment_date, columns.next_payment_date.type)
+    ).where(models.Product.id == order.product_id)
+    stmt = insert(models.Order).from_select(
+        ["user_id", "product_id", "payment_type", "total_amount", "installment_months", "next_payment_date"],
+        priced
+    ).returning(models.Order)
+    db_order = (await db.execute(stmt)).scalar_one_or_none()
+    if db_order is None:
         raise ValueError("Product not found")
-    
-    total_amount = product.installment_price if order.payment_type == models.PaymentType.INSTALLMENT else product.price
-    
-    db_order = models.Order(
-        user_id=user_id,
-        product_id=order.product_id,
-        payment_type=order.payment_type,
-        total_amount=total_amount,
-        installment_months=order.installment_months
-    )
-    
-    if order.payment_type == models.PaymentType.INSTALLMENT and order.installment_months:
-        db_order.next_payment_date = datetime.utcnow() + timedelta(days=30)
-    
-    db.add(db_order)
-    await db.commit()
-    await db.refresh(db_order)
+
+    set_committed_value(db_order, "user", user or await get_user(db, user_id))
+    set_committed_value(db_order, "product", await get_product(db, order.product_id))
+    await _commit(db, _changed(ORDER_CHANGED, db_order.id))
+    return db_order
+
+async def checkout(db: AsyncSession, order: schemas.OrderCreate, telegram_id: str, profile: schemas.UserUpdate) -> models.Order:
+    """Upsert the Telegram user and create the order in a single transaction."""
+    db_user, written = await _upsert_telegram_user(db, telegram_id, profile)
+    db_order = await create_order(db, order, user_id=db_user.id, user=db_user)
+    if written:
+        # Committed with the order above; this only queues the user's invalidation
+        await _commit(db, _user_written(db_user))
     return db_order
 
 async def update_order_status(db: AsyncSession, order_id: int, status: models.OrderStatus) -> Optional[models.Order]:
@@ -129,8 +223,7 @@ async def update_order_status(db: AsyncSession, order_id: int, status: models.Or
     db_order = result.scalar_one_or_none()
     if db_order:
         db_order.status = status
-        await db.commit()
-        await db.refresh(db_order)
+        await _commit(db, _changed(ORDER_CHANGED, order_id))
     return db_order
 
 async def get_overdue_orders(db: AsyncSession) -> List[models.Order]:
@@ -149,11 +242,11 @@ async def get_overdue_orders(db: AsyncSession) -> List[models.Order]:
     return result.scalars().all()
 
 # Payment CRUD
-async def get_payments(db: AsyncSession, skip: int = 0, limit: int = 100, order_id: Optional[int] = None) -> List[models.Payment]:
+async def get_payments(db: AsyncSession, skip: int = 0, limit: int = 100, order_id: Optional[int] = None, cursor: Optional[Cursor] = None) -> List[models.Payment]:
     query = select(models.Payment).options(selectinload(models.Payment.order))
     if order_id:
         query = query.where(models.Payment.order_id == order_id)
-    query = query.offset(skip).limit(limit).order_by(models.Payment.created_at.desc())
+    query = paginate(query, models.Payment, skip=skip, limit=limit, cursor=cursor)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -179,21 +272,203 @@ async def create_payment(db: AsyncSession, payment: schemas.PaymentCreate, yooka
         yookassa_payment_id=yookassa_payment_id
     )
     db.add(db_payment)
-    await db.commit()
-    await db.refresh(db_payment)
+    await _commit(db)
     return db_payment
 
 async def update_payment_status(db: AsyncSession, payment_id: int, status: models.PaymentStatus, payment_method: Optional[str] = None) -> Optional[models.Payment]:
+    """Record a non-success status; successes go through apply_successful_payment,
+    which also credits the order."""
+    if status == models.PaymentStatus.SUCCEEDED:
+        raise ValueError("Use apply_successful_payment to mark a payment succeeded")
     result = await db.execute(select(models.Payment).where(models.Payment.id == payment_id))
     db_payment = result.scalar_one_or_none()
     if db_payment:
         db_payment.status = status
         if payment_method:
             db_payment.payment_method = payment_method
-        await db.commit()
-        await db.refresh(db_payment)
+        await _commit(db)
     return db_payment
 
+class AppliedPayment(NamedTuple):
+    payment_id: int
+    order_id: int
+    amount: Decimal
+    paid_amount: Decimal
+    order_status: models.OrderStatus
+
+async def apply_successful_payment(db: AsyncSession, yookassa_payment_id: str, payment_method: Optional[str] = None) -> Optional[AppliedPayment]:
+    """Mark a payment succeeded and add it to its order's paid_amount in one statement.
+
+    The payments UPDATE only matches a payment that has not succeeded yet and
+    feeds the orders UPDATE through a CTE, so the increment happens in the
+    database under the row lock. Concurrent or retried deliveries for one
+    payment serialize on that row and all but the first match nothing: the
+    payment is applied exactly once. Returns None for unknown or already
+    applied payments.
+    """
+    values = {"status": models.PaymentStatus.SUCCEEDED}
+    if payment_method:
+        values["payment_method"] = payment_method
+    paid = (
+        update(models.Payment)
+        .where(
+            models.Payment.yookassa_payment_id == yookassa_payment_id,
+            models.Payment.status != models.PaymentStatus.SUCCEEDED
+        )
+        .values(**values)
+        .returning(models.Payment.id, models.Payment.order_id, models.Payment.amount)
+        .cte("paid")
+    )
+    paid_amount = func.coalesce(models.Order.paid_amount, 0) + paid.c.amount
+    stmt = (
+        update(models.Order)
+        .where(models.Order.id == paid.c.order_id)
+        .values(
+            paid_amount=paid_amount,
+            status=case(
+                (paid_amount >= models.Order.total_amount, literal(models.OrderStatus.PAID, models.Order.status.type)),
+                else_=models.Order.status
+            )
+        )
+        .returning(paid.c.id, models.Order.id, paid.c.amount, models.Order.paid_amount, models.Order.status)
+    )
+    result = await db.execute(stmt, execution_options={"synchronize_session": False})
+    row = result.one_or_none()
+    if row is None:
+        return None
+    await _commit(db, _changed(ORDER_CHANGED, row[1]))
+    return AppliedPayment(*row)
+
+# Webhook event CRUD
+async def record_webhook_event(db: AsyncSession, event_id: str, event_type: str, payload: Dict[str, Any]) -> bool:
+    """Store a received webhook event; False if this event id was already stored."""
+    stmt = (
+        pg_insert(models.WebhookEvent)
+        .values(event_id=event_id, event_type=event_type, payload=payload)
+        .on_conflict_do_nothing(index_elements=[models.WebhookEvent.event_id])
+        .returning(models.WebhookEvent.id)
+    )
+    inserted = (await db.execute(stmt)).scalar_one_or_none()
+    await _commit(db)
+    return inserted is not None
+
+async def claim_webhook_events(db: AsyncSession, limit: int, lease_seconds: float) -> List[models.WebhookEvent]:
+    """Lease due events to the caller and commit the lease.
+
+    SKIP LOCKED lets workers in every process claim concurrently without
+    handing out the same event twice. A claimed event stays PROCESSING until
+    the lease in next_attempt_at runs out, after which it is claimed again,
+    so events held by a crashed worker are not lost.
+    """
+    due = (
+        select(models.WebhookEvent.id)
+        .where(
+            models.WebhookEvent.status.in_([models.WebhookEventStatus.PENDING, models.WebhookEventStatus.PROCESSING]),
+            models.WebhookEvent.next_attempt_at <= func.now()
+        )
+        .order_by(models.WebhookEvent.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(models.WebhookEvent)
+        .where(models.WebhookEvent.id.in_(due))
+        .values(
+            status=models.WebhookEventStatus.PROCESSING,
+            attempts=models.WebhookEvent.attempts + 1,
+            next_attempt_at=func.now() + timedelta(seconds=lease_seconds)
+        )
+        .returning(models.WebhookEvent)
+    )
+    result = await db.scalars(stmt, execution_options={"synchronize_session": False, "populate_existing": True})
+    events = list(result)
+    await _commit(db)
+    return events
+
+async def complete_webhook_event(db: AsyncSession, event_id: int):
+    await db.execute(
+        update(models.WebhookEvent)
+        .where(models.WebhookEvent.id == event_id)
+        .values(status=models.WebhookEventStatus.DONE, processed_at=func.now(), last_error=None),
+        execution_options={"synchronize_session": False}
+    )
+    await _commit(db)
+
+async def retry_webhook_event(db: AsyncSession, event_id: int, error: str, delay: Optional[float]):
+    """Put a failed event back in the queue after ``delay`` seconds, or give up on it when ``delay`` is None."""
+    values: Dict[str, Any] = {"last_error": error[:2000]}
+    if delay is None:
+        values["status"] = models.WebhookEventStatus.FAILED
+    else:
+        values["status"] = models.WebhookEventStatus.PENDING
+        values["next_attempt_at"] = func.now() + timedelta(seconds=delay)
+    await db.execute(
+        update(models.WebhookEvent).where(models.WebhookEvent.id == event_id).values(**values),
+        execution_options={"synchronize_session": False}
+    )
+    await _commit(db)
+
+# Outbox CRUD
+async def add_outbox_message(db: AsyncSession, topic: str, payload: Dict[str, Any]) -> models.OutboxMessage:
+    """Record a side effect in the caller's transaction; it is only delivered if that commits."""
+    message = models.OutboxMessage(topic=topic, payload=payload)
+    db.add(message)
+    await _commit(db)
+    return message
+
+async def claim_outbox_messages(db: AsyncSession, limit: int, lease_seconds: float, topics: Sequence[str]) -> List[models.OutboxMessage]:
+    """Lease up to ``limit`` due messages on ``topics`` and commit the lease (see claim_webhook_events)."""
+    due = (
+        select(models.OutboxMessage.id)
+        .where(
+            models.OutboxMessage.topic.in_(topics),
+            models.OutboxMessage.status.in_([models.OutboxStatus.PENDING, models.OutboxStatus.PROCESSING]),
+            models.OutboxMessage.next_attempt_at <= func.now()
+        )
+        .order_by(models.OutboxMessage.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(models.OutboxMessage)
+        .where(models.OutboxMessage.id.in_(due))
+        .values(
+            status=models.OutboxStatus.PROCESSING,
+            attempts=models.OutboxMessage.attempts + 1,
+            next_attempt_at=func.now() + timedelta(seconds=lease_seconds)
+        )
+        .returning(models.OutboxMessage)
+    )
+    result = await db.scalars(stmt, execution_options={"synchronize_session": False, "populate_existing": True})
+    messages = list(result)
+    await _commit(db)
+    return messages
+
+async def complete_outbox_messages(db: AsyncSession, message_ids: Sequence[int]):
+    if not message_ids:
+        return
+    await db.execute(
+        update(models.OutboxMessage)
+        .where(models.OutboxMessage.id.in_(message_ids))
+        .values(status=models.OutboxStatus.DONE, processed_at=func.now(), last_error=None),
+        execution_options={"synchronize_session": False}
+    )
+    await _commit(db)
+
+async def retry_outbox_message(db: AsyncSession, message_id: int, error: str, delay: Optional[float]):
+    """Schedule another delivery attempt in ``delay`` seconds, or give up when ``delay`` is None."""
+    values: Dict[str, Any] = {"last_error": error[:2000]}
+    if delay is None:
+        values["status"] = models.OutboxStatus.FAILED
+    else:
+        values["status"] = models.OutboxStatus.PENDING
+        values["next_attempt_at"] = func.now() + timedelta(seconds=delay)
+    await db.execute(
+        update(models.OutboxMessage).where(models.OutboxMessage.id == message_id).values(**values),
+        execution_options={"synchronize_session": False}
+    )
+    await _commit(db)
+
 # Click CRUD
 async def create_click(db: AsyncSession, click: schemas.ClickCreate, user_id: Optional[int] = None, ip_address: Optional[str] = None, user_agent: Optional[str] = None) -> models.Click:
     db_click = models.Click(
@@ -203,112 +478,712 @@ async def create_click(db: AsyncSession, click: schemas.ClickCreate, user_id: Op
         user_agent=user_agent
     )
     db.add(db_click)
-    await db.commit()
-    await db.refresh(db_click)
+    await _commit(db)
     return db_click
 
-async def get_clicks(db: AsyncSession, skip: int = 0, limit: int = 100, user_id: Optional[int] = None, product_id: Optional[int] = None) -> List[models.Click]:
+async def create_clicks_bulk(db: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+    """Insert many click rows with a single executemany; the caller commits."""
+    if not rows:
+        return 0
+    await db.execute(insert(models.Click), rows)
+    return len(rows)
+
+def _visitor_key(user_id: Optional[int], ip_address: Optional[str]) -> Optional[str]:
+    if user_id:
+        return f"u:{user_id}"
+    if ip_address:
+        return f"ip:{ip_address}"
+    return None
+
+async def record_visitors(db: AsyncSession, visits: Iterable[Tuple[Optional[datetime], Optional[int], Optional[str]]]):
+    """Add ``(created_at, user_id, ip_address)`` visits to the hourly and daily visitor sketches.
+
+    Adding a visitor twice leaves a sketch unchanged, so replaying clicks is harmless.
+    Called from the click rollup refresh rather than per click, so the hot
+    current-hour rows are only locked by the single refreshing worker.
+    """
+    sketches: Dict[Tuple[str, datetime], HyperLogLog] = {}
+    now = datetime.now(timezone.utc)
+    for created_at, user_id, ip_address in visits:
+        key = _visitor_key(user_id, ip_address)
+        if key is None:
+            continue
+        hour = (_as_utc(created_at) or now).replace(minute=0, second=0, microsecond=0)
+        sketches.setdefault(("hour", hour), HyperLogLog()).add(key)
+        sketches.setdefault(("day", hour.replace(hour=0)), HyperLogLog()).add(key)
+    if not sketches:
+        return
+
+    # Lock buckets in a stable order so concurrent writers cannot deadlock
+    keys = sorted(sketches)
+    empty = HyperLogLog().to_bytes()
+    await db.execute(
+        pg_insert(models.VisitorSketch)
+        .values([{"granularity": granularity, "bucket": bucket, "registers": empty} for granularity, bucket in keys])
+        .on_conflict_do_nothing()
+    )
+    result = await db.execute(
+        select(models.VisitorSketch.granularity, models.VisitorSketch.bucket, models.VisitorSketch.registers)
+        .where(tuple_(models.VisitorSketch.granularity, models.VisitorSketch.bucket).in_(keys))
+        .order_by(models.VisitorSketch.granularity, models.VisitorSketch.bucket)
+        .with_for_update()
+    )
+    updates = [
+        {
+            "granularity": row.granularity,
+            "bucket": row.bucket,
+            "registers": HyperLogLog.from_bytes(row.registers).merge(sketches[(row.granularity, row.bucket)]).to_bytes(),
+        }
+        for row in result
+    ]
+    await db.execute(update(models.VisitorSketch), updates)
+
+async def backfill_visitor_sketches(db: AsyncSession, chunk_size: int = 10000) -> int:
+    """Feed every existing click into the visitor sketches, committing per chunk."""
+    last_id, total = 0, 0
+    while True:
+        result = await db.execute(
+            select(models.Click.id, models.Click.created_at, models.Click.user_id, models.Click.ip_address)
+            .where(models.Click.id > last_id)
+            .order_by(models.Click.id)
+            .limit(chunk_size)
+        )
+        rows = result.all()
+        if not rows:
+            return total
+        await record_visitors(db, ((row.created_at, row.user_id, row.ip_address) for row in rows))
+        await db.commit()
+        last_id, total = rows[-1].id, total + len(rows)
+
+async def get_user_ids_by_telegram_ids(db: AsyncSession, telegram_ids: List[str]) -> Dict[str, int]:
+    if not telegram_ids:
+        return {}
+    result = await db.execute(
+        select(models.User.telegram_id, models.User.id).where(models.User.telegram_id.in_(telegram_ids))
+    )
+    return {row.telegram_id: row.id for row in result}
+
+async def get_clicks(db: AsyncSession, skip: int = 0, limit: int = 100, user_id: Optional[int] = None, product_id: Optional[int] = None, cursor: Optional[Cursor] = None) -> List[models.Click]:
     query = select(models.Click)
     if user_id:
         query = query.where(models.Click.user_id == user_id)
     if product_id:
         query = query.where(models.Click.product_id == product_id)
-    query = query.offset(skip).limit(limit).order_by(models.Click.created_at.desc())
+    query = paginate(query, models.Click, skip=skip, limit=limit, cursor=cursor)
     result = await db.execute(query)
     return result.scalars().all()
 
+# Rollups
+ROLLUP_LOCK_ID = 7_340_001  # pg advisory lock so only one worker refreshes at a time
+
+def _hour(column):
+    # Literal unit so the expression is identical in SELECT and GROUP BY
+    return func.date_trunc(literal_column("'hour'"), column)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+async def _get_watermark(db: AsyncSession, name: str) -> models.RollupWatermark:
+    result = await db.execute(
+        select(models.RollupWatermark).where(models.RollupWatermark.name == name).with_for_update()
+    )
+    watermark = result.scalar_one_or_none()
+    if watermark is None:
+        watermark = models.RollupWatermark(name=name)
+        db.add(watermark)
+    return watermark
+
+async def refresh_click_rollups(db: AsyncSession, settle_seconds: int = 30) -> int:
+    """Fold clicks newer than the id watermark into the hourly rollup and the visitor sketches.
+
+    Clicks are append-only, so each row is counted exactly once. Rows younger
+    than ``settle_seconds`` are left for the next run so that transactions
+    still holding lower ids have time to commit.
+    """
+    watermark = await _get_watermark(db, "clicks")
+    low = watermark.last_id or 0
+    high_result = await db.execute(
+        select(func.max(models.Click.id)).where(
+            models.Click.id > low,
+            models.Click.created_at <= func.now() - timedelta(seconds=settle_seconds)
+        )
+    )
+    high = high_result.scalar()
+    if high is None:
+        return 0
+
+    bucket = _hour(models.Click.created_at)
+    product_id = func.coalesce(models.Click.product_id, literal_column("0"))
+    source = (
+        select(bucket, product_id, models.Click.page, models.Click.action, func.count())
+        .where(models.Click.id > low, models.Click.id <= high)
+        .group_by(bucket, product_id, models.Click.page, models.Click.action)
+    )
+    stmt = pg_insert(models.ClickRollupHourly).from_select(
+        ["bucket", "product_id", "page", "action", "clicks"], source
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["bucket", "product_id", "page", "action"],
+        set_={"clicks": models.ClickRollupHourly.clicks + stmt.excluded.clicks}
+    )
+    await db.execute(stmt)
+    await _fold_visitors(db, low, high)
+    watermark.last_id = high
+    await db.flush()
+    return high - low
+
+async def _fold_visitors(db: AsyncSession, low: int, high: int):
+    # One row per visitor and hour is all the sketches need
+    hour = _hour(models.Click.created_at)
+    result = await db.execute(
+        select(hour, models.Click.user_id, models.Click.ip_address)
+        .where(models.Click.id > low, models.Click.id <= high)
+        .distinct()
+    )
+    await record_visitors(db, result.all())
+
+async def refresh_order_rollups(db: AsyncSession, settle_seconds: int = 30) -> int:
+    """Recompute the hourly order rollup for every bucket touched since the watermark.
+
+    Orders change after creation (status, paid_amount), so instead of adding
+    deltas the affected creation-hour buckets are rebuilt from the orders table.
+    """
+    watermark = await _get_watermark(db, "orders")
+    cutoff_result = await db.execute(select(func.now() - timedelta(seconds=settle_seconds)))
+    cutoff = cutoff_result.scalar()
+
+    changed_at = func.coalesce(models.Order.updated_at, models.Order.created_at)
+    changed = select(_hour(models.Order.created_at)).where(changed_at <= cutoff).distinct()
+    if watermark.last_ts is not None:
+        changed = changed.where(changed_at > watermark.last_ts)
+    buckets = (await db.execute(changed)).scalars().all()
+
+    if buckets:
+        await db.execute(
+            delete(models.OrderRollupHourly).where(models.OrderRollupHourly.bucket.in_(buckets))
+        )
+        bucket = _hour(models.Order.created_at)
+        source = (
+            select(
+                bucket,
+                models.Order.product_id,
+                models.Order.status,
+                func.count(),
+                func.coalesce(func.sum(models.Order.paid_amount), 0)
+            )
+            .where(
+                models.Order.created_at >= min(buckets),
+                models.Order.created_at < max(buckets) + timedelta(hours=1),
+                bucket.in_(buckets)
+            )
+            .group_by(bucket, models.Order.product_id, models.Order.status)
+        )
+        await db.execute(
+            insert(models.OrderRollupHourly).from_select(
+                ["bucket", "product_id", "status", "orders", "revenue"], source
+            )
+        )
+    watermark.last_ts = cutoff
+    await db.flush()
+    return len(buckets)
+
+async def refresh_rollups(db: AsyncSession, settle_seconds: int = 30) -> Optional[Dict[str, int]]:
+    """Catch the rollup tables up with new clicks and changed orders; the caller commits.
+
+    Returns None when another worker is already refreshing.
+    """
+    locked = await db.execute(select(func.pg_try_advisory_xact_lock(ROLLUP_LOCK_ID)))
+    if not locked.scalar():
+        return None
+    clicks = await refresh_click_rollups(db, settle_seconds)
+    order_buckets = await refresh_order_rollups(db, settle_seconds)
+    return {"clicks": clicks, "order_buckets": order_buckets}
+
+def _bucket_range(query, bucket_column, start: Optional[datetime], end: Optional[datetime]):
+    # Rollups are hourly, so ranges are widened to whole hours
+    start, end = _as_utc(start), _as_utc(end)
+    if start is not None:
+        query = query.where(bucket_column >= start.replace(minute=0, second=0, microsecond=0))
+    if end is not None:
+        query = query.where(bucket_column < end)
+    return query
+
+# Warehouse export
+WAREHOUSE_LOCK_ID = 7_340_002  # pg advisory lock so only one worker exports at a time
+
+async def try_lock_warehouse_export(db: AsyncSession) -> bool:
+    """Take the export lock for the current transaction; False if another worker holds it."""
+    locked = await db.execute(select(func.pg_try_advisory_xact_lock(WAREHOUSE_LOCK_ID)))
+    return bool(locked.scalar())
+
+def _row_version(model):
+    return func.coalesce(model.updated_at, model.created_at) if hasattr(model, 'updated_at') else model.created_at
+
+async def get_export_bounds(db: AsyncSession, model, settle_seconds: int = 30) -> Tuple[Optional[int], datetime]:
+    """Highest id and latest row version that are old enough to export.
+
+    Rows younger than ``settle_seconds`` are left for the next run so that
+    transactions still holding lower ids or earlier timestamps can commit.
+    """
+    cutoff = func.now() - timedelta(seconds=settle_seconds)
+    result = await db.execute(
+        select(
+            select(func.max(model.id)).where(model.created_at <= cutoff).scalar_subquery(),
+            cutoff
+        )
+    )
+    high_id, high_ts = result.one()
+    return high_id, high_ts
+
+async def stream_export_rows(
+    db: AsyncSession,
+    model,
+    after_id: Optional[int] = None,
+    until_id: Optional[int] = None,
+    after_ts: Optional[datetime] = None,
+    until_ts: Optional[datetime] = None,
+    batch_size: int = 10000
+) -> AsyncIterator[Sequence[Any]]:
+    """Stream raw rows of ``model`` through a server-side cursor, ``batch_size`` at a time.
+
+    Filters by id range (append-only tables) and/or by row version, i.e.
+    ``coalesce(updated_at, created_at)``, which every row carries as ``_version``.
+    """
+    version = _row_version(model)
+    query = select(model.__table__, version.label('_version'))
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    if until_id is not None:
+        query = query.where(model.id <= until_id)
+    if after_ts is not None:
+        query = query.where(version > after_ts)
+    if until_ts is not None:
+        query = query.where(version <= until_ts)
+    result = await db.stream(query.order_by(model.id).execution_options(yield_per=batch_size))
+    async for partition in result.mappings().partitions():
+        yield partition
+
+# Exports
+def export_query(
+    entity: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    product_id: Optional[int] = None,
+    status: Optional[Any] = None
+):
+    """Flat, id-ordered column query for an admin export of orders, payments or clicks.
+
+    Related user and product fields are joined in as plain columns so rows can
+    be written out without loading ORM objects or relationships.
+    """
+    if entity == 'orders':
+        model = models.Order
+        query = (
+            select(
+                models.Order.id,
+                models.Order.created_at,
+                models.Order.updated_at,
+                models.Order.status,
+                models.Order.payment_type,
+                models.Order.total_amount,
+                models.Order.paid_amount,
+                models.Order.installment_months,
+                models.Order.next_payment_date,
+                models.Order.user_id,
+                models.User.telegram_id,
+                models.User.username,
+                models.Order.product_id,
+                models.Product.name.label('product_name')
+            )
+            .join(models.User, models.User.id == models.Order.user_id)
+            .join(models.Product, models.Product.id == models.Order.product_id)
+        )
+        product_column = models.Order.product_id
+    elif entity == 'payments':
+        model = models.Payment
+        query = (
+            select(
+                models.Payment.id,
+                models.Payment.created_at,
+                models.Payment.updated_at,
+                models.Payment.order_id,
+                models.Payment.yookassa_payment_id,
+                models.Payment.amount,
+                models.Payment.status,
+                models.Payment.payment_method,
+                models.Payment.is_installment,
+                models.Payment.installment_number,
+                models.Order.user_id,
+                models.Order.product_id
+            )
+            .join(models.Order, models.Order.id == models.Payment.order_id)
+        )
+        product_column = models.Order.product_id
+    elif entity == 'clicks':
+        model = models.Click
+        query = select(
+            models.Click.id,
+            models.Click.created_at,
+            models.Click.user_id,
+            models.Click.product_id,
+            models.Click.page,
+            models.Click.action,
+            models.Click.ip_address,
+            models.Click.user_agent,
+            models.Click.meta_data
+        )
+        product_column = models.Click.product_id
+    else:
+        raise ValueError(f"Unknown export entity: {entity}")
+
+    if start is not None:
+        query = query.where(model.created_at >= start)
+    if end is not None:
+        query = query.where(model.created_at < end)
+    if product_id is not None:
+        query = query.where(product_column == product_id)
+    if status is not None:
+        if not hasattr(model, 'status'):
+            raise ValueError(f"{entity} cannot be filtered by status")
+        query = query.where(model.status == status)
+    return query.order_by(model.id)
+
+async def stream_query(db: AsyncSession, query, batch_size: int = 1000) -> AsyncIterator[Sequence[Any]]:
+    """Run ``query`` on a server-side cursor and yield its rows ``batch_size`` at a time."""
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield partition
+
 # Analytics
-async def get_analytics_data(db: AsyncSession) -> Dict[str, Any]:
-    # Total orders
-    total_orders_result = await db.execute(select(func.count(models.Order.id)))
-    total_orders = total_orders_result.scalar()
-    
-    # Total revenue
-    total_revenue_result = await db.execute(select(func.sum(models.Order.paid_amount)))
-    total_revenue = total_revenue_result.scalar() or Decimal('0')
-    
-    # Total clicks
-    total_clicks_result = await db.execute(select(func.count(models.Click.id)))
-    total_clicks = total_clicks_result.scalar()
-    
-    # Unique visitors (count of unique user_ids + unique ip_addresses for non-logged users)
-    unique_users_result = await db.execute(select(func.count(func.distinct(models.Click.user_id))))
-    unique_users = unique_users_result.scalar() or 0
-    
-    unique_ips_result = await db.execute(
-        select(func.count(func.distinct(models.Click.ip_address)))
-        .where(models.Click.user_id.is_(None))
+async def get_funnel_rows(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    product_id: Optional[int] = None
+) -> List[Any]:
+    """Distinct users per product reaching page_view -> product click -> order -> paid.
+
+    Each stage only counts users who also reached the previous stage for the
+    same product. Page views without a product count towards every product.
+    The row with ``product_id`` None holds the totals across products.
+    """
+    start, end = _as_utc(start), _as_utc(end)
+    click_window = and_(
+        models.Click.created_at >= start,
+        models.Click.created_at < end,
+        models.Click.user_id.isnot(None)
     )
-    unique_ips = unique_ips_result.scalar() or 0
-    
-    unique_visitors = unique_users + unique_ips
-    
-    # Total page views (count of all page views)
-    page_views_result = await db.execute(
-        select(func.count(models.Click.id))
-        .where(models.Click.action == 'page_view')
+    views = (
+        select(models.Click.user_id, models.Click.product_id)
+        .where(click_window, models.Click.action == 'page_view')
+        .distinct()
+        .cte('views')
     )
-    total_page_views = page_views_result.scalar() or 0
-    
-    # Conversion rate
-    conversion_rate = (total_orders / total_clicks * 100) if total_clicks > 0 else 0
-    
-    # Top products
-    top_products_result = await db.execute(
+    clicked = (
+        select(models.Click.user_id, models.Click.product_id)
+        .where(click_window, models.Click.action != 'page_view', models.Click.product_id.isnot(None))
+        .distinct()
+        .cte('clicked')
+    )
+    ordered = (
+        select(
+            models.Order.user_id,
+            models.Order.product_id,
+            func.bool_or(models.Order.status == models.OrderStatus.PAID).label('paid')
+        )
+        .where(models.Order.created_at >= start, models.Order.created_at < end)
+        .group_by(models.Order.user_id, models.Order.product_id)
+        .cte('ordered')
+    )
+    product = models.Product
+    query = (
+        select(
+            product.id.label('product_id'),
+            func.max(product.name).label('product_name'),
+            func.count(func.distinct(views.c.user_id)).label('viewed'),
+            func.count(func.distinct(clicked.c.user_id)).label('clicked'),
+            func.count(func.distinct(ordered.c.user_id))
+            .filter(clicked.c.user_id.isnot(None))
+            .label('ordered'),
+            func.count(func.distinct(ordered.c.user_id))
+            .filter(clicked.c.user_id.isnot(None), ordered.c.paid)
+            .label('paid')
+        )
+        .select_from(product)
+        .join(views, or_(views.c.product_id.is_(None), views.c.product_id == product.id))
+        .outerjoin(clicked, and_(clicked.c.user_id == views.c.user_id, clicked.c.product_id == product.id))
+        .outerjoin(ordered, and_(ordered.c.user_id == views.c.user_id, ordered.c.product_id == product.id))
+        .group_by(func.rollup(product.id))
+    )
+    if product_id is not None:
+        query = query.where(product.id == product_id)
+    result = await db.execute(query)
+    return result.all()
+
+async def get_timeseries_rows(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    granularity: str
+) -> Tuple[List[Tuple[datetime, int]], List[Tuple[datetime, int, float]]]:
+    """Sparse per-bucket ``(bucket, clicks)`` and ``(bucket, paid_orders, revenue)`` rows.
+
+    Hour, day and week buckets are rolled up from the hourly rollup tables;
+    minute buckets need the raw clicks and orders.
+    """
+    unit = literal_column(f"'{granularity}'")
+    start, end = _as_utc(start), _as_utc(end)
+    if granularity == "minute":
+        click_bucket = func.date_trunc(unit, models.Click.created_at)
+        clicks_query = (
+            select(click_bucket, func.count())
+            .where(models.Click.created_at >= start, models.Click.created_at < end)
+            .group_by(click_bucket)
+        )
+        order_bucket = func.date_trunc(unit, models.Order.created_at)
+        orders_query = (
+            select(
+                order_bucket,
+                func.count().filter(models.Order.status == models.OrderStatus.PAID),
+                func.coalesce(func.sum(models.Order.paid_amount), 0)
+            )
+            .where(models.Order.created_at >= start, models.Order.created_at < end)
+            .group_by(order_bucket)
+        )
+    else:
+        click_rollup, order_rollup = models.ClickRollupHourly, models.OrderRollupHourly
+        click_bucket = func.date_trunc(unit, click_rollup.bucket)
+        clicks_query = (
+            select(click_bucket, func.sum(click_rollup.clicks))
+            .where(click_rollup.bucket >= start, click_rollup.bucket < end)
+            .group_by(click_bucket)
+        )
+        order_bucket = func.date_trunc(unit, order_rollup.bucket)
+        orders_query = (
+            select(
+                order_bucket,
+                func.coalesce(func.sum(order_rollup.orders).filter(order_rollup.status == models.OrderStatus.PAID), 0),
+                func.coalesce(func.sum(order_rollup.revenue), 0)
+            )
+            .where(order_rollup.bucket >= start, order_rollup.bucket < end)
+            .group_by(order_bucket)
+        )
+    clicks = [(row[0], int(row[1])) for row in (await db.execute(clicks_query)).all()]
+    orders = [(row[0], int(row[1]), float(row[2])) for row in (await db.execute(orders_query)).all()]
+    return clicks, orders
+
+async def _get_click_metrics(db: AsyncSession, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    rollup = models.ClickRollupHourly
+    query = select(
+        func.coalesce(func.sum(rollup.clicks), 0).label('total_clicks'),
+        func.coalesce(func.sum(rollup.clicks).filter(rollup.action == 'page_view'), 0).label('total_page_views')
+    )
+    result = await db.execute(_bucket_range(query, rollup.bucket, start, end))
+    return result.one()
+
+async def _count_unique_visitors_exact(db: AsyncSession, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    # Unique visitors = unique user_ids + unique ip_addresses for non-logged users
+    query = select(
+        func.count(func.distinct(models.Click.user_id)).label('unique_users'),
+        func.count(func.distinct(models.Click.ip_address))
+        .filter(models.Click.user_id.is_(None))
+        .label('unique_ips')
+    )
+    if start is not None:
+        query = query.where(models.Click.created_at >= _as_utc(start))
+    if end is not None:
+        query = query.where(models.Click.created_at < _as_utc(end))
+    row = (await db.execute(query)).one()
+    return (row.unique_users or 0) + (row.unique_ips or 0)
+
+async def _merge_visitor_sketches(db: AsyncSession, start: Optional[datetime] = None, end: Optional[datetime] = None) -> HyperLogLog:
+    """Merge the fewest sketches covering the range: whole days plus hourly edges."""
+    sketch = models.VisitorSketch
+    start, end = _as_utc(start), _as_utc(end)
+
+    day_lo = None
+    if start is not None:
+        day_lo = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        if day_lo < start:
+            day_lo += timedelta(days=1)
+    day_hi = end.replace(hour=0, minute=0, second=0, microsecond=0) if end is not None else None
+
+    def hours(lo: Optional[datetime], hi: Optional[datetime]):
+        condition = sketch.granularity == "hour"
+        if lo is not None:
+            condition = and_(condition, sketch.bucket >= lo.replace(minute=0, second=0, microsecond=0))
+        if hi is not None:
+            condition = and_(condition, sketch.bucket < hi)
+        return condition
+
+    if day_lo is None or day_hi is None or day_lo < day_hi:
+        days = sketch.granularity == "day"
+        if day_lo is not None:
+            days = and_(days, sketch.bucket >= day_lo)
+        if day_hi is not None:
+            days = and_(days, sketch.bucket < day_hi)
+        conditions = [days]
+        if start is not None and start < day_lo:
+            conditions.append(hours(start, day_lo))
+        if end is not None and day_hi < end:
+            conditions.append(hours(day_hi, end))
+    else:
+        conditions = [hours(start, end)]
+
+    merged = HyperLogLog()
+    result = await db.execute(select(sketch.registers).where(or_(*conditions)))
+    for registers in result.scalars():
+        merged.merge(HyperLogLog.from_bytes(registers))
+    return merged
+
+async def get_unique_visitors(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    exact: Optional[bool] = None
+) -> Dict[str, Any]:
+    """Unique visitors in ``[start, end)``.
+
+    Estimated from HyperLogLog sketches (standard error ~1.6%) unless ``exact``
+    is set, or left unset for a bounded range no longer than
+    ``settings.unique_visitors_exact_max_hours``, in which case clicks are
+    counted with COUNT(DISTINCT).
+    """
+    if exact is None:
+        exact = (
+            start is not None and end is not None
+            and end - start <= timedelta(hours=settings.unique_visitors_exact_max_hours)
+        )
+    if exact:
+        return {'unique_visitors': await _count_unique_visitors_exact(db, start, end), 'exact': True, 'relative_error': 0.0}
+    sketch = await _merge_visitor_sketches(db, start, end)
+    return {'unique_visitors': sketch.count(), 'exact': False, 'relative_error': round(sketch.relative_error, 4)}
+
+async def _get_unique_visitors(db: AsyncSession, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    result = await get_unique_visitors(db, start, end)
+    return result['unique_visitors']
+
+async def _get_order_metrics(db: AsyncSession, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    rollup = models.OrderRollupHourly
+    query = select(
+        func.coalesce(func.sum(rollup.orders), 0).label('total_orders'),
+        func.coalesce(func.sum(rollup.revenue), 0).label('total_revenue')
+    )
+    result = await db.execute(_bucket_range(query, rollup.bucket, start, end))
+    return result.one()
+
+async def _get_top_products(db: AsyncSession, start: Optional[datetime] = None, end: Optional[datetime] = None, limit: int = 5) -> List[Dict[str, Any]]:
+    rollup = models.OrderRollupHourly
+    query = (
         select(
             models.Product.name,
-            func.count(models.Order.id).label('order_count'),
-            func.sum(models.Order.paid_amount).label('revenue')
+            func.sum(rollup.orders).label('order_count'),
+            func.sum(rollup.revenue).label('revenue')
         )
-        .join(models.Order)
+        .join(models.Product, models.Product.id == rollup.product_id)
         .group_by(models.Product.id, models.Product.name)
         .order_by(desc('order_count'))
-        .limit(5)
+        .limit(limit)
     )
-    top_products = [
+    result = await db.execute(_bucket_range(query, rollup.bucket, start, end))
+    return [
         {
             'name': row.name,
-            'order_count': row.order_count,
+            'order_count': int(row.order_count),
             'revenue': float(row.revenue or 0)
         }
-        for row in top_products_result.fetchall()
+        for row in result.fetchall()
     ]
+
+async def get_analytics_data(
+    db: AsyncSession,
+    session_factory: Optional[async_sessionmaker] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Dashboard totals, optionally limited to ``[start, end)``.
+
+    Click, order and top-product figures come from the hourly rollups, so the
+    cost grows with the number of buckets rather than the number of events.
+    With ``session_factory`` the independent queries run concurrently, each on
+    its own pooled connection; otherwise they run one after another on ``db``.
+    """
+    parts = (
+        (_get_click_metrics, start, end),
+        (_get_unique_visitors, start, end),
+        (_get_order_metrics, start, end),
+        (_get_top_products, start, end),
+        (get_orders, 0, 10),
+    )
+    if session_factory is None:
+        results = [await fn(db, *args) for fn, *args in parts]
+    else:
+        async def run(fn, *args):
+            async with session_factory() as session:
+                return await fn(session, *args)
+
+        results = await asyncio.gather(*(run(fn, *args) for fn, *args in parts))
+    clicks, unique_visitors, orders, top_products, recent_orders = results
+
+    total_clicks = int(clicks.total_clicks)
+    total_orders = int(orders.total_orders)
     
-    # Recent orders
-    recent_orders = await get_orders(db, limit=10)
+    # Conversion rate
+    conversion_rate = (total_orders / total_clicks * 100) if total_clicks > 0 else 0
     
     return {
         'total_orders': total_orders,
-        'total_revenue': float(total_revenue),
+        'total_revenue': float(orders.total_revenue or Decimal('0')),
         'total_clicks': total_clicks,
         'unique_visitors': unique_visitors,
-        'total_page_views': total_page_views,
+        'total_page_views': int(clicks.total_page_views),
         'conversion_rate': round(conversion_rate, 2),
         'top_products': top_products,
         'recent_orders': recent_orders
     }
 
+async def get_dashboard_snapshot(
+    session_factory: async_sessionmaker,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> schemas.AnalyticsData:
+    """``get_analytics_data`` served from the shared dashboard snapshot cache.
+
+    Snapshots are computed on their own sessions, since a background refresh
+    can outlive the request that triggered it.
+    """
+    async def load():
+        async with session_factory() as db:
+            data = await get_analytics_data(db, session_factory=session_factory, start=start, end=end)
+            return schemas.AnalyticsData.model_validate(data)
+
+    return await dashboard_cache.get((start, end), load)
+
 # Admin notifications
 async def create_admin_notification(db: AsyncSession, notification: schemas.AdminNotificationCreate) -> models.AdminNotification:
     db_notification = models.AdminNotification(**notification.dict())
     db.add(db_notification)
-    await db.commit()
-    await db.refresh(db_notification)
+    await _commit(db)
     return db_notification
 
-async def get_admin_notifications(db: AsyncSession, skip: int = 0, limit: int = 50, unread_only: bool = False) -> List[models.AdminNotification]:
+async def get_admin_notifications(db: AsyncSession, skip: int = 0, limit: int = 50, unread_only: bool = False, cursor: Optional[Cursor] = None) -> List[models.AdminNotification]:
     query = select(models.AdminNotification)
     if unread_only:
         query = query.where(models.AdminNotification.is_read == False)
-    query = query.offset(skip).limit(limit).order_by(models.AdminNotification.created_at.desc())
+    query = paginate(query, models.AdminNotification, skip=skip, limit=limit, cursor=cursor)
     result = await db.execute(query)
     return result.scalars().all()
 
 async def mark_notification_as_read(db: AsyncSession, notification_id: int) -> Optional[models.AdminNotification]:
-    result = await db.execute(select(models.AdminNotification).where(models.AdminNotification.id == notification_id))
+    result = await db.execute(
+        update(models.AdminNotification)
+        .where(models.AdminNotification.id == notification_id)
+        .values(is_read=True)
+        .returning(models.AdminNotification)
+    )
     db_notification = result.scalar_one_or_none()
     if db_notification:
-        db_notification.is_read = True
-        await db.commit()
-        await db.refresh(db_notification)
+        await _commit(db)
     return db_notification
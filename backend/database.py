@@ -1,6 +1,10 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.exc import SQLAlchemyError
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from contextlib import asynccontextmanager
 from config import settings
 import logging
 
@@ -33,18 +37,86 @@ AsyncSessionLocal = async_sessionmaker(
 # Base class for models
 Base = declarative_base()
 
+def get_session_factory() -> async_sessionmaker:
+    """Dependency for handlers that manage their own sessions, e.g. streaming responses
+    that outlive the request-scoped ``get_db`` session."""
+    return AsyncSessionLocal
+
+# Unit of work: inside a request, crud writes only flush and the request commits once
+UNIT_OF_WORK = "unit_of_work"
+AFTER_COMMIT = "after_commit"
+
+def begin_unit_of_work(request: Request, session: AsyncSession):
+    session.info[UNIT_OF_WORK] = True
+    request.state.db_session = session
+
+def in_unit_of_work(session: AsyncSession) -> bool:
+    return session.info.get(UNIT_OF_WORK, False)
+
+def after_commit(session: AsyncSession, callback: Callable[[], Awaitable[None]]):
+    """Run ``callback`` once the unit of work commits, e.g. to invalidate caches."""
+    session.info.setdefault(AFTER_COMMIT, []).append(callback)
+
+async def commit_unit_of_work(session: AsyncSession):
+    await session.commit()
+    for callback in session.info.pop(AFTER_COMMIT, []):
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f"After-commit callback failed: {e}")
+
+@asynccontextmanager
+async def unit_of_work(session_factory: async_sessionmaker) -> AsyncIterator[AsyncSession]:
+    """A unit of work outside a request, e.g. in a background worker: crud writes
+    only flush, and the block commits once on exit (or rolls back on error)."""
+    async with session_factory() as session:
+        session.info[UNIT_OF_WORK] = True
+        try:
+            yield session
+            await commit_unit_of_work(session)
+        except Exception:
+            await session.rollback()
+            session.info.pop(AFTER_COMMIT, None)
+            raise
+        finally:
+            session.info.pop(UNIT_OF_WORK, None)
+
+class UnitOfWorkRoute(APIRoute):
+    """Commits the request's session after the endpoint returns, before the response is sent.
+
+    The code after ``yield`` in ``get_db`` only runs once the response has gone
+    out, too late to turn a failed commit into an error response or to
+    guarantee a client can read back what it just wrote.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            response = await handler(request)
+            session: Optional[AsyncSession] = getattr(request.state, "db_session", None)
+            if session is not None:
+                await commit_unit_of_work(session)
+            return response
+
+        return route_handler
+
 # Dependency to get database session
-async def get_db() -> AsyncSession:
+async def get_db(request: Request) -> AsyncSession:
     async with AsyncSessionLocal() as session:
+        begin_unit_of_work(request, session)
         try:
             yield session
-            await session.commit()
+            # Normally a no-op: UnitOfWorkRoute has already committed
+            await commit_unit_of_work(session)
         except SQLAlchemyError as e:
             await session.rollback()
+            session.info.pop(AFTER_COMMIT, None)
             logger.error(f"Database error: {e}")
             raise
         except Exception as e:
             await session.rollback()
+            session.info.pop(AFTER_COMMIT, None)
             logger.error(f"Unexpected error: {e}")
             raise
         finally:
@@ -6,7 +6,17 @@ import logging
 from sqlalchemy import text
 from config import settings
 from database import engine, Base
-from routers import products, orders, payments, analytics, admin
+from routers import products, orders, payments, analytics, admin, exports, sessions
+from services.click_buffer import click_buffer
+from services.rollups import rollup_refresher
+from services.dashboard_cache import dashboard_cache
+from services.invalidation import invalidation_bus
+from services.cache import close_caches
+from services.webhook_queue import webhook_queue
+from services.outbox import outbox_dispatcher
+from services.payment_adapter import start_payment_adapter, close_payment_adapter
+from services.telegram_service import telegram_dispatcher
+from auth import password_pool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,10 +40,32 @@ async def lifespan(app: FastAPI):
         logger.error(f"Failed to initialize database: {e}")
         raise
     
+    await invalidation_bus.start()
+    await start_payment_adapter()
+    if settings.click_buffer_enabled:
+        await click_buffer.start()
+    if settings.rollup_refresh_enabled:
+        await rollup_refresher.start()
+    if settings.webhook_queue_enabled:
+        await webhook_queue.start()
+    if settings.outbox_dispatcher_enabled:
+        await outbox_dispatcher.start()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down AI Store API...")
+    await rollup_refresher.stop()
+    await webhook_queue.stop()
+    await outbox_dispatcher.stop()
+    await telegram_dispatcher.close()
+    await dashboard_cache.close()
+    await invalidation_bus.stop()
+    await close_caches()
+    await close_payment_adapter()
+    password_pool.shutdown()
+    # Drain buffered clicks before the engine goes away
+    await click_buffer.stop()
     await engine.dispose()
 
 # Create FastAPI app
@@ -65,6 +97,8 @@ app.include_router(orders.router, prefix="/api/orders", tags=["orders"])
 app.include_router(payments.router, prefix="/api/payments", tags=["payments"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+app.include_router(exports.router, prefix="/api/admin/export", tags=["admin"])
+app.include_router(sessions.router, prefix="/api/session", tags=["session"])
 
 @app.get("/")
 async def root():
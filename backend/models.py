@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, Numeric, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, Numeric, JSON, BigInteger, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -26,12 +26,26 @@ class PaymentStatus(enum.Enum):
     CANCELLED = "cancelled"
     WAITING_FOR_CAPTURE = "waiting_for_capture"
 
+class WebhookEventStatus(enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+class OutboxStatus(enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
 class PaymentType(enum.Enum):
     FULL = "full"
     INSTALLMENT = "installment"
 
 class User(Base):
     __tablename__ = "users"
+    # Flushes fetch created_at/updated_at with RETURNING, so crud never needs a refresh
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     telegram_id = Column(String, unique=True, index=True, nullable=False)
@@ -51,6 +65,11 @@ class User(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_active_created_at_id", "is_active", "created_at", "id"),
+        Index("ix_products_created_at_id", "created_at", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -70,6 +89,11 @@ class Product(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_user_created_at_id", "user_id", "created_at", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -90,6 +114,11 @@ class Order(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_created_at_id", "created_at", "id"),
+        Index("ix_payments_order_created_at_id", "order_id", "created_at", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
@@ -106,8 +135,49 @@ class Payment(Base):
     # Relationships
     order = relationship("Order", back_populates="payments")
 
+class WebhookEvent(Base):
+    """Payment provider notification, stored as received and processed by services.webhook_queue."""
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        Index("ix_webhook_events_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(String, unique=True, nullable=False)  # provider event id; redeliveries conflict here
+    event_type = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(Enum(WebhookEventStatus), nullable=False, default=WebhookEventStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())  # also the lease expiry while processing
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+class OutboxMessage(Base):
+    """Side effect (e.g. a Telegram notification) written in the transaction that caused it
+    and delivered afterwards by services.outbox."""
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index("ix_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(Enum(OutboxStatus), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())  # also the lease expiry while processing
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
 class Click(Base):
     __tablename__ = "clicks"
+    __table_args__ = (
+        Index("ix_clicks_created_at_id", "created_at", "id"),
+        Index("ix_clicks_user_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_clicks_product_created_at_id", "product_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -125,6 +195,10 @@ class Click(Base):
 
 class AdminNotification(Base):
     __tablename__ = "admin_notifications"
+    __table_args__ = (
+        Index("ix_admin_notifications_created_at_id", "created_at", "id"),
+        Index("ix_admin_notifications_read_created_at_id", "is_read", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     type = Column(String, nullable=False)
@@ -133,3 +207,41 @@ class AdminNotification(Base):
     is_read = Column(Boolean, default=False)
     meta_data = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ClickRollupHourly(Base):
+    """Click counts per hour x product x page x action, maintained from the clicks table."""
+    __tablename__ = "click_rollups_hourly"
+    
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    product_id = Column(Integer, primary_key=True, default=0)  # 0 = click not tied to a product
+    page = Column(String, primary_key=True)
+    action = Column(String, primary_key=True)
+    clicks = Column(BigInteger, nullable=False, default=0)
+
+class OrderRollupHourly(Base):
+    """Order counts and paid revenue per creation hour x product x status."""
+    __tablename__ = "order_rollups_hourly"
+    
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    status = Column(Enum(OrderStatus), primary_key=True)
+    orders = Column(BigInteger, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+class RollupWatermark(Base):
+    """How far each rollup has consumed its source table."""
+    __tablename__ = "rollup_watermarks"
+    
+    name = Column(String, primary_key=True)
+    last_id = Column(BigInteger, nullable=True)
+    last_ts = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class VisitorSketch(Base):
+    """HyperLogLog sketch of visitor keys seen in one hour or day bucket."""
+    __tablename__ = "visitor_sketches"
+    
+    granularity = Column(String, primary_key=True)  # "hour" or "day"
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    registers = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
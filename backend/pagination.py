@@ -0,0 +1,52 @@
+import base64
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+
+# Keyset pagination on (created_at DESC, id DESC).
+#
+# A cursor encodes the sort key of the last row on a page; the next page is
+# everything strictly after it, which an index on (created_at, id) answers
+# without reading the skipped rows, unlike OFFSET.
+
+Cursor = Tuple[datetime, int]
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Inverse of ``encode_cursor``; raises ValueError for anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Cursor]:
+    """Decode a cursor query parameter, turning bad input into a 400."""
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def paginate(query, model, skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None):
+    """Order ``query`` newest first and select one page, by cursor when given, else by offset."""
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if cursor is not None:
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(*cursor))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def set_next_cursor(response: Response, items: Sequence, limit: int):
+    """Advertise the cursor of the following page, if the current page was full."""
+    if limit and len(items) == limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
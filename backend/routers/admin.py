@@ -1,23 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from fastapi.security import HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from typing import List
-from database import get_db
+from typing import Any, Dict, List, Optional
+from database import get_db, AsyncSessionLocal, UnitOfWorkRoute
 from models import User, UserRole
-from auth import verify_password, create_access_token, get_current_admin_user
+from auth import verify_password_async, create_access_token, get_current_admin_user, PasswordPoolBusy
+from config import settings
+from pagination import parse_cursor, set_next_cursor
+from services.cache import cache_stats
+from services.rate_limit import KeyedRateLimiter
+import math
 import schemas
 import crud
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 security = HTTPBearer()
 
+# Per-worker login throttles, checked before any DB or bcrypt work
+login_ip_limiter = KeyedRateLimiter(
+    rate=settings.login_ip_rate_per_minute / 60,
+    capacity=settings.login_ip_burst
+)
+login_email_limiter = KeyedRateLimiter(
+    rate=settings.login_email_rate_per_minute / 60,
+    capacity=settings.login_email_burst
+)
+
+def _throttle(limiter: KeyedRateLimiter, key: str):
+    if not limiter.allow(key):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(math.ceil(limiter.retry_after(key)))}
+        )
+
 @router.post("/login", response_model=schemas.AdminToken)
 async def admin_login(
     login_data: schemas.AdminLogin,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
     """Admin login"""
+    _throttle(login_ip_limiter, request.client.host)
+    _throttle(login_email_limiter, login_data.email.lower())
+
     # Get user by email
     user = await crud.get_user_by_email(db, email=login_data.email)
     
@@ -28,7 +55,15 @@ async def admin_login(
             detail="Invalid credentials"
         )
     
-    if not verify_password(login_data.password, user.hashed_password):
+    try:
+        password_ok = await verify_password_async(login_data.password, user.hashed_password)
+    except PasswordPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Login temporarily unavailable",
+            headers={"Retry-After": "1"}
+        )
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
@@ -47,18 +82,25 @@ async def admin_login(
 
 @router.get("/dashboard", response_model=schemas.AnalyticsData)
 async def get_admin_dashboard(
-    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     """Get admin dashboard data"""
-    analytics_data = await crud.get_analytics_data(db)
-    return analytics_data
+    return await crud.get_dashboard_snapshot(AsyncSessionLocal)
+
+@router.get("/cache/stats")
+async def get_cache_stats(
+    current_user: User = Depends(get_current_admin_user)
+) -> Dict[str, Dict[str, Any]]:
+    """Per-namespace lookup cache counters for this worker"""
+    return cache_stats()
 
 @router.get("/notifications", response_model=List[schemas.AdminNotification])
 async def get_admin_notifications(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
     unread_only: bool = False,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
@@ -67,8 +109,10 @@ async def get_admin_notifications(
         db, 
         skip=skip, 
         limit=limit, 
-        unread_only=unread_only
+        unread_only=unread_only,
+        cursor=parse_cursor(cursor)
     )
+    set_next_cursor(response, notifications, limit)
     return notifications
 
 @router.put("/notifications/{notification_id}/read")
@@ -1,35 +1,138 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Header, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional
-from database import get_db
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import json
+from database import get_db, AsyncSessionLocal, UnitOfWorkRoute
 from models import User
-from auth import get_current_admin_user, verify_telegram_webapp_data
+from auth import get_current_admin_user, get_telegram_session, verify_telegram_webapp_data, TelegramSession
+from config import settings
+from services.click_buffer import click_buffer
+from services import timeseries
+from services.funnel import get_funnel
+from services.warehouse import warehouse, WarehouseUnavailable
+from pagination import parse_cursor, set_next_cursor
 import schemas
 import crud
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+def _utc_range(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    default_end: Optional[datetime] = None
+) -> Tuple[datetime, datetime]:
+    """Report range defaulting to the 30 days up to now (or ``default_end``); naive
+    datetimes are taken as UTC. Rejects empty ranges with 400."""
+    end = end or default_end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=30)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end")
+    return start, end
+
+def _parse_click_batch(body: bytes) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Parse a click batch body without building a pydantic model per event.
+
+    Accepts a JSON array of events, an object ``{"init_data": ..., "events": [...]}``
+    (what ``navigator.sendBeacon`` posts, since it cannot set headers) or NDJSON.
+    Returns the validated events and the init data carried in the body, if any.
+    """
+    init_data = None
+    try:
+        text = body.decode("utf-8").strip()
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed click batch")
+    if not text:
+        return [], None
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        try:
+            payload = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed click batch")
+
+    if isinstance(payload, dict):
+        if "events" in payload:
+            init_data = payload.get("init_data")
+            payload = payload["events"]
+        else:
+            # One-line NDJSON: a single event
+            payload = [payload]
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Click batch must be a list of events")
+    if len(payload) > settings.click_batch_max_events:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.click_batch_max_events} events per batch"
+        )
+
+    events = []
+    for index, item in enumerate(payload):
+        if not isinstance(item, dict):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Event {index} is not an object")
+        page = item.get("page")
+        action = item.get("action")
+        product_id = item.get("product_id")
+        metadata = item.get("metadata", item.get("meta_data"))
+        if not isinstance(page, str) or not isinstance(action, str) or not page or not action:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Event {index} needs page and action")
+        if product_id is not None and (isinstance(product_id, bool) or not isinstance(product_id, int)):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Event {index} has an invalid product_id")
+        if metadata is not None and not isinstance(metadata, dict):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Event {index} has invalid metadata")
+        events.append({"page": page, "action": action, "product_id": product_id, "metadata": metadata})
+    return events, init_data
 
 @router.post("/click")
 async def track_click(
     click: schemas.ClickCreate,
     request: Request,
     db: AsyncSession = Depends(get_db),
+    session: Optional[TelegramSession] = Depends(get_telegram_session),
     x_telegram_init_data: Optional[str] = Header(None)
 ):
     """Track user click"""
-    user_id = None
-    
-    # Try to get user from Telegram WebApp data
-    if x_telegram_init_data:
-        telegram_user = verify_telegram_webapp_data(x_telegram_init_data)
-        if telegram_user:
-            user = await crud.get_user_by_telegram_id(db, str(telegram_user['id']))
-            if user:
-                user_id = user.id
-    
     # Get client info
     client_ip = request.client.host
     user_agent = request.headers.get("user-agent")
+
+    if session:
+        telegram_user = None
+    else:
+        telegram_user = verify_telegram_webapp_data(x_telegram_init_data) if x_telegram_init_data else None
+
+    # Write-behind mode: queue the click and let the buffer resolve the user at flush time
+    if settings.click_buffer_enabled and click_buffer.running:
+        accepted = await click_buffer.put(
+            page=click.page,
+            action=click.action,
+            product_id=click.product_id,
+            metadata=click.metadata,
+            user_id=session.user_id if session else None,
+            telegram_id=str(telegram_user['id']) if telegram_user else None,
+            ip_address=client_ip,
+            user_agent=user_agent
+        )
+        if not accepted:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Click buffer is full",
+                headers={"Retry-After": "1"}
+            )
+        return {"status": "accepted"}
+
+    user_id = session.user_id if session else None
+    
+    # Try to get user from Telegram WebApp data
+    if telegram_user:
+        user = await crud.get_user_by_telegram_id(db, str(telegram_user['id']))
+        if user:
+            user_id = user.id
     
     # Create click record
     db_click = await crud.create_click(
@@ -42,21 +145,156 @@ async def track_click(
     
     return {"status": "success", "click_id": db_click.id}
 
+@router.post("/clicks/batch")
+async def track_clicks_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    session: Optional[TelegramSession] = Depends(get_telegram_session),
+    x_telegram_init_data: Optional[str] = Header(None)
+):
+    """Track many clicks in one request (JSON array, envelope, NDJSON or sendBeacon body)"""
+    body = await request.body()
+    if len(body) > settings.click_batch_max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Click batch too large"
+        )
+    events, body_init_data = _parse_click_batch(body)
+    if not events:
+        return {"status": "success", "count": 0}
+
+    client_ip = request.client.host
+    user_agent = request.headers.get("user-agent")
+
+    # Verify the Telegram session once for the whole batch
+    # Header or body only: signed init data must never end up in URLs and access logs
+    raw_init_data = x_telegram_init_data or body_init_data
+    telegram_user = verify_telegram_webapp_data(raw_init_data) if raw_init_data and not session else None
+    telegram_id = str(telegram_user['id']) if telegram_user else None
+    session_user_id = session.user_id if session else None
+
+    if settings.click_buffer_enabled and click_buffer.running:
+        accepted = await click_buffer.put_many(
+            events,
+            user_id=session_user_id,
+            telegram_id=telegram_id,
+            ip_address=client_ip,
+            user_agent=user_agent
+        )
+        if not accepted:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Click buffer is full",
+                headers={"Retry-After": "1"}
+            )
+        return {"status": "accepted", "count": len(events)}
+
+    user_id = session_user_id
+    if telegram_id:
+        user = await crud.get_user_by_telegram_id(db, telegram_id)
+        if user:
+            user_id = user.id
+
+    created_at = datetime.now(timezone.utc)
+    rows = [
+        {
+            "page": event["page"],
+            "action": event["action"],
+            "product_id": event["product_id"],
+            "meta_data": event["metadata"],
+            "user_id": user_id,
+            "ip_address": client_ip,
+            "user_agent": user_agent,
+            "created_at": created_at,
+        }
+        for event in events
+    ]
+    count = await crud.create_clicks_bulk(db, rows)
+    return {"status": "success", "count": count}
+
 @router.get("/dashboard", response_model=schemas.AnalyticsData)
 async def get_analytics_dashboard(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Get analytics dashboard data, optionally for a time range (admin only)"""
+    return await crud.get_dashboard_snapshot(AsyncSessionLocal, start=start, end=end)
+
+@router.get("/unique-visitors", response_model=schemas.UniqueVisitors)
+async def get_unique_visitors(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    exact: Optional[bool] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
-    """Get analytics dashboard data (admin only)"""
-    analytics_data = await crud.get_analytics_data(db)
-    return analytics_data
+    """Unique visitors for a time range: HyperLogLog estimate, or exact for short ranges (admin only)"""
+    return await crud.get_unique_visitors(db, start=start, end=end, exact=exact)
+
+@router.get("/timeseries", response_model=schemas.TimeSeries)
+async def get_timeseries(
+    granularity: Literal["minute", "hour", "day", "week"] = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    window: int = Query(7, ge=1, le=365),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Revenue, paid orders, clicks and conversion per bucket, with moving averages and deltas (admin only)"""
+    start, end = _utc_range(start, end)
+
+    bucket_count = timeseries.bucket_count(start, end, granularity)
+    if bucket_count > settings.timeseries_max_buckets:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range has {bucket_count} {granularity} buckets, at most {settings.timeseries_max_buckets} allowed"
+        )
+
+    # Fetch the preceding period of equal length too, for period-over-period totals
+    previous_start = timeseries.previous_period_start(start, end, granularity)
+    clicks, orders = await crud.get_timeseries_rows(db, previous_start, end, granularity)
+    return timeseries.build_timeseries(start, end, granularity, window, clicks, orders)
+
+@router.get("/funnel", response_model=schemas.Funnel)
+async def get_purchase_funnel(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    product_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Users reaching page view -> product click -> order -> payment, overall and per product (admin only)"""
+    # Whole minutes by default, so repeated requests share a cache entry
+    start, end = _utc_range(
+        start, end, default_end=datetime.now(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+    )
+    return await get_funnel(db, start, end, product_id)
+
+@router.get("/warehouse/report", response_model=schemas.WarehouseReport)
+async def get_warehouse_report(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Heavy traffic and sales report computed from Parquet snapshots, off the primary database (admin only)"""
+    if not settings.warehouse_enabled:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Analytics warehouse is disabled")
+    start, end = _utc_range(start, end)
+    try:
+        return await warehouse.report(start, end, limit=limit)
+    except WarehouseUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
 @router.get("/clicks")
 async def get_clicks(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     user_id: Optional[int] = None,
     product_id: Optional[int] = None,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
@@ -66,6 +304,8 @@ async def get_clicks(
         skip=skip, 
         limit=limit, 
         user_id=user_id, 
-        product_id=product_id
+        product_id=product_id,
+        cursor=parse_cursor(cursor)
     )
+    set_next_cursor(response, clicks, limit)
     return clicks
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, AsyncIterator, List, Literal, Optional, Sequence
+import csv
+import enum
+import io
+import json
+import zlib
+from database import get_session_factory, UnitOfWorkRoute
+from models import User, OrderStatus, PaymentStatus
+from auth import get_current_admin_user
+from config import settings
+import crud
+
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+STATUS_ENUMS = {"orders": OrderStatus, "payments": PaymentStatus}
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+async def _csv_chunks(columns: List[str], batches: AsyncIterator[Sequence[Any]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for rows in batches:
+        for row in rows:
+            writer.writerow(
+                json.dumps(value) if isinstance(value, (dict, list)) else _plain(value) for value in row
+            )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+async def _ndjson_chunks(columns: List[str], batches: AsyncIterator[Sequence[Any]]) -> AsyncIterator[str]:
+    async for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), default=_plain, ensure_ascii=False) + "\n" for row in rows
+        )
+
+async def _export_body(session_factory, query, fmt: str, compress: bool) -> AsyncIterator[bytes]:
+    """Encode rows as they arrive from the cursor, so memory stays bounded by one batch."""
+    columns = [column.key for column in query.selected_columns]
+    encode = _csv_chunks if fmt == "csv" else _ndjson_chunks
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip container
+    # Own session: the request-scoped one is closed before the body is streamed
+    async with session_factory() as db:
+        async for chunk in encode(columns, crud.stream_query(db, query, settings.export_batch_size)):
+            data = chunk.encode("utf-8")
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+@router.get("/{entity}")
+async def export_entity(
+    entity: Literal["orders", "payments", "clicks"],
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    product_id: Optional[int] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    session_factory=Depends(get_session_factory),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Stream orders, payments or clicks as CSV or NDJSON, optionally gzip-compressed (admin only)"""
+    order_status = None
+    if status_filter is not None:
+        if entity not in STATUS_ENUMS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{entity} have no status")
+        try:
+            order_status = STATUS_ENUMS[entity](status_filter)
+        except ValueError:
+            allowed = ", ".join(member.value for member in STATUS_ENUMS[entity])
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid status, expected one of: {allowed}"
+            )
+
+    query = crud.export_query(entity, start=start, end=end, product_id=product_id, status=order_status)
+    extension = "csv" if format == "csv" else "ndjson"
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    if gzip:
+        extension += ".gz"
+        media_type = "application/gzip"
+    filename = f"{entity}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.{extension}"
+    return StreamingResponse(
+        _export_body(session_factory, query, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
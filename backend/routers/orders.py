@@ -1,22 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from database import get_db
+from database import get_db, UnitOfWorkRoute
 from models import User, OrderStatus
-from auth import get_current_admin_user, verify_telegram_webapp_data
+from auth import get_current_admin_user, get_telegram_session, verify_telegram_webapp_data, TelegramSession
+from pagination import parse_cursor, set_next_cursor
 import schemas
 import crud
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 @router.post("/", response_model=schemas.Order)
 async def create_order(
     order: schemas.OrderCreate,
     request: Request,
     db: AsyncSession = Depends(get_db),
+    session: Optional[TelegramSession] = Depends(get_telegram_session),
     x_telegram_init_data: Optional[str] = Header(None)
 ):
     """Create new order with Telegram WebApp verification"""
+    # A session token already identifies the user
+    if session:
+        return await crud.create_order(db, order=order, user_id=session.user_id)
+
     # Verify Telegram WebApp data
     if not x_telegram_init_data:
         raise HTTPException(
@@ -31,42 +37,46 @@ async def create_order(
             detail="Invalid Telegram WebApp data"
         )
     
-    # Get or create user
-    user = await crud.get_user_by_telegram_id(db, str(telegram_user['id']))
-    if not user:
-        user_create = schemas.UserCreate(
-            telegram_id=str(telegram_user['id']),
-            username=telegram_user.get('username'),
-            first_name=telegram_user.get('first_name'),
-            last_name=telegram_user.get('last_name')
-        )
-        user = await crud.create_user(db, user_create)
-    
-    # Create order
-    db_order = await crud.create_order(db, order=order, user_id=user.id)
-    return db_order
+    # Upsert the user and create the order in one transaction
+    profile = schemas.UserUpdate(
+        username=telegram_user.get('username'),
+        first_name=telegram_user.get('first_name'),
+        last_name=telegram_user.get('last_name')
+    )
+    return await crud.checkout(db, order, telegram_id=str(telegram_user['id']), profile=profile)
 
 @router.get("/", response_model=List[schemas.Order])
 async def get_orders(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     user_id: Optional[int] = None,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     """Get orders (admin only)"""
-    orders = await crud.get_orders(db, skip=skip, limit=limit, user_id=user_id)
+    orders = await crud.get_orders(db, skip=skip, limit=limit, user_id=user_id, cursor=parse_cursor(cursor))
+    set_next_cursor(response, orders, limit)
     return orders
 
 @router.get("/my", response_model=List[schemas.Order])
 async def get_my_orders(
     request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
+    session: Optional[TelegramSession] = Depends(get_telegram_session),
     x_telegram_init_data: Optional[str] = Header(None)
 ):
     """Get current user's orders"""
+    if session:
+        orders = await crud.get_orders(db, skip=skip, limit=limit, user_id=session.user_id, cursor=parse_cursor(cursor))
+        set_next_cursor(response, orders, limit)
+        return orders
+
     if not x_telegram_init_data:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -84,7 +94,8 @@ async def get_my_orders(
     if not user:
         return []
     
-    orders = await crud.get_orders(db, skip=skip, limit=limit, user_id=user.id)
+    orders = await crud.get_orders(db, skip=skip, limit=limit, user_id=user.id, cursor=parse_cursor(cursor))
+    set_next_cursor(response, orders, limit)
     return orders
 
 @router.get("/overdue", response_model=List[schemas.Order])
@@ -1,17 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from database import get_db
+from typing import List, Optional
+from database import get_db, UnitOfWorkRoute
 from models import User, PaymentStatus
 from auth import get_current_admin_user
-from services.payment_adapter import PaymentAdapter
-from services.telegram_service import TelegramService
+from services.payment_adapter import get_payment_adapter
+from services.outbox import outbox_dispatcher, PAYMENT_SUCCEEDED
+from services.webhook_queue import webhook_queue
+from pagination import parse_cursor, set_next_cursor
+from config import settings
 import schemas
 import crud
 import logging
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 @router.post("/create", response_model=dict)
 async def create_payment(
@@ -37,7 +40,7 @@ async def create_payment(
         installment_number = None
     
     # Create payment via adapter
-    payment_adapter = PaymentAdapter()
+    payment_adapter = get_payment_adapter()
     payment_data = await payment_adapter.create_payment(
         amount=float(amount),
         description=f"Payment for {order.product.name}",
@@ -66,7 +69,6 @@ async def create_payment(
     # Update payment with confirmation URL
     if payment:
         payment.confirmation_url = payment_data.get("confirmation", {}).get("confirmation_url")
-        await db.commit()
     
     return {
         "payment_id": payment.id,
@@ -89,18 +91,22 @@ async def get_payment_status(
         )
     
     # Check status with payment provider
-    payment_adapter = PaymentAdapter()
-    provider_payment = await payment_adapter.get_payment(payment.provider_payment_id)
+    payment_adapter = get_payment_adapter()
+    provider_payment = await payment_adapter.get_payment(payment.yookassa_payment_id)
     
     # Update local status if needed
     provider_status = provider_payment.get("status")
-    if provider_status and provider_status != payment.status.value:
+    payment_method = (provider_payment.get("payment_method") or {}).get("type")
+    if provider_status == PaymentStatus.SUCCEEDED.value:
+        # Credit the order here too: the webhook is a no-op for a payment that already succeeded
+        await apply_payment_succeeded(db, payment.yookassa_payment_id, payment_method)
+    elif provider_status and provider_status != payment.status.value:
         new_status = PaymentStatus(provider_status)
         await crud.update_payment_status(
             db, 
             payment_id=payment.id, 
             status=new_status,
-            payment_method=provider_payment.get("payment_method", {}).get("type")
+            payment_method=payment_method
         )
     
     return {
@@ -114,13 +120,19 @@ async def payment_webhook(
     request: Request,
     db: AsyncSession = Depends(get_db)
 ):
-    """Handle payment gateway webhook"""
+    """Handle payment gateway webhook.
+
+    With the webhook queue enabled the event is only stored and acknowledged;
+    processing happens in services.webhook_queue. Providers retry deliveries
+    and may send them concurrently; the payment is applied to its order at
+    most once (see crud.apply_successful_payment).
+    """
     try:
         # Get request body
         body = await request.body()
         
         # Verify webhook
-        payment_adapter = PaymentAdapter()
+        payment_adapter = get_payment_adapter()
         if not payment_adapter.verify_webhook(body, request.headers):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -130,44 +142,17 @@ async def payment_webhook(
         # Parse webhook data
         webhook_data = await request.json()
         event_type = webhook_data.get("event")
-        payment_data = webhook_data.get("object")
         
-        if event_type == "payment.succeeded":
-            # Find payment
-            payment = await crud.get_payment_by_provider_id(
-                db, 
-                payment_data["id"]
-            )
-            
-            if payment:
-                # Update payment status
-                await crud.update_payment_status(
-                    db,
-                    payment_id=payment.id,
-                    status=PaymentStatus.SUCCEEDED,
-                    payment_method=payment_data.get("payment_method", {}).get("type")
-                )
-                
-                # Update order
-                order = payment.order
-                order.paid_amount += payment.amount
-                
-                if order.paid_amount >= order.total_amount:
-                    order.status = models.OrderStatus.PAID
-                
-                await db.commit()
-                
-                # Send notification
-                telegram_service = TelegramService()
-                await telegram_service.send_payment_success_notification(
-                    order_id=order.id,
-                    amount=float(payment.amount),
-                    product_name=order.product.name,
-                    user_name=f"{order.user.first_name} {order.user.last_name}".strip()
-                )
+        if webhook_queue.handles(event_type):
+            if settings.webhook_queue_enabled:
+                await webhook_queue.enqueue(db, _event_id(webhook_data), event_type, webhook_data)
+            else:
+                await handle_payment_succeeded(db, webhook_data)
         
         return {"status": "ok"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         raise HTTPException(
@@ -175,16 +160,45 @@ async def payment_webhook(
             detail="Webhook processing failed"
         )
 
+def _event_id(webhook_data: dict) -> str:
+    """Provider event id, or event type plus object id for providers (YooKassa) that send none."""
+    if webhook_data.get("id"):
+        return str(webhook_data["id"])
+    return f"{webhook_data.get('event')}:{webhook_data['object']['id']}"
+
+async def handle_payment_succeeded(db: AsyncSession, webhook_data: dict):
+    payment_data = webhook_data["object"]
+    await apply_payment_succeeded(
+        db,
+        payment_data["id"],
+        payment_method=(payment_data.get("payment_method") or {}).get("type")
+    )
+
+async def apply_payment_succeeded(db: AsyncSession, provider_payment_id: str, payment_method: Optional[str] = None):
+    """Credit a succeeded payment to its order and queue the notification, at most once
+    whichever of the webhook and status polling sees the success first."""
+    applied = await crud.apply_successful_payment(db, provider_payment_id, payment_method=payment_method)
+    
+    if applied:
+        # Delivered by the outbox once this commits; duplicates never get here
+        await outbox_dispatcher.publish(db, PAYMENT_SUCCEEDED, {
+            "order_id": applied.order_id,
+            "amount": str(applied.amount)
+        })
+
 @router.get("/", response_model=List[schemas.Payment])
 async def get_payments(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     order_id: int = None,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     """Get payments (admin only)"""
-    payments = await crud.get_payments(db, skip=skip, limit=limit, order_id=order_id)
+    payments = await crud.get_payments(db, skip=skip, limit=limit, order_id=order_id, cursor=parse_cursor(cursor))
+    set_next_cursor(response, payments, limit)
     return payments
 
 @router.post("/{payment_id}/refund")
@@ -203,9 +217,9 @@ async def create_refund(
         )
     
     # Create refund via payment provider
-    payment_adapter = PaymentAdapter()
+    payment_adapter = get_payment_adapter()
     refund_data = await payment_adapter.create_refund(
-        payment_id=payment.provider_payment_id,
+        payment_id=payment.yookassa_payment_id,
         amount=amount or float(payment.amount)
     )
     
@@ -214,3 +228,5 @@ async def create_refund(
         "status": refund_data["status"],
         "amount": refund_data["amount"]["value"]
     }
+
+webhook_queue.register("payment.succeeded", handle_payment_succeeded)
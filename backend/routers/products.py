@@ -1,38 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from database import get_db
+from typing import List, Optional
+from database import get_db, UnitOfWorkRoute
 from models import User
 from auth import get_current_admin_user
+from pagination import NEXT_CURSOR_HEADER, encode_cursor, parse_cursor
+from services.catalog_cache import catalog_cache
 import schemas
 import crud
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+product_list_adapter = TypeAdapter(List[schemas.Product])
 
 @router.get("/", response_model=List[schemas.Product])
 async def get_products(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     active_only: bool = True,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """Get all products"""
-    products = await crud.get_products(db, skip=skip, limit=limit, active_only=active_only)
-    return products
+    key = ("list", skip, limit, active_only, cursor)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        version = catalog_cache.version
+        products = await crud.get_products(db, skip=skip, limit=limit, active_only=active_only, cursor=parse_cursor(cursor))
+        headers = {}
+        if limit and len(products) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(products[-1].created_at, products[-1].id)
+        body = product_list_adapter.dump_json(product_list_adapter.validate_python(products, from_attributes=True))
+        entry = catalog_cache.put(key, body, version, headers)
+    return catalog_cache.respond(request, entry)
 
 @router.get("/{product_id}", response_model=schemas.Product)
 async def get_product(
     product_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
     """Get product by ID"""
-    product = await crud.get_product(db, product_id=product_id)
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Product not found"
-        )
-    return product
+    key = ("product", product_id)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        version = catalog_cache.version
+        product = await crud.get_product(db, product_id=product_id)
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+        entry = catalog_cache.put(key, schemas.Product.model_validate(product).model_dump_json().encode(), version)
+    return catalog_cache.respond(request, entry)
 
 @router.post("/", response_model=schemas.Product)
 async def create_product(
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Header
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from database import get_db, UnitOfWorkRoute
+from auth import create_session_token, verify_telegram_webapp_data
+from config import settings
+import schemas
+import crud
+
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+@router.post("/telegram", response_model=schemas.SessionToken)
+async def exchange_telegram_init_data(
+    db: AsyncSession = Depends(get_db),
+    x_telegram_init_data: Optional[str] = Header(None)
+):
+    """Exchange Telegram WebApp init data for a short-lived session token.
+
+    Send the token as X-Telegram-Session on later requests; exchange again on 401.
+    """
+    if not x_telegram_init_data:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Telegram WebApp data required"
+        )
+
+    telegram_user = verify_telegram_webapp_data(x_telegram_init_data)
+    if not telegram_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid Telegram WebApp data"
+        )
+
+    telegram_id = str(telegram_user['id'])
+    user = await crud.upsert_telegram_user(
+        db,
+        telegram_id,
+        schemas.UserUpdate(
+            username=telegram_user.get('username'),
+            first_name=telegram_user.get('first_name'),
+            last_name=telegram_user.get('last_name')
+        )
+    )
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is inactive"
+        )
+
+    return {
+        "session_token": create_session_token(user.id, telegram_id),
+        "expires_in": settings.session_token_expire_minutes * 60,
+        "user_id": user.id
+    }
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, validator
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from models import UserRole, ProductType, OrderStatus, PaymentStatus, PaymentType
 
@@ -142,6 +142,84 @@ class AnalyticsData(BaseModel):
     top_products: List[Dict[str, Any]]
     recent_orders: List[Order]
 
+class UniqueVisitors(BaseModel):
+    unique_visitors: int
+    exact: bool
+    relative_error: float
+
+class TimeSeries(BaseModel):
+    granularity: str
+    start: datetime
+    end: datetime
+    buckets: List[datetime]
+    revenue: List[float]
+    paid_orders: List[int]
+    clicks: List[int]
+    conversion_rate: List[float]
+    revenue_moving_avg: List[float]
+    paid_orders_moving_avg: List[float]
+    clicks_moving_avg: List[float]
+    revenue_delta: List[float]
+    paid_orders_delta: List[int]
+    clicks_delta: List[int]
+    totals: Dict[str, float]
+    previous_totals: Dict[str, float]
+    change_percent: Dict[str, float]
+
+class FunnelStep(BaseModel):
+    product_id: Optional[int] = None
+    product_name: Optional[str] = None
+    viewed: int
+    clicked: int
+    ordered: int
+    paid: int
+    click_rate: float
+    order_rate: float
+    payment_rate: float
+    overall_rate: float
+
+class Funnel(BaseModel):
+    start: datetime
+    end: datetime
+    totals: FunnelStep
+    products: List[FunnelStep]
+
+class WarehouseDay(BaseModel):
+    day: date
+    clicks: int
+    page_views: int
+    unique_visitors: int
+    orders: int
+    paid_orders: int
+    revenue: Decimal
+
+class WarehousePage(BaseModel):
+    page: str
+    page_views: int
+    clicks: int
+    unique_visitors: int
+
+class WarehouseProduct(BaseModel):
+    product_id: int
+    orders: int
+    paid_orders: int
+    revenue: Decimal
+
+class WarehousePaymentMethod(BaseModel):
+    payment_method: str
+    payments: int
+    succeeded: int
+    amount: Decimal
+
+class WarehouseReport(BaseModel):
+    start: datetime
+    end: datetime
+    as_of: Optional[datetime] = None
+    daily: List[WarehouseDay]
+    top_pages: List[WarehousePage]
+    top_products: List[WarehouseProduct]
+    payment_methods: List[WarehousePaymentMethod]
+
 # Admin schemas
 class AdminLogin(BaseModel):
     email: EmailStr
@@ -151,6 +229,11 @@ class AdminToken(BaseModel):
     access_token: str
     token_type: str
 
+class SessionToken(BaseModel):
+    session_token: str
+    expires_in: int  # seconds
+    user_id: int
+
 class AdminNotificationCreate(BaseModel):
     type: str
     title: str
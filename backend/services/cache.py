@@ -0,0 +1,392 @@
+import asyncio
+import enum
+import functools
+import inspect
+import json
+import logging
+import random
+import time
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import Date, DateTime, Enum, Numeric, inspect as sa_inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ModelCodec:
+    """Serializes an ORM row's column values as JSON and rebuilds it as a detached instance.
+
+    JSON rather than pickle, since values come back from a Redis shared with
+    other services. Callers get a fresh object per hit, so nothing cached is
+    ever shared or bound to another request's session. Relationships are not
+    cached; touching an unloaded one on a rebuilt instance raises
+    ``DetachedInstanceError``.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.columns = [attr.key for attr in sa_inspect(model).column_attrs]
+        self._parsers = {
+            column.key: parser
+            for column in sa_inspect(model).columns
+            if (parser := self._parser(column.type)) is not None
+        }
+
+    @staticmethod
+    def _parser(column_type) -> Optional[Callable[[Any], Any]]:
+        if isinstance(column_type, Enum) and column_type.enum_class is not None:
+            return column_type.enum_class
+        if isinstance(column_type, DateTime):
+            return datetime.fromisoformat
+        if isinstance(column_type, Date):
+            return date.fromisoformat
+        if isinstance(column_type, Numeric) and column_type.asdecimal:
+            return Decimal
+        return None
+
+    @staticmethod
+    def _default(value: Any):
+        if isinstance(value, enum.Enum):
+            return value.value
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+    def encode(self, obj) -> bytes:
+        values = {key: getattr(obj, key) for key in self.columns}
+        return json.dumps(values, default=self._default, separators=(",", ":")).encode()
+
+    def decode(self, raw: bytes):
+        values = json.loads(raw)
+        for key, parse in self._parsers.items():
+            if values.get(key) is not None:
+                values[key] = parse(values[key])
+        obj = self.model(**values)
+        make_transient_to_detached(obj)
+        return obj
+
+    def tag(self, obj_id: Any) -> str:
+        return f"{self.model.__tablename__}:{obj_id}"
+
+
+class LocalTier:
+    """Size-bounded LRU with per-entry expiry and a tag -> keys index."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, bytes, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = defaultdict(set)
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, raw: bytes, ttl: float, tags: Iterable[str]):
+        self._pop(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + ttl, raw, tags)
+        for tag in tags:
+            self._tags[tag].add(key)
+        while len(self._entries) > self.max_entries:
+            self._pop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _pop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate_tag(self, tag: str) -> int:
+        keys = self._tags.pop(tag, set())
+        for key in keys:
+            self._pop(key)
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+
+class RedisTier:
+    """Shared tier: ``cache:<ns>:<key>`` values plus ``cache:<ns>:tag:<tag>`` key sets.
+
+    Any Redis error disables the tier for ``retry_after`` seconds, so an outage
+    degrades to local-only caching instead of failing or slowing lookups.
+    """
+
+    def __init__(self, url: str, retry_after: float = 30.0):
+        self.url = url
+        self.retry_after = retry_after
+        self._client = None
+        self._down_until = 0.0
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _redis(self):
+        if self._client is None:
+            self._client = redis.from_url(self.url)
+        return self._client
+
+    def _failed(self, e: Exception):
+        self.errors += 1
+        self._down_until = time.monotonic() + self.retry_after
+        logger.warning(f"Redis cache tier unavailable for {self.retry_after:.0f}s: {e}")
+
+    async def get(self, namespace: str, key: Hashable) -> Optional[bytes]:
+        if not self.available:
+            return None
+        try:
+            return await self._redis().get(f"cache:{namespace}:{key}")
+        except Exception as e:
+            self._failed(e)
+            return None
+
+    async def set(self, namespace: str, key: Hashable, raw: bytes, ttl: float, tags: Iterable[str]):
+        if not self.available:
+            return
+        name = f"cache:{namespace}:{key}"
+        seconds = max(1, int(ttl))
+        try:
+            async with self._redis().pipeline(transaction=False) as pipe:
+                pipe.set(name, raw, ex=seconds)
+                for tag in tags:
+                    pipe.sadd(f"cache:{namespace}:tag:{tag}", name)
+                    pipe.expire(f"cache:{namespace}:tag:{tag}", seconds)
+                await pipe.execute()
+        except Exception as e:
+            self._failed(e)
+
+    async def invalidate_tag(self, namespace: str, tag: str):
+        if not self.available:
+            return
+        tag_key = f"cache:{namespace}:tag:{tag}"
+        try:
+            client = self._redis()
+            names = await client.smembers(tag_key)
+            await client.delete(tag_key, *names)
+        except Exception as e:
+            self._failed(e)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class TwoTierCache:
+    """Cache for one kind of ORM row: in-process LRU/TTL, then optional Redis.
+
+    ``None`` results are never cached, so creating a row needs no
+    invalidation. Concurrent misses for a key share one load (stampede
+    protection), and TTLs are jittered so hot keys do not expire together.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        model,
+        ttl: float,
+        max_entries: int = 10000,
+        remote: Optional[RedisTier] = None
+    ):
+        self.namespace = namespace
+        self.codec = ModelCodec(model)
+        self.ttl = ttl
+        self.local = LocalTier(max_entries)
+        self.remote = remote
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def model(self):
+        return self.codec.model
+
+    def _ttl(self) -> float:
+        return self.ttl * random.uniform(0.9, 1.0)
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        raw = self.local.get(key)
+        if raw is not None:
+            self.l1_hits += 1
+            return self.codec.decode(raw)
+        if self.remote is not None:
+            raw = await self.remote.get(self.namespace, key)
+            value = self._decode_remote(raw) if raw is not None else None
+            if value is not None:
+                self.l2_hits += 1
+                # Tagged like a loaded row, so invalidate_local can evict it
+                self.local.set(key, raw, self._ttl(), (self.codec.tag(value.id),))
+                return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            raw = await asyncio.shield(pending)
+            return self.codec.decode(raw) if raw is not None else None
+
+        self.misses += 1
+        generation = self._generation
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            raw = self.codec.encode(value) if value is not None else None
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; silence "never retrieved"
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        future.set_result(raw)
+
+        # Skip storing if an invalidation raced with the load
+        if raw is not None and generation == self._generation:
+            tags = (self.codec.tag(value.id),)
+            ttl = self._ttl()
+            self.local.set(key, raw, ttl, tags)
+            if self.remote is not None:
+                await self.remote.set(self.namespace, key, raw, ttl, tags)
+        return value
+
+    def _decode_remote(self, raw: bytes):
+        # Anything unreadable (say, written by an older release) is treated as a miss
+        try:
+            return self.codec.decode(raw)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable {self.namespace} entry in Redis: {e}")
+            return None
+
+    def peek(self, key: Hashable):
+        """Local-tier lookup that never loads; for write paths that can skip work on a hit."""
+        raw = self.local.get(key)
+        return self.codec.decode(raw) if raw is not None else None
+
+    def put(self, key: Hashable, value):
+        """Store a row the caller just wrote, so the next lookup needs no query."""
+        self._generation += 1  # a load already in flight may predate the write
+        self.local.set(key, self.codec.encode(value), self._ttl(), (self.codec.tag(value.id),))
+
+    def invalidate_local(self, obj_id: Any = None):
+        """Evict one row (by primary key) or, with no id, everything from this process."""
+        self._generation += 1
+        self.invalidations += 1
+        if obj_id is None:
+            self.local.clear()
+        else:
+            self.local.invalidate_tag(self.codec.tag(obj_id))
+
+    async def invalidate(self, obj_id: Any):
+        """Evict one row from both tiers."""
+        self.invalidate_local(obj_id)
+        if self.remote is not None:
+            await self.remote.invalidate_tag(self.namespace, self.codec.tag(obj_id))
+
+    def clear(self):
+        self._generation += 1
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.l1_hits + self.l2_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self.local),
+            "hits": hits,
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.local.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+redis_tier = RedisTier(settings.redis_url) if settings.cache_redis_enabled else None
+caches: Dict[str, TwoTierCache] = {}
+
+
+def create_cache(namespace: str, model, ttl: float) -> TwoTierCache:
+    cache = TwoTierCache(
+        namespace, model, ttl=ttl, max_entries=settings.cache_local_max_entries, remote=redis_tier
+    )
+    caches[namespace] = cache
+    return cache
+
+
+def caches_for(model) -> List[TwoTierCache]:
+    return [cache for cache in caches.values() if cache.model is model]
+
+
+async def invalidate_cached(model, obj_id: Any):
+    """Explicit hook for write paths: drop a row from every cache of ``model``, both tiers."""
+    for cache in caches_for(model):
+        await cache.invalidate(obj_id)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    stats = {namespace: cache.stats() for namespace, cache in caches.items()}
+    if redis_tier is not None:
+        stats["_redis"] = {"available": redis_tier.available, "errors": redis_tier.errors}
+    return stats
+
+
+def clear_caches():
+    for cache in caches.values():
+        cache.clear()
+
+
+async def close_caches():
+    if redis_tier is not None:
+        await redis_tier.close()
+
+
+def cached(cache: TwoTierCache, key: str):
+    """Cache an async crud lookup in ``cache``, keyed by its argument named ``key``.
+
+    The wrapped function stays available as ``.uncached``.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if not settings.cache_enabled:
+                return await fn(*args, **kwargs)
+            cache_key = signature.bind(*args, **kwargs).arguments[key]
+            return await cache.get(cache_key, lambda: fn(*args, **kwargs))
+
+        wrapper.uncached = fn
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
@@ -0,0 +1,77 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from fastapi import Request, Response
+
+from config import settings
+from services.invalidation import invalidation_bus, PRODUCT_CHANGED
+
+
+class CachedBody:
+    """A serialized response body with its strong ETag and extra headers."""
+
+    __slots__ = ("body", "etag", "headers")
+
+    def __init__(self, body: bytes, headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        # Derived from the bytes alone, so every worker agrees on it
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.headers = headers or {}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as RFC 9110 prescribes for If-None-Match."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class CatalogCache:
+    """Pre-serialized catalog responses keyed by query shape.
+
+    Admin writes call ``bump``, which advances the version and drops every
+    entry; ``put`` ignores bodies computed against an older version, so a read
+    racing with a write cannot cache pre-write data.
+    """
+
+    def __init__(self, max_entries: int = 512, cache_control: str = "public, max-age=30"):
+        self.max_entries = max_entries
+        self.cache_control = cache_control
+        self.version = 0
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, body: bytes, version: int, headers: Optional[Dict[str, str]] = None) -> CachedBody:
+        entry = CachedBody(body, headers)
+        if version == self.version:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def bump(self):
+        self.version += 1
+        self._entries.clear()
+
+    def respond(self, request: Request, entry: CachedBody) -> Response:
+        """200 with the cached bytes, or 304 when the client already holds them."""
+        headers = {"ETag": entry.etag, "Cache-Control": self.cache_control, **entry.headers}
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+catalog_cache = CatalogCache(
+    max_entries=settings.catalog_cache_max_entries,
+    cache_control=settings.catalog_cache_control,
+)
+invalidation_bus.subscribe(PRODUCT_CHANGED, lambda event: catalog_cache.bump())
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from config import settings
+from database import AsyncSessionLocal
+from services.webhook_queue import retry_delay
+import crud
+
+logger = logging.getLogger(__name__)
+
+
+class ClickBuffer:
+    """Write-behind buffer for click events.
+
+    Clicks are queued in memory and a background task writes them in
+    multi-row batches once either ``batch_size`` events are waiting or
+    ``flush_interval`` seconds have passed since the first queued event.
+    Telegram users are resolved to internal ids once per batch at flush time.
+    A batch the database rejects is split and retried, so only the offending
+    rows are dropped; while the database is unreachable the batch is kept and
+    retried with backoff instead.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        put_timeout: float = 0.05,
+        max_attempts: int = 5,
+        retry_base: float = 0.5,
+        retry_max: float = 30.0,
+    ):
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._stopping = asyncio.Event()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[Dict[str, Any]] = []
+        self._inflight: Optional[asyncio.Future] = None
+        self.flushed = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="click-buffer-flusher")
+        logger.info("Click buffer started")
+
+    async def stop(self):
+        """Stop the flusher and write out everything still queued."""
+        if self._task is None:
+            return
+        # Shutdown must not wait out retries; each remaining batch gets one attempt
+        self._stopping.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        if self._inflight is not None:
+            await self._inflight
+            self._inflight = None
+        batch, self._batch = self._batch, []
+        await self._flush(batch)
+        while not self._queue.empty():
+            batch = self._take_nowait(self.batch_size)
+            await self._flush(batch)
+        logger.info(f"Click buffer drained, {self.flushed} clicks written, {self.dropped} dropped")
+
+    @staticmethod
+    def _make_event(
+        page: str,
+        action: str,
+        product_id: Optional[int] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        telegram_id: Optional[str] = None,
+        user_id: Optional[int] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        return {
+            "page": page,
+            "action": action,
+            "product_id": product_id,
+            "meta_data": metadata,
+            "user_id": user_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "created_at": datetime.now(timezone.utc),
+            "telegram_id": telegram_id,
+        }
+
+    async def put(self, **fields) -> bool:
+        """Queue a click. Returns False when the buffer stayed full for ``put_timeout``."""
+        event = self._make_event(**fields)
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            pass
+        try:
+            await asyncio.wait_for(self._queue.put(event), timeout=self.put_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            return False
+
+    async def put_many(self, events: List[Dict[str, Any]], **common) -> bool:
+        """Queue a batch of clicks all-or-nothing, so a rejected batch can be retried as a whole."""
+        if self.max_size - self._queue.qsize() < len(events):
+            await asyncio.sleep(self.put_timeout)
+            if self.max_size - self._queue.qsize() < len(events):
+                self.dropped += len(events)
+                return False
+        for event in events:
+            self._queue.put_nowait(self._make_event(**event, **common))
+        return True
+
+    def _take_nowait(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Events collected so far live on self._batch so stop() can still write them
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                self._batch.extend(self._take_nowait(self.batch_size - len(self._batch)))
+                if len(self._batch) >= self.batch_size:
+                    break
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._batch = self._batch, []
+            # Shield the write so that shutdown cancellation cannot lose a batch mid-flight
+            self._inflight = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        """Write ``batch``, retrying with backoff while the database is unavailable.
+
+        Only rows the database rejects (constraint or data errors) and rows
+        still unwritten after ``max_attempts`` count as dropped.
+        """
+        if not batch:
+            return
+        rows = batch
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if rows is batch:
+                    rows = await self._resolve_users(batch)
+                rows = await self._insert(rows)
+            except Exception as e:
+                error = e
+            else:
+                return
+            if attempt == self.max_attempts or self._stopping.is_set():
+                break
+            delay = retry_delay(attempt, self.retry_base, self.retry_max)
+            logger.warning(f"Failed to flush {len(rows)} clicks (attempt {attempt}), retrying in {delay:.1f}s: {error}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        self.dropped += len(rows)
+        logger.error(f"Dropped {len(rows)} clicks after {attempt} attempts: {error}")
+
+    async def _resolve_users(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        telegram_ids = list({e["telegram_id"] for e in batch if e["telegram_id"] and not e["user_id"]})
+        async with self.session_factory() as db:
+            user_ids = await crud.get_user_ids_by_telegram_ids(db, telegram_ids)
+        rows = []
+        for event in batch:
+            row = {key: value for key, value in event.items() if key != "telegram_id"}
+            if not row["user_id"] and event["telegram_id"]:
+                row["user_id"] = user_ids.get(event["telegram_id"])
+            rows.append(row)
+        return rows
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Write ``rows``, splitting a chunk the database rejects in half until the
+        bad rows (say, clicks on a deleted product) are isolated and dropped.
+
+        Any other error stops the write and is raised with ``rows`` left
+        holding only what is still unwritten; returns an empty list otherwise.
+        """
+        chunks = [rows]
+        while chunks:
+            chunk = chunks.pop()
+            try:
+                async with self.session_factory() as db:
+                    await crud.create_clicks_bulk(db, chunk)
+                    await db.commit()
+            except (IntegrityError, DataError) as e:
+                if len(chunk) == 1:
+                    self.dropped += 1
+                    logger.error(f"Dropped click {chunk[0]['page']}/{chunk[0]['action']}: {e.orig}")
+                    continue
+                middle = len(chunk) // 2
+                chunks += [chunk[middle:], chunk[:middle]]
+                continue
+            except Exception:
+                chunks.append(chunk)
+                rows[:] = [row for pending in chunks for row in pending]
+                raise
+            self.flushed += len(chunk)
+        return []
+
+
+def create_click_buffer() -> ClickBuffer:
+    return ClickBuffer(
+        AsyncSessionLocal,
+        max_size=settings.click_buffer_max_size,
+        batch_size=settings.click_buffer_batch_size,
+        flush_interval=settings.click_buffer_flush_interval,
+        put_timeout=settings.click_buffer_put_timeout,
+        max_attempts=settings.click_buffer_max_attempts,
+        retry_base=settings.click_buffer_retry_base,
+        retry_max=settings.click_buffer_retry_max,
+    )
+
+
+click_buffer = create_click_buffer()
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from config import settings
+from services.invalidation import invalidation_bus, ORDER_CHANGED, PRODUCT_CHANGED, ROLLUPS_REFRESHED
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class SnapshotCache:
+    """Computed snapshots with a TTL, single-flight loading and refresh-ahead.
+
+    - Concurrent misses for a key share one computation.
+    - A hit within ``refresh_ahead`` seconds of expiry is served as-is while a
+      background task recomputes it, so steady readers never wait.
+    - ``mark_stale`` bumps a generation counter; snapshots (and in-flight
+      computations) from an older generation are not served again, so the
+      next read reflects the write that invalidated them.
+    """
+
+    def __init__(self, ttl: float, refresh_ahead: float, max_entries: int = 64):
+        self.ttl = ttl
+        self.refresh_ahead = min(refresh_ahead, ttl)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Tuple[int, asyncio.Task]] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def mark_stale(self):
+        self._generation += 1
+
+    async def get(self, key: Hashable, loader: Loader) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            computed_at, generation, value = entry
+            age = time.monotonic() - computed_at
+            if generation == self._generation and age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                if age >= self.ttl - self.refresh_ahead:
+                    self._load(key, loader)
+                return value
+        self.misses += 1
+        # Shielded: a client disconnecting must not cancel the shared computation
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: Hashable, loader: Loader) -> asyncio.Task:
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[0] == self._generation:
+            return inflight[1]
+
+        generation = self._generation
+        task = asyncio.create_task(self._compute(key, loader, generation))
+        self._inflight[key] = (generation, task)
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return task
+
+    async def _compute(self, key: Hashable, loader: Loader, generation: int) -> Any:
+        value = await loader()
+        self.refreshes += 1
+        current = self._entries.get(key)
+        # Never overwrite a snapshot computed after a newer invalidation
+        if current is None or current[1] <= generation:
+            self._entries[key] = (time.monotonic(), generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[1] is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Snapshot refresh for {key!r} failed: {task.exception()}")
+
+    def clear(self):
+        self._entries.clear()
+
+    async def close(self):
+        """Cancel background computations, e.g. before the engine is disposed."""
+        tasks = [task for _, task in self._inflight.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._inflight.clear()
+
+
+dashboard_cache = SnapshotCache(
+    ttl=settings.dashboard_cache_ttl,
+    refresh_ahead=settings.dashboard_cache_refresh_ahead,
+    max_entries=settings.dashboard_cache_max_entries,
+)
+# Recent orders are read live; the totals change once a rollup refresh folds the write in
+invalidation_bus.subscribe(ORDER_CHANGED, lambda event: dashboard_cache.mark_stale())
+invalidation_bus.subscribe(ROLLUPS_REFRESHED, lambda event: dashboard_cache.mark_stale())
+# Top products show product names
+invalidation_bus.subscribe(PRODUCT_CHANGED, lambda event: dashboard_cache.mark_stale())
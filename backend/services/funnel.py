@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+import crud
+
+STAGES = ("viewed", "clicked", "ordered", "paid")
+
+
+def _rate(numerator: int, denominator: int) -> float:
+    return round(numerator / denominator * 100, 2) if denominator else 0.0
+
+
+def funnel_step(product_id: Optional[int], product_name: Optional[str], counts: Dict[str, int]) -> Dict[str, Any]:
+    """Stage counts for one product plus the conversion rate between each stage."""
+    return {
+        "product_id": product_id,
+        "product_name": product_name,
+        **counts,
+        "click_rate": _rate(counts["clicked"], counts["viewed"]),
+        "order_rate": _rate(counts["ordered"], counts["clicked"]),
+        "payment_rate": _rate(counts["paid"], counts["ordered"]),
+        "overall_rate": _rate(counts["paid"], counts["viewed"]),
+    }
+
+
+def build_funnel(start: datetime, end: datetime, rows: Sequence[Any]) -> Dict[str, Any]:
+    """Shape ``crud.get_funnel_rows`` output; the ``product_id`` None row is the total."""
+    totals = funnel_step(None, None, {stage: 0 for stage in STAGES})
+    products: List[Dict[str, Any]] = []
+    for row in rows:
+        counts = {stage: int(getattr(row, stage) or 0) for stage in STAGES}
+        if row.product_id is None:
+            totals = funnel_step(None, None, counts)
+        else:
+            products.append(funnel_step(row.product_id, row.product_name, counts))
+    products.sort(key=lambda step: (-step["paid"], -step["viewed"], step["product_id"]))
+    return {"start": start, "end": end, "totals": totals, "products": products}
+
+
+class FunnelCache:
+    """LRU of computed funnels keyed by ``(start, end, product_id)``.
+
+    Windows that closed more than ``settle_seconds`` ago no longer change and
+    are kept for ``closed_ttl``; windows that are still open expire after
+    ``open_ttl``. Concurrent misses for the same key share one computation.
+    """
+
+    def __init__(self, max_entries: int, open_ttl: float, closed_ttl: float, settle_seconds: float):
+        self.max_entries = max_entries
+        self.open_ttl = open_ttl
+        self.closed_ttl = closed_ttl
+        self.settle_seconds = settle_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, end: datetime) -> float:
+        settled = datetime.now(timezone.utc) - timedelta(seconds=self.settle_seconds)
+        return self.closed_ttl if end <= settled else self.open_ttl
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Tuple, value: Dict[str, Any], ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: Tuple, end: datetime, compute) -> Dict[str, Any]:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Nobody may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.set(key, value, self.ttl_for(end))
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+
+funnel_cache = FunnelCache(
+    max_entries=settings.funnel_cache_max_entries,
+    open_ttl=settings.funnel_cache_open_ttl,
+    closed_ttl=settings.funnel_cache_closed_ttl,
+    settle_seconds=settings.rollup_settle_seconds,
+)
+
+
+async def get_funnel(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    product_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """Purchase funnel for ``[start, end)``, served from ``funnel_cache`` when possible."""
+    async def compute():
+        rows = await crud.get_funnel_rows(db, start, end, product_id)
+        return build_funnel(start, end, rows)
+
+    return await funnel_cache.get_or_compute((start, end, product_id), end, compute)
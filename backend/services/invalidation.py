@@ -0,0 +1,274 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from typing import AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Set
+
+import redis.asyncio as redis
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_CHANGED = "product_changed"
+USER_CHANGED = "user_changed"
+ORDER_CHANGED = "order_changed"
+ROLLUPS_REFRESHED = "rollups_refreshed"
+EVENT_KINDS = (PRODUCT_CHANGED, USER_CHANGED, ORDER_CHANGED, ROLLUPS_REFRESHED)
+FLUSH_ALL = "flush_all"  # wire-only: run every handler
+
+
+class InvalidationEvent(NamedTuple):
+    kind: str
+    id: Optional[int] = None
+
+
+Handler = Callable[[InvalidationEvent], None]
+
+
+class RedisBackend:
+    """Pub/sub over one Redis channel."""
+
+    def __init__(self, url: str, channel: str):
+        self.url = url
+        self.channel = channel
+
+    async def connect(self) -> "RedisConnection":
+        client = redis.from_url(self.url, decode_responses=True)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+        except Exception:
+            await client.aclose()
+            raise
+        return RedisConnection(client, pubsub, self.channel)
+
+
+class RedisConnection:
+    def __init__(self, client, pubsub, channel: str):
+        self._client = client
+        self._pubsub = pubsub
+        self._channel = channel
+
+    async def publish(self, message: str):
+        await self._client.publish(self._channel, message)
+
+    async def listen(self) -> AsyncIterator[str]:
+        async for message in self._pubsub.listen():
+            if message["type"] == "message":
+                yield message["data"]
+
+    async def close(self):
+        await self._pubsub.aclose()
+        await self._client.aclose()
+
+
+class MemoryBackend:
+    """In-process stand-in for Redis: every connection receives every message.
+
+    Used in tests and single-process deployments; buses sharing one backend
+    behave like workers sharing one Redis channel.
+    """
+
+    def __init__(self):
+        self._queues: Set[asyncio.Queue] = set()
+
+    async def connect(self) -> "MemoryConnection":
+        return MemoryConnection(self)
+
+
+class MemoryConnection:
+    def __init__(self, backend: MemoryBackend):
+        self._backend = backend
+        self._queue: asyncio.Queue = asyncio.Queue()
+        backend._queues.add(self._queue)
+
+    async def publish(self, message: str):
+        for queue in list(self._backend._queues):
+            queue.put_nowait(message)
+
+    async def listen(self) -> AsyncIterator[str]:
+        while True:
+            yield await self._queue.get()
+
+    async def close(self):
+        self._backend._queues.discard(self._queue)
+
+
+class InvalidationBus:
+    """Broadcasts cache invalidations to every worker.
+
+    ``publish`` runs the local handlers immediately and queues the event for
+    the other workers. While the backend is unreachable, events from other
+    workers are lost, so every handler is run each ``fallback_ttl`` seconds,
+    which bounds how stale a local cache can get, and once more on reconnect.
+    Events this worker fails to send are lost to the others in the same way,
+    so after any dropped publish the next successful send is preceded by a
+    flush-all broadcast.
+    """
+
+    def __init__(self, backend, fallback_ttl: float = 30.0, max_pending: int = 1000):
+        self.backend = backend
+        self.fallback_ttl = fallback_ttl
+        self.origin = uuid.uuid4().hex
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._connection = None
+        self._tasks: List[asyncio.Task] = []
+        self._last_flush = time.monotonic()
+        self._missed = False
+        self.connected = False
+        self.received = 0
+        self.dropped = 0
+
+    def subscribe(self, kind: str, handler: Handler):
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"Unknown invalidation event: {kind}")
+        self._handlers[kind].append(handler)
+
+    def publish(self, kind: str, id: Optional[int] = None):
+        """Invalidate locally now and on the other workers as soon as possible."""
+        event = InvalidationEvent(kind, id)
+        self._dispatch(event)
+        if not self._tasks:
+            return
+        try:
+            self._outbox.put_nowait(self._encode(kind, id))
+        except asyncio.QueueFull:
+            self._drop()
+
+    async def broadcast(self, kind: str, id: Optional[int] = None):
+        """``publish`` that also reaches the other workers from a process not
+        running the bus, e.g. a Celery task, over a short-lived connection."""
+        if self._tasks:
+            self.publish(kind, id)
+            return
+        self._dispatch(InvalidationEvent(kind, id))
+        try:
+            connection = await self.backend.connect()
+        except Exception as e:
+            logger.warning(f"Failed to broadcast invalidation {kind}: {e}")
+            return
+        try:
+            await connection.publish(self._encode(kind, id))
+        except Exception as e:
+            logger.warning(f"Failed to broadcast invalidation {kind}: {e}")
+        finally:
+            await connection.close()
+
+    def _encode(self, kind: str, id: Optional[int] = None) -> str:
+        return json.dumps({"kind": kind, "id": id, "origin": self.origin})
+
+    def _drop(self):
+        self.dropped += 1
+        self._missed = True
+
+    def _dispatch(self, event: InvalidationEvent):
+        for handler in self._handlers.get(event.kind, ()):
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"Invalidation handler for {event.kind} failed: {e}")
+
+    def _flush_all(self):
+        self._last_flush = time.monotonic()
+        for kind in EVENT_KINDS:
+            self._dispatch(InvalidationEvent(kind))
+
+    def _receive(self, message: str):
+        try:
+            data = json.loads(message)
+            event = InvalidationEvent(data["kind"], data.get("id"))
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Ignoring malformed invalidation message: {message!r}")
+            return
+        if data.get("origin") == self.origin:
+            return
+        self.received += 1
+        if event.kind == FLUSH_ALL:
+            self._flush_all()
+        else:
+            self._dispatch(event)
+
+    async def _listen(self):
+        delay = min(1.0, self.fallback_ttl)
+        while True:
+            try:
+                connection = await self.backend.connect()
+            except Exception as e:
+                logger.warning(f"Invalidation bus unavailable, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                if time.monotonic() - self._last_flush >= self.fallback_ttl:
+                    self._flush_all()
+                delay = min(delay * 2, self.fallback_ttl)
+                continue
+
+            # Events published while we were disconnected were missed
+            self._flush_all()
+            self._connection = connection
+            self.connected = True
+            if self._missed and self._outbox.empty():
+                # Wake the sender so peers get the flush-all without waiting for the next event
+                self._outbox.put_nowait(None)
+            delay = min(1.0, self.fallback_ttl)
+            try:
+                async for message in connection.listen():
+                    self._receive(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Invalidation bus connection lost: {e}")
+            finally:
+                self.connected = False
+                self._connection = None
+                try:
+                    await connection.close()
+                except Exception:
+                    pass
+
+    async def _send(self):
+        while True:
+            message = await self._outbox.get()
+            connection = self._connection
+            if connection is None:
+                if message is not None:
+                    self._drop()
+                continue
+            try:
+                if self._missed:
+                    # Peers never saw the events we dropped; have them flush everything
+                    self._missed = False
+                    await connection.publish(self._encode(FLUSH_ALL))
+                if message is not None:
+                    await connection.publish(message)
+            except Exception as e:
+                self._missed = True
+                if message is not None:
+                    self.dropped += 1
+                logger.warning(f"Failed to publish invalidation: {e}")
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._listen(), name="invalidation-listener"),
+                asyncio.create_task(self._send(), name="invalidation-sender"),
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def create_invalidation_bus() -> InvalidationBus:
+    if settings.invalidation_backend == "redis":
+        backend = RedisBackend(settings.redis_url, settings.invalidation_channel)
+    else:
+        backend = MemoryBackend()
+    return InvalidationBus(backend, fallback_ttl=settings.invalidation_fallback_ttl)
+
+
+invalidation_bus = create_invalidation_bus()
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import settings
+from database import AsyncSessionLocal, after_commit, unit_of_work
+from services.telegram_service import TelegramService
+from services.webhook_queue import retry_delay
+import crud
+import models
+
+logger = logging.getLogger(__name__)
+
+# Topics
+PAYMENT_SUCCEEDED = "payment.succeeded"
+INSTALLMENT_OVERDUE = "installment.overdue"
+
+OutboxHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class OutboxDispatcher:
+    """Delivers side effects recorded in the outbox table.
+
+    Code that changes state calls ``publish`` inside its unit of work, so the
+    message commits (or rolls back) with the change and the request never
+    waits on the external call. The dispatcher claims up to ``batch_size``
+    due messages on its registered topics with SKIP LOCKED, so it can run in
+    every API process and in Celery at once. It delivers them with at most
+    ``concurrency`` in flight, then marks the batch in one transaction.
+    Failed deliveries are retried with exponential backoff until
+    ``max_attempts``. Delivery is at least once: a message whose dispatcher
+    dies mid-batch is sent again after its lease expires.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        batch_size: int = 100,
+        concurrency: int = 10,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 10,
+        retry_base: float = 5.0,
+        retry_max: float = 900.0,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._handlers: Dict[str, OutboxHandler] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, topic: str, handler: OutboxHandler):
+        self._handlers[topic] = handler
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def publish(self, db: AsyncSession, topic: str, payload: Dict[str, Any]):
+        """Record ``payload`` for delivery once ``db``'s transaction commits."""
+        await crud.add_outbox_message(db, topic, payload)
+        after_commit(db, self._wake)
+
+    async def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _deliver(self, message: models.OutboxMessage, semaphore: asyncio.Semaphore) -> Optional[Exception]:
+        async with semaphore:
+            try:
+                await self._handlers[message.topic](message.payload)
+            except Exception as e:
+                return e
+        return None
+
+    async def run_once(self) -> int:
+        """Claim, deliver and settle one batch; returns the number of messages claimed."""
+        async with self.session_factory() as db:
+            messages = await crud.claim_outbox_messages(
+                db, limit=self.batch_size, lease_seconds=self.lease_seconds, topics=list(self._handlers)
+            )
+        if not messages:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        errors = await asyncio.gather(*(self._deliver(message, semaphore) for message in messages))
+
+        async with unit_of_work(self.session_factory) as db:
+            done = [message.id for message, error in zip(messages, errors) if error is None]
+            await crud.complete_outbox_messages(db, done)
+            self.delivered += len(done)
+            for message, error in zip(messages, errors):
+                if error is None:
+                    continue
+                if message.attempts < self.max_attempts:
+                    delay = retry_delay(message.attempts, self.retry_base, self.retry_max)
+                    self.retried += 1
+                    logger.warning(f"Outbox message {message.id} ({message.topic}) failed (attempt {message.attempts}), retrying in {delay:.1f}s: {error}")
+                else:
+                    delay = None
+                    self.failed += 1
+                    logger.error(f"Outbox message {message.id} ({message.topic}) failed permanently after {message.attempts} attempts: {error}")
+                await crud.retry_outbox_message(db, message.id, repr(error), delay)
+        return len(messages)
+
+    async def drain(self) -> int:
+        """Deliver everything that is due now; for Celery and tests."""
+        total = 0
+        while True:
+            claimed = await self.run_once()
+            total += claimed
+            if claimed < self.batch_size:
+                return total
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.run_once() >= self.batch_size:
+                    continue  # more may be due right away
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="outbox-dispatcher")
+        logger.info("Outbox dispatcher started")
+
+    async def stop(self):
+        """Stop dispatching; an interrupted batch is delivered again after its lease."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+
+
+outbox_dispatcher = OutboxDispatcher(
+    AsyncSessionLocal,
+    batch_size=settings.outbox_batch_size,
+    concurrency=settings.outbox_concurrency,
+    poll_interval=settings.outbox_poll_interval,
+    lease_seconds=settings.outbox_lease_seconds,
+    max_attempts=settings.outbox_max_attempts,
+    retry_base=settings.outbox_retry_base,
+    retry_max=settings.outbox_retry_max,
+)
+
+
+# Handlers
+async def _notify_admin(sent: Awaitable[bool]):
+    # TelegramService reports failures as False; raise so the message is retried
+    if not await sent:
+        raise RuntimeError("Telegram admin notification was not delivered")
+
+
+def _telegram_configured() -> bool:
+    return bool(settings.telegram_bot_token and settings.telegram_admin_chat_id)
+
+
+def _customer_name(user: models.User) -> str:
+    return f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or "Unknown"
+
+
+async def deliver_payment_succeeded(payload: Dict[str, Any]):
+    if not _telegram_configured():
+        return
+    async with outbox_dispatcher.session_factory() as db:
+        order = await crud.get_order(db, order_id=payload["order_id"])
+    if order is None:
+        return
+    await _notify_admin(TelegramService().send_payment_success_notification(
+        order_id=order.id,
+        amount=float(payload["amount"]),
+        product_name=order.product.name,
+        user_name=_customer_name(order.user)
+    ))
+
+
+async def deliver_installment_overdue(payload: Dict[str, Any]):
+    if not _telegram_configured():
+        return
+    await _notify_admin(TelegramService().send_installment_reminder(
+        order_id=payload["order_id"],
+        amount=payload["amount"],
+        product_name=payload["product_name"],
+        user_name=payload["user_name"],
+        days_overdue=payload["days_overdue"]
+    ))
+
+
+outbox_dispatcher.register(PAYMENT_SUCCEEDED, deliver_payment_succeeded)
+outbox_dispatcher.register(INSTALLMENT_OVERDUE, deliver_installment_overdue)
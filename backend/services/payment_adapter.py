@@ -10,18 +10,51 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def create_http_session() -> aiohttp.ClientSession:
+    """Pooled session for provider calls: keep-alive connections, per-host limit,
+    cached DNS and explicit timeouts instead of aiohttp's 5 minute default."""
+    connector = aiohttp.TCPConnector(
+        limit=settings.payment_http_pool_size,
+        limit_per_host=settings.payment_http_pool_size_per_host,
+        ttl_dns_cache=settings.payment_http_dns_cache_ttl,
+        keepalive_timeout=settings.payment_http_keepalive_timeout,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=settings.payment_http_total_timeout,
+        connect=settings.payment_http_connect_timeout,
+        sock_read=settings.payment_http_read_timeout,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
 class PaymentAdapter:
-    """Generic payment gateway adapter for multiple providers (Stripe, Square, etc.)"""
+    """Generic payment gateway adapter for multiple providers (Stripe, Square, etc.)
+    
+    Use the process-wide instance from ``get_payment_adapter``: it keeps one
+    pooled HTTP session, so provider calls reuse warm connections instead of
+    paying DNS, TCP and TLS setup every time.
+    """
     
-    def __init__(self):
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
         # Support multiple payment providers
         self.provider = getattr(settings, 'payment_provider', 'stripe').lower()
         self.api_key = getattr(settings, 'payment_api_key', '')
         self.base_url = self._get_base_url()
+        self._session = session
         
         if not self.api_key:
             raise ValueError(f"Payment API key not configured for provider: {self.provider}")
     
+    def http(self) -> aiohttp.ClientSession:
+        """The adapter's HTTP session, opened on first use (must be called on the event loop)."""
+        if self._session is None or self._session.closed:
+            self._session = create_http_session()
+        return self._session
+    
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
     def _get_base_url(self) -> str:
         """Get API base URL based on provider"""
         urls = {
@@ -87,14 +120,13 @@ class PaymentAdapter:
             "Content-Type": "application/x-www-form-urlencoded"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=payload, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Payment creation failed: {error_text}")
-                    raise Exception(f"Payment creation failed: {error_text}")
+        async with self.http().post(url, data=payload, headers=headers) as response:
+            if response.status == 200:
+                return await response.json()
+            else:
+                error_text = await response.text()
+                logger.error(f"Payment creation failed: {error_text}")
+                raise Exception(f"Payment creation failed: {error_text}")
     
     async def _create_square_payment(
         self,
@@ -125,14 +157,13 @@ class PaymentAdapter:
             "Square-Version": "2023-01-10"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status == 200 or response.status == 201:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Payment creation failed: {error_text}")
-                    raise Exception(f"Payment creation failed: {error_text}")
+        async with self.http().post(url, json=payload, headers=headers) as response:
+            if response.status == 200 or response.status == 201:
+                return await response.json()
+            else:
+                error_text = await response.text()
+                logger.error(f"Payment creation failed: {error_text}")
+                raise Exception(f"Payment creation failed: {error_text}")
     
     async def get_payment(self, payment_id: str) -> Dict[str, Any]:
         """Get payment info"""
@@ -148,14 +179,13 @@ class PaymentAdapter:
             "Content-Type": "application/json"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Payment retrieval failed: {error_text}")
-                    raise Exception(f"Payment retrieval failed: {error_text}")
+        async with self.http().get(url, headers=headers) as response:
+            if response.status == 200:
+                return await response.json()
+            else:
+                error_text = await response.text()
+                logger.error(f"Payment retrieval failed: {error_text}")
+                raise Exception(f"Payment retrieval failed: {error_text}")
     
     async def capture_payment(self, payment_id: str, amount: Optional[float] = None) -> Dict[str, Any]:
         """Capture payment"""
@@ -169,14 +199,13 @@ class PaymentAdapter:
             "Content-Type": "application/x-www-form-urlencoded"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Payment capture failed: {error_text}")
-                    raise Exception(f"Payment capture failed: {error_text}")
+        async with self.http().post(url, headers=headers) as response:
+            if response.status == 200:
+                return await response.json()
+            else:
+                error_text = await response.text()
+                logger.error(f"Payment capture failed: {error_text}")
+                raise Exception(f"Payment capture failed: {error_text}")
     
     async def cancel_payment(self, payment_id: str) -> Dict[str, Any]:
         """Cancel payment"""
@@ -190,14 +219,13 @@ class PaymentAdapter:
             "Content-Type": "application/json"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Payment cancellation failed: {error_text}")
-                    raise Exception(f"Payment cancellation failed: {error_text}")
+        async with self.http().post(url, headers=headers) as response:
+            if response.status == 200:
+                return await response.json()
+            else:
+                error_text = await response.text()
+                logger.error(f"Payment cancellation failed: {error_text}")
+                raise Exception(f"Payment cancellation failed: {error_text}")
     
     async def create_refund(self, payment_id: str, amount: float) -> Dict[str, Any]:
         """Create refund"""
@@ -224,14 +252,13 @@ class PaymentAdapter:
             "Content-Type": "application/json"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status == 200 or response.status == 201:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Refund creation failed: {error_text}")
-                    raise Exception(f"Refund creation failed: {error_text}")
+        async with self.http().post(url, json=payload, headers=headers) as response:
+            if response.status == 200 or response.status == 201:
+                return await response.json()
+            else:
+                error_text = await response.text()
+                logger.error(f"Refund creation failed: {error_text}")
+                raise Exception(f"Refund creation failed: {error_text}")
     
     def verify_webhook(self, body: bytes, headers: Dict[str, str]) -> bool:
         """Verify webhook signature based on provider"""
@@ -288,14 +315,13 @@ class PaymentAdapter:
             "Content-Type": "application/x-www-form-urlencoded"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=payload, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Webhook setup failed: {error_text}")
-                    raise Exception(f"Webhook setup failed: {error_text}")
+        async with self.http().post(url, data=payload, headers=headers) as response:
+            if response.status == 200:
+                return await response.json()
+            else:
+                error_text = await response.text()
+                logger.error(f"Webhook setup failed: {error_text}")
+                raise Exception(f"Webhook setup failed: {error_text}")
     
     async def _setup_square_webhook(self, webhook_url: str) -> Dict[str, Any]:
         """Setup webhook in Square"""
@@ -312,15 +338,36 @@ class PaymentAdapter:
             "Square-Version": "2023-01-10"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status == 200 or response.status == 201:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Webhook setup failed: {error_text}")
-                    raise Exception(f"Webhook setup failed: {error_text}")
+        async with self.http().post(url, json=payload, headers=headers) as response:
+            if response.status == 200 or response.status == 201:
+                return await response.json()
+            else:
+                error_text = await response.text()
+                logger.error(f"Webhook setup failed: {error_text}")
+                raise Exception(f"Webhook setup failed: {error_text}")
+
+
+_payment_adapter: Optional[PaymentAdapter] = None
+
+def get_payment_adapter() -> PaymentAdapter:
+    """The process-wide adapter; raises ValueError, like PaymentAdapter(), if no API key is configured."""
+    global _payment_adapter
+    if _payment_adapter is None:
+        _payment_adapter = PaymentAdapter()
+    return _payment_adapter
+
+async def start_payment_adapter():
+    """Create the shared adapter and its connection pool (main.lifespan)."""
+    try:
+        get_payment_adapter().http()
+    except ValueError as e:
+        logger.warning(f"Payment adapter not started: {e}")
 
+async def close_payment_adapter():
+    global _payment_adapter
+    if _payment_adapter is not None:
+        await _payment_adapter.close()
+        _payment_adapter = None
 
 # Backward compatibility alias (for gradual migration)
 YooKassaService = PaymentAdapter
@@ -0,0 +1,72 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class TokenBucket:
+    """Classic token bucket: ``capacity`` tokens, refilled at ``rate`` tokens/second."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0, now: Optional[float] = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def retry_after(self, tokens: float = 1.0, now: Optional[float] = None) -> float:
+        """Seconds until ``tokens`` will be available."""
+        self._refill(time.monotonic() if now is None else now)
+        missing = tokens - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else float("inf")
+
+
+class KeyedRateLimiter:
+    """One token bucket per key (client IP, email, chat id...), LRU-bounded.
+
+    A key evicted for space comes back with a full bucket, so ``max_keys``
+    should comfortably exceed the number of keys active within one refill.
+    """
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self.rejected = 0
+
+    def _bucket(self, key: Hashable, now: Optional[float]) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def allow(self, key: Hashable, tokens: float = 1.0, now: Optional[float] = None) -> bool:
+        allowed = self._bucket(key, now).try_acquire(tokens, now)
+        if not allowed:
+            self.rejected += 1
+        return allowed
+
+    def retry_after(self, key: Hashable, tokens: float = 1.0, now: Optional[float] = None) -> float:
+        return self._bucket(key, now).retry_after(tokens, now)
+
+    def clear(self):
+        self._buckets.clear()
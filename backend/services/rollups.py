@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from config import settings
+from database import AsyncSessionLocal
+from services.invalidation import invalidation_bus, ROLLUPS_REFRESHED
+import crud
+
+logger = logging.getLogger(__name__)
+
+
+class RollupRefresher:
+    """Periodically folds new clicks and changed orders into the hourly rollups."""
+
+    def __init__(self, session_factory: async_sessionmaker, interval: float = 60.0, settle_seconds: int = 30):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        async with self.session_factory() as db:
+            stats = await crud.refresh_rollups(db, settle_seconds=self.settle_seconds)
+            await db.commit()
+        if stats:
+            logger.debug(f"Rollups refreshed: {stats}")
+            if any(stats.values()):
+                # New data reached the rollups; snapshots computed from them are now stale
+                await invalidation_bus.broadcast(ROLLUPS_REFRESHED)
+        return stats
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Rollup refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="rollup-refresher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+rollup_refresher = RollupRefresher(
+    AsyncSessionLocal,
+    interval=settings.rollup_refresh_interval,
+    settle_seconds=settings.rollup_settle_seconds,
+)
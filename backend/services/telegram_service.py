@@ -1,23 +1,55 @@
 import asyncio
 import aiohttp
 import logging
-from typing import Optional
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from config import settings
+from services.rate_limit import KeyedRateLimiter, TokenBucket
 
 logger = logging.getLogger(__name__)
 
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def telegram_http() -> aiohttp.ClientSession:
+    """Process-wide pooled session for Bot API calls, opened on first use.
+
+    The session is bound to the event loop that opened it, so whoever owns the
+    loop closes it with ``telegram_dispatcher.close()``: the app on shutdown,
+    Celery tasks at the end of their ``asyncio.run``.
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=settings.telegram_http_pool_size, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=settings.telegram_http_timeout, connect=5.0),
+        )
+    return _http_session
+
+# Notification kinds; a burst of one kind to one chat is sent as a single digest
+NEW_ORDER = "new_order"
+PAYMENT_SUCCESS = "payment_success"
+INSTALLMENT_OVERDUE = "installment_overdue"
+PAYMENT_OVERDUE = "payment_overdue"
+
+DIGEST_TITLES = {
+    NEW_ORDER: "🛍️ <b>{count} new orders</b>",
+    PAYMENT_SUCCESS: "✅ <b>{count} payments received</b>",
+    INSTALLMENT_OVERDUE: "⚠️ <b>{count} installment payments overdue</b>",
+    PAYMENT_OVERDUE: "🚨 <b>{count} payments overdue</b>",
+}
+
+class SendResult(NamedTuple):
+    ok: bool
+    retry_after: Optional[float] = None  # set when Telegram answered 429
+
 class TelegramService:
     def __init__(self):
         self.bot_token = settings.telegram_bot_token
         self.admin_chat_id = settings.telegram_admin_chat_id
         self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
     
-    async def send_message(self, chat_id: str, text: str, parse_mode: str = "HTML") -> bool:
-        """Send message via Telegram Bot API"""
-        if not self.bot_token:
-            logger.warning("Telegram bot token not configured")
-            return False
-        
+    async def post_message(self, chat_id: str, text: str, parse_mode: str = "HTML") -> SendResult:
+        """One sendMessage call, reporting Telegram's retry_after on 429"""
         url = f"{self.base_url}/sendMessage"
         payload = {
             "chat_id": chat_id,
@@ -26,25 +58,40 @@ class TelegramService:
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    if response.status == 200:
-                        return True
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Telegram send message failed: {error_text}")
-                        return False
+            async with telegram_http().post(url, json=payload) as response:
+                if response.status == 200:
+                    return SendResult(True)
+                if response.status == 429:
+                    body = await response.json(content_type=None)
+                    retry_after = float((body.get("parameters") or {}).get("retry_after", 1))
+                    logger.warning(f"Telegram rate limited chat {chat_id}, retry after {retry_after}s")
+                    return SendResult(False, retry_after)
+                error_text = await response.text()
+                logger.error(f"Telegram send message failed: {error_text}")
+                return SendResult(False)
         except Exception as e:
             logger.error(f"Telegram send message error: {e}")
+            return SendResult(False)
+    
+    async def send_message(self, chat_id: str, text: str, parse_mode: str = "HTML") -> bool:
+        """Send message via Telegram Bot API, within the rate limits (see TelegramDispatcher)"""
+        if not self.bot_token:
+            logger.warning("Telegram bot token not configured")
             return False
+        
+        return await telegram_dispatcher.send(chat_id, text, parse_mode=parse_mode)
     
-    async def send_admin_notification(self, message: str) -> bool:
-        """Send notification to admin"""
+    async def send_admin_notification(self, message: str, kind: Optional[str] = None, summary: Optional[str] = None) -> bool:
+        """Send notification to admin; notifications of one ``kind`` sent close
+        together are merged into a digest built from their ``summary`` lines"""
         if not self.admin_chat_id:
             logger.warning("Admin chat ID not configured")
             return False
+        if not self.bot_token:
+            logger.warning("Telegram bot token not configured")
+            return False
         
-        return await self.send_message(self.admin_chat_id, message)
+        return await telegram_dispatcher.send(self.admin_chat_id, message, kind=kind, summary=summary)
     
     async def send_new_order_notification(self, order_id: int, product_name: str, user_name: str, amount: float) -> bool:
         """Send new order notification to admin"""
@@ -59,7 +106,9 @@ class TelegramService:
 Time: {asyncio.get_event_loop().time()}
         """.strip()
         
-        return await self.send_admin_notification(message)
+        return await self.send_admin_notification(
+            message, kind=NEW_ORDER, summary=f"#{order_id} {product_name} — {user_name}, ${amount:.2f}"
+        )
     
     async def send_payment_success_notification(self, order_id: int, amount: float, product_name: str, user_name: str) -> bool:
         """Send payment success notification to admin"""
@@ -74,7 +123,9 @@ Time: {asyncio.get_event_loop().time()}
 Time: {asyncio.get_event_loop().time()}
         """.strip()
         
-        return await self.send_admin_notification(message)
+        return await self.send_admin_notification(
+            message, kind=PAYMENT_SUCCESS, summary=f"#{order_id} {product_name} — {user_name}, ${amount:.2f}"
+        )
     
     async def send_installment_reminder(self, order_id: int, amount: float, product_name: str, user_name: str, days_overdue: int) -> bool:
         """Send installment payment reminder to admin"""
@@ -90,7 +141,11 @@ Time: {asyncio.get_event_loop().time()}
 Please contact the customer!
         """.strip()
         
-        return await self.send_admin_notification(message)
+        return await self.send_admin_notification(
+            message,
+            kind=INSTALLMENT_OVERDUE,
+            summary=f"#{order_id} {product_name} — {user_name}, ${amount:.2f}, {days_overdue} days"
+        )
     
     async def send_overdue_payment_notification(self, order_id: int, total_amount: float, paid_amount: float, product_name: str, user_name: str) -> bool:
         """Send overdue payment notification to admin"""
@@ -108,4 +163,159 @@ Please contact the customer!
 Admin intervention required!
         """.strip()
         
-        return await self.send_admin_notification(message)
+        return await self.send_admin_notification(
+            message,
+            kind=PAYMENT_OVERDUE,
+            summary=f"#{order_id} {product_name} — {user_name}, ${remaining_amount:.2f} remaining"
+        )
+
+class _Batch:
+    """Messages of one kind to one chat waiting to go out together."""
+
+    __slots__ = ("chat_id", "kind", "parse_mode", "items")
+
+    def __init__(self, chat_id: str, kind: Optional[str], parse_mode: str):
+        self.chat_id = chat_id
+        self.kind = kind
+        self.parse_mode = parse_mode
+        self.items: List[Tuple[str, Optional[str], asyncio.Future]] = []
+
+class TelegramDispatcher:
+    """Sends Bot API messages within Telegram's rate limits.
+
+    Each message first takes a token from the global bucket and from its
+    chat's bucket, waiting while either is empty; a 429 pauses the chat for
+    the retry_after Telegram returns and the message is sent again. Messages
+    with a ``kind`` and ``summary`` wait ``coalesce_window`` seconds (and for
+    as long as the chat is throttled) for more of the same kind to the same
+    chat; a group of several goes out as one digest of the summary lines, so
+    the overdue job's burst costs one message instead of hundreds.
+    ``send`` returns once the message or its digest was delivered.
+    """
+
+    def __init__(
+        self,
+        service_factory=TelegramService,
+        global_rate: float = 25.0,
+        chat_rate: float = 20 / 60,
+        chat_burst: int = 3,
+        coalesce_window: float = 1.0,
+        digest_max_lines: int = 30,
+        max_attempts: int = 5,
+    ):
+        self.service_factory = service_factory
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+        self.chat_limiter = KeyedRateLimiter(chat_rate, chat_burst)
+        self.coalesce_window = coalesce_window
+        self.digest_max_lines = digest_max_lines
+        self.max_attempts = max_attempts
+        self._paused_until: Dict[str, float] = {}
+        self._pending: Dict[Tuple[str, str], _Batch] = {}
+        self._tasks = set()
+        self.sent = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+
+    async def send(self, chat_id: str, text: str, kind: Optional[str] = None, summary: Optional[str] = None, parse_mode: str = "HTML") -> bool:
+        future = asyncio.get_running_loop().create_future()
+        if kind is None or summary is None:
+            batch = _Batch(chat_id, None, parse_mode)
+            batch.items.append((text, summary, future))
+            return await self._deliver(batch)
+
+        key = (chat_id, kind)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch(chat_id, kind, parse_mode)
+            task = asyncio.create_task(self._flush_later(key, batch), name=f"telegram-digest-{kind}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        batch.items.append((text, summary, future))
+        return await future
+
+    def _wait_time(self, chat_id: str) -> float:
+        now = time.monotonic()
+        paused = self._paused_until.get(chat_id, 0.0) - now
+        if paused <= 0:
+            self._paused_until.pop(chat_id, None)
+        return max(
+            paused,
+            self.global_bucket.retry_after(now=now),
+            self.chat_limiter.retry_after(chat_id, now=now),
+        )
+
+    async def _acquire(self, chat_id: str):
+        while True:
+            wait = self._wait_time(chat_id)
+            if wait <= 0:
+                self.global_bucket.try_acquire()
+                self.chat_limiter.allow(chat_id)
+                return
+            await asyncio.sleep(wait)
+
+    async def _flush_later(self, key: Tuple[str, str], batch: _Batch):
+        try:
+            await asyncio.sleep(self.coalesce_window)
+            # Keep collecting while the chat cannot take a message anyway
+            while (wait := self._wait_time(batch.chat_id)) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            if self._pending.get(key) is batch:
+                del self._pending[key]
+        await self._deliver(batch)
+
+    def _render(self, batch: _Batch) -> str:
+        if len(batch.items) == 1:
+            return batch.items[0][0]
+        count = len(batch.items)
+        lines = [summary for _, summary, _ in batch.items[:self.digest_max_lines]]
+        if count > self.digest_max_lines:
+            lines.append(f"…and {count - self.digest_max_lines} more")
+        title = DIGEST_TITLES.get(batch.kind, "<b>{count} notifications</b>").format(count=count)
+        return title + "\n\n" + "\n".join(lines)
+
+    async def _deliver(self, batch: _Batch) -> bool:
+        delivered = False
+        try:
+            text = self._render(batch)
+            for _ in range(self.max_attempts):
+                await self._acquire(batch.chat_id)
+                result = await self.service_factory().post_message(batch.chat_id, text, batch.parse_mode)
+                if result.ok:
+                    delivered = True
+                    self.sent += 1
+                    self.coalesced += len(batch.items) - 1
+                    break
+                if result.retry_after is None:
+                    break
+                self.rate_limited += 1
+                self._paused_until[batch.chat_id] = time.monotonic() + result.retry_after
+        finally:
+            for _, _, future in batch.items:
+                if not future.done():
+                    future.set_result(delivered)
+        return delivered
+
+    async def close(self):
+        """Drop batches still waiting (their senders get False) and close the HTTP session."""
+        for task in list(self._tasks):
+            task.cancel()
+        for batch in self._pending.values():
+            for _, _, future in batch.items:
+                if not future.done():
+                    future.set_result(False)
+        self._pending.clear()
+        global _http_session
+        if _http_session is not None and not _http_session.closed:
+            await _http_session.close()
+        _http_session = None
+
+
+telegram_dispatcher = TelegramDispatcher(
+    global_rate=settings.telegram_global_rate_per_second,
+    chat_rate=settings.telegram_chat_rate_per_minute / 60,
+    chat_burst=settings.telegram_chat_burst,
+    coalesce_window=settings.telegram_coalesce_window,
+    digest_max_lines=settings.telegram_digest_max_lines,
+    max_attempts=settings.telegram_send_max_attempts,
+)
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+GRANULARITIES = {
+    "minute": np.timedelta64(60, "s"),
+    "hour": np.timedelta64(3600, "s"),
+    "day": np.timedelta64(86400, "s"),
+    "week": np.timedelta64(7 * 86400, "s"),
+}
+
+
+def truncate(value: datetime, granularity: str) -> datetime:
+    """Python equivalent of PostgreSQL ``date_trunc`` in UTC (weeks start on Monday)."""
+    value = value.astimezone(timezone.utc)
+    if granularity == "minute":
+        return value.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return day
+    return day - timedelta(days=day.weekday())
+
+
+def _to_datetime64(values: Sequence[datetime]) -> np.ndarray:
+    return np.array(
+        [v.astimezone(timezone.utc).replace(tzinfo=None) for v in values], dtype="datetime64[s]"
+    )
+
+
+def bucket_starts(start: datetime, end: datetime, granularity: str) -> np.ndarray:
+    """Every bucket start in ``[truncate(start), end)``, gaps included."""
+    first = _to_datetime64([truncate(start, granularity)])[0]
+    last = _to_datetime64([end])[0]
+    return np.arange(first, last, GRANULARITIES[granularity])
+
+
+def _step(granularity: str) -> timedelta:
+    return timedelta(seconds=int(GRANULARITIES[granularity] / np.timedelta64(1, "s")))
+
+
+def bucket_count(start: datetime, end: datetime, granularity: str) -> int:
+    """Number of buckets ``bucket_starts`` would return, without allocating them."""
+    span = end - truncate(start, granularity)
+    step = _step(granularity)
+    return max(0, -(-span // step))
+
+
+def previous_period_start(start: datetime, end: datetime, granularity: str) -> datetime:
+    """Start of the preceding period with the same number of buckets."""
+    return truncate(start, granularity) - bucket_count(start, end, granularity) * _step(granularity)
+
+
+def densify(buckets: np.ndarray, keys: Sequence[datetime], values: Sequence[Any]) -> np.ndarray:
+    """Scatter sparse ``(bucket, value)`` rows onto the dense bucket axis, zero-filling gaps."""
+    dense = np.zeros(len(buckets), dtype=np.float64)
+    if len(keys) and len(buckets):
+        stamps = _to_datetime64(keys)
+        positions = np.searchsorted(buckets, stamps)
+        valid = positions < len(buckets)
+        positions, stamps = positions[valid], stamps[valid]
+        vals = np.asarray(values, dtype=np.float64)[valid]
+        matched = buckets[positions] == stamps
+        np.add.at(dense, positions[matched], vals[matched])
+    return dense
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing moving average; the first ``window - 1`` points average what is available."""
+    if window <= 1 or len(values) == 0:
+        return values.astype(np.float64)
+    cumulative = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    index = np.arange(1, len(values) + 1)
+    lower = np.maximum(index - window, 0)
+    return (cumulative[index] - cumulative[lower]) / (index - lower)
+
+
+def deltas(values: np.ndarray) -> np.ndarray:
+    """Change from the previous bucket (0 for the first one)."""
+    return np.diff(values, prepend=values[:1]) if len(values) else values
+
+
+def ratio_percent(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    out = np.zeros(len(numerator), dtype=np.float64)
+    np.divide(numerator * 100.0, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def _percent_change(current: float, previous: float) -> float:
+    return round((current - previous) / previous * 100, 2) if previous else 0.0
+
+
+def build_timeseries(
+    start: datetime,
+    end: datetime,
+    granularity: str,
+    window: int,
+    clicks: List[Tuple[datetime, int]],
+    orders: List[Tuple[datetime, int, float]],
+) -> Dict[str, Any]:
+    """Assemble the chart payload for ``[start, end)`` from sparse per-bucket rows.
+
+    ``clicks`` and ``orders`` may also cover the preceding period of equal
+    length; it is used only for the period-over-period comparison.
+    """
+    buckets = bucket_starts(start, end, granularity)
+    span = buckets[-1] + GRANULARITIES[granularity] - buckets[0] if len(buckets) else np.timedelta64(0, "s")
+    previous = np.arange(buckets[0] - span, buckets[0], GRANULARITIES[granularity]) if len(buckets) else buckets
+    axis = np.concatenate((previous, buckets))
+
+    click_keys = [row[0] for row in clicks]
+    order_keys = [row[0] for row in orders]
+    all_clicks = densify(axis, click_keys, [row[1] for row in clicks])
+    all_paid = densify(axis, order_keys, [row[1] for row in orders])
+    all_revenue = densify(axis, order_keys, [row[2] for row in orders])
+
+    split = len(previous)
+    click_counts, paid_orders, revenue = all_clicks[split:], all_paid[split:], all_revenue[split:]
+    conversion = ratio_percent(paid_orders, click_counts)
+
+    totals = {
+        "revenue": round(float(revenue.sum()), 2),
+        "paid_orders": int(paid_orders.sum()),
+        "clicks": int(click_counts.sum()),
+    }
+    previous_totals = {
+        "revenue": round(float(all_revenue[:split].sum()), 2),
+        "paid_orders": int(all_paid[:split].sum()),
+        "clicks": int(all_clicks[:split].sum()),
+    }
+    totals["conversion_rate"] = round(totals["paid_orders"] / totals["clicks"] * 100, 2) if totals["clicks"] else 0.0
+    previous_totals["conversion_rate"] = (
+        round(previous_totals["paid_orders"] / previous_totals["clicks"] * 100, 2) if previous_totals["clicks"] else 0.0
+    )
+
+    return {
+        "granularity": granularity,
+        "start": truncate(start, granularity),
+        "end": end,
+        "buckets": [b.replace(tzinfo=timezone.utc) for b in buckets.astype(datetime)],
+        "revenue": np.round(revenue, 2).tolist(),
+        "paid_orders": paid_orders.astype(np.int64).tolist(),
+        "clicks": click_counts.astype(np.int64).tolist(),
+        "conversion_rate": np.round(conversion, 2).tolist(),
+        "revenue_moving_avg": np.round(moving_average(revenue, window), 2).tolist(),
+        "paid_orders_moving_avg": np.round(moving_average(paid_orders, window), 2).tolist(),
+        "clicks_moving_avg": np.round(moving_average(click_counts, window), 2).tolist(),
+        "revenue_delta": np.round(deltas(revenue), 2).tolist(),
+        "paid_orders_delta": deltas(paid_orders).astype(np.int64).tolist(),
+        "clicks_delta": deltas(click_counts).astype(np.int64).tolist(),
+        "totals": totals,
+        "previous_totals": previous_totals,
+        "change_percent": {key: _percent_change(totals[key], previous_totals[key]) for key in totals},
+    }
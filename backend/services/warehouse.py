@@ -0,0 +1,443 @@
+import asyncio
+import fcntl
+import json
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import sqlalchemy as sa
+
+from config import settings
+from database import AsyncSessionLocal
+import crud
+import models
+
+try:
+    import duckdb
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed where the warehouse is enabled
+    duckdb = pa = pq = None
+
+# Tables that are snapshotted. Clicks are append-only and exported by id;
+# orders and payments change status, so every changed row version is exported
+# and readers keep the latest version per id.
+TABLES = {
+    "clicks": (models.Click, True),
+    "orders": (models.Order, False),
+    "payments": (models.Payment, False),
+}
+
+
+class WarehouseUnavailable(Exception):
+    """The warehouse is disabled, its dependencies are missing, or nothing has been exported yet."""
+
+
+def _require_engine():
+    if duckdb is None or pa is None:
+        raise WarehouseUnavailable("Analytics warehouse requires the duckdb and pyarrow packages")
+
+
+def _utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _column_converter(column: sa.Column) -> Callable[[Any], Any]:
+    column_type = column.type
+    if isinstance(column_type, sa.Enum):
+        return lambda value: value.value if value is not None else None
+    if isinstance(column_type, sa.JSON):
+        return lambda value: json.dumps(value) if value is not None else None
+    if isinstance(column_type, sa.DateTime):
+        return _utc_naive
+    return lambda value: value
+
+
+def _arrow_type(column: sa.Column):
+    column_type = column.type
+    if isinstance(column_type, sa.Enum):
+        return pa.string()
+    if isinstance(column_type, sa.Integer):
+        return pa.int64()
+    if isinstance(column_type, sa.Boolean):
+        return pa.bool_()
+    if isinstance(column_type, sa.Numeric):
+        return pa.decimal128(column_type.precision or 18, column_type.scale or 2)
+    if isinstance(column_type, sa.DateTime):
+        # Naive UTC, so the engine needs no time zone support
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def arrow_schema(model):
+    """Arrow schema for the snapshot of ``model``: its columns plus ``_version``."""
+    _require_engine()
+    fields = [pa.field(column.name, _arrow_type(column)) for column in model.__table__.columns]
+    fields.append(pa.field("_version", pa.timestamp("us")))
+    return pa.schema(fields)
+
+
+class PartitionedParquetWriter:
+    """Write streamed rows to one Parquet file per ``day=YYYY-MM-DD`` partition of ``created_at``.
+
+    Every streamed chunk becomes a row group, so memory stays bounded by the
+    chunk size. Files are written under a temporary name and only renamed
+    into place by ``close``.
+    """
+
+    def __init__(self, root: Path, table: str, model):
+        self.root = root
+        self.table = table
+        self.schema = arrow_schema(model)
+        self._converters = {column.name: _column_converter(column) for column in model.__table__.columns}
+        self._converters["_version"] = _utc_naive
+        self._run_id = uuid.uuid4().hex[:12]
+        self._writers: Dict[str, Any] = {}
+        self.rows = 0
+
+    def _relative_path(self, day: str) -> str:
+        return f"{self.table}/day={day}/part-{self._run_id}.parquet"
+
+    def _writer(self, day: str):
+        writer = self._writers.get(day)
+        if writer is None:
+            path = self.root / (self._relative_path(day) + ".tmp")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            writer = self._writers[day] = pq.ParquetWriter(path, self.schema, compression="zstd")
+        return writer
+
+    def write(self, rows: Sequence[Any]):
+        by_day: Dict[str, List[Any]] = defaultdict(list)
+        for row in rows:
+            by_day[_utc_naive(row["created_at"]).date().isoformat()].append(row)
+        for day, day_rows in by_day.items():
+            columns = {
+                name: [convert(row[name]) for row in day_rows] for name, convert in self._converters.items()
+            }
+            self._writer(day).write_batch(pa.record_batch(columns, schema=self.schema))
+            self.rows += len(day_rows)
+
+    def close(self) -> List[str]:
+        """Finish every file and move it into place; returns paths relative to the root."""
+        files = []
+        for day, writer in self._writers.items():
+            writer.close()
+            relative = self._relative_path(day)
+            os.replace(self.root / (relative + ".tmp"), self.root / relative)
+            files.append(relative)
+        self._writers.clear()
+        return files
+
+    def abort(self):
+        for day, writer in self._writers.items():
+            writer.close()
+            (self.root / (self._relative_path(day) + ".tmp")).unlink(missing_ok=True)
+        self._writers.clear()
+
+
+class Manifest:
+    """Export watermarks and the list of committed files per table.
+
+    Readers only ever see files listed here, and the manifest is replaced
+    atomically after new files are in place, so a failed export leaves at most
+    unreferenced files behind and never duplicates rows.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        tables: Optional[Dict[str, Dict[str, Any]]] = None,
+        retired: Optional[List[str]] = None
+    ):
+        self.path = path
+        self.tables = tables or {}
+        self.retired = retired or []  # replaced by compaction, deleted on the next run
+
+    @classmethod
+    def load(cls, path: Path) -> "Manifest":
+        if not path.exists():
+            return cls(path)
+        data = json.loads(path.read_text())
+        return cls(path, data["tables"], data.get("retired"))
+
+    def table(self, name: str) -> Dict[str, Any]:
+        return self.tables.setdefault(
+            name, {"last_id": None, "last_ts": None, "rows": 0, "files": [], "exported_at": None}
+        )
+
+    def files(self, name: str) -> List[str]:
+        return list(self.tables.get(name, {}).get("files", []))
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"tables": self.tables, "retired": self.retired}, indent=2))
+        os.replace(tmp, self.path)
+
+
+def _sql_list(paths: Sequence[Path]) -> str:
+    return "[" + ", ".join("'" + str(path).replace("'", "''") + "'" for path in paths) + "]"
+
+
+def _rows(cursor) -> List[Dict[str, Any]]:
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+class Warehouse:
+    """Parquet snapshots of clicks, orders and payments, queried with embedded DuckDB.
+
+    ``export`` runs in a worker (see ``tasks.export_warehouse``) and streams new
+    rows out of PostgreSQL; ``report`` runs the heavy aggregations over the
+    snapshot files in a thread, so dashboard load never reaches the primary.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        session_factory=AsyncSessionLocal,
+        batch_size: int = 10000,
+        settle_seconds: int = 30,
+        max_concurrent_queries: int = 2,
+        duckdb_threads: int = 2,
+        duckdb_memory_limit: str = "512MB",
+        compact_after_days: int = 2
+    ):
+        self.root = Path(root)
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+        self.duckdb_threads = duckdb_threads
+        self.duckdb_memory_limit = duckdb_memory_limit
+        self.compact_after_days = compact_after_days
+        self._query_slots = asyncio.Semaphore(max_concurrent_queries)
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    # Export
+
+    async def export(self) -> Optional[Dict[str, int]]:
+        """Snapshot rows changed since the last export; None if another worker is exporting.
+
+        The manifest is guarded by a lock file for the whole run, compaction
+        included; the database transaction (and its advisory lock) only spans
+        the reads, so a file rewrite never pins a pooled connection.
+        """
+        _require_engine()
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            async with self.session_factory() as db:
+                if not await crud.try_lock_warehouse_export(db):
+                    return None
+                manifest = Manifest.load(self.manifest_path)
+                exported = {}
+                for name, (model, append_only) in TABLES.items():
+                    exported[name] = await self._export_table(db, manifest, name, model, append_only)
+                # Ends the read-only transaction and releases the advisory lock
+                await db.rollback()
+            compacted = await asyncio.to_thread(self._compact, manifest)
+        if compacted:
+            exported["compacted_partitions"] = compacted
+        return exported
+
+    async def _export_table(self, db, manifest: Manifest, name: str, model, append_only: bool) -> int:
+        state = manifest.table(name)
+        high_id, high_ts = await crud.get_export_bounds(db, model, self.settle_seconds)
+        if append_only:
+            low_id = state["last_id"] or 0
+            if high_id is None or high_id <= low_id:
+                return 0
+            bounds = {"after_id": low_id, "until_id": high_id}
+        else:
+            last_ts = datetime.fromisoformat(state["last_ts"]) if state["last_ts"] else None
+            bounds = {"after_ts": last_ts, "until_ts": high_ts}
+
+        writer = PartitionedParquetWriter(self.root, name, model)
+        try:
+            async for rows in crud.stream_export_rows(db, model, batch_size=self.batch_size, **bounds):
+                writer.write(rows)
+            files = writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+
+        state["files"].extend(files)
+        state["rows"] += writer.rows
+        if append_only:
+            state["last_id"] = high_id
+        else:
+            state["last_ts"] = high_ts.isoformat()
+        state["exported_at"] = datetime.now(timezone.utc).isoformat()
+        manifest.save()
+        return writer.rows
+
+    def _compact(self, manifest: Manifest) -> int:
+        """Merge the files of each settled day partition into one, keeping the latest row versions.
+
+        Replaced files are only deleted on the next run, so queries that
+        started against the previous manifest can still read them.
+        """
+        for relative in manifest.retired:
+            (self.root / relative).unlink(missing_ok=True)
+        manifest.retired = []
+
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.compact_after_days)).date().isoformat()
+        compacted = 0
+        for name, (_, append_only) in TABLES.items():
+            by_day: Dict[str, List[str]] = defaultdict(list)
+            for relative in manifest.files(name):
+                by_day[relative.split("/")[1][len("day="):]].append(relative)
+            for day, files in by_day.items():
+                if len(files) < 2 or day >= cutoff:
+                    continue
+                target = f"{name}/day={day}/part-{uuid.uuid4().hex[:12]}.parquet"
+                source = f"read_parquet({_sql_list([self.root / f for f in files])})"
+                if not append_only:
+                    source += " QUALIFY row_number() OVER (PARTITION BY id ORDER BY _version DESC) = 1"
+                with duckdb.connect() as con:
+                    con.execute(
+                        f"COPY (SELECT * FROM {source} ORDER BY id) TO '{self.root / target}.tmp' "
+                        "(FORMAT PARQUET, COMPRESSION ZSTD)"
+                    )
+                os.replace(self.root / f"{target}.tmp", self.root / target)
+                state = manifest.table(name)
+                state["files"] = [f for f in state["files"] if f not in files] + [target]
+                manifest.retired.extend(files)
+                compacted += 1
+        manifest.save()
+        return compacted
+
+    # Queries
+
+    def _connect(self, manifest: Manifest):
+        con = duckdb.connect(
+            config={"threads": self.duckdb_threads, "memory_limit": self.duckdb_memory_limit}
+        )
+        for name, (_, append_only) in TABLES.items():
+            files = manifest.files(name)
+            if not files:
+                con.close()
+                raise WarehouseUnavailable(f"No {name} snapshot has been exported yet")
+            source = f"read_parquet({_sql_list([self.root / f for f in files])})"
+            if append_only:
+                con.execute(f"CREATE VIEW {name} AS SELECT * FROM {source}")
+            else:
+                con.execute(
+                    f"CREATE VIEW {name} AS SELECT * FROM {source} "
+                    "QUALIFY row_number() OVER (PARTITION BY id ORDER BY _version DESC) = 1"
+                )
+        return con
+
+    def _report(self, start: datetime, end: datetime, limit: int) -> Dict[str, Any]:
+        manifest = Manifest.load(self.manifest_path)
+        params = {"start": _utc_naive(start), "end": _utc_naive(end), "limit": limit}
+        with self._connect(manifest) as con:
+            daily = _rows(con.execute(
+                """
+                WITH c AS (
+                    SELECT CAST(created_at AS DATE) AS day,
+                           count(*) AS clicks,
+                           count(*) FILTER (WHERE action = 'page_view') AS page_views,
+                           count(DISTINCT coalesce('u:' || user_id, 'ip:' || ip_address)) AS unique_visitors
+                    FROM clicks WHERE created_at >= $start AND created_at < $end
+                    GROUP BY 1
+                ), o AS (
+                    SELECT CAST(created_at AS DATE) AS day,
+                           count(*) AS orders,
+                           count(*) FILTER (WHERE status = 'paid') AS paid_orders,
+                           coalesce(sum(paid_amount), 0) AS revenue  -- as on the dashboard, installments included
+                    FROM orders WHERE created_at >= $start AND created_at < $end
+                    GROUP BY 1
+                )
+                SELECT day,
+                       coalesce(clicks, 0) AS clicks,
+                       coalesce(page_views, 0) AS page_views,
+                       coalesce(unique_visitors, 0) AS unique_visitors,
+                       coalesce(orders, 0) AS orders,
+                       coalesce(paid_orders, 0) AS paid_orders,
+                       coalesce(revenue, 0) AS revenue
+                FROM c FULL OUTER JOIN o USING (day)
+                ORDER BY day
+                """,
+                {"start": params["start"], "end": params["end"]}
+            ))
+            top_pages = _rows(con.execute(
+                """
+                SELECT page,
+                       count(*) FILTER (WHERE action = 'page_view') AS page_views,
+                       count(*) AS clicks,
+                       count(DISTINCT coalesce('u:' || user_id, 'ip:' || ip_address)) AS unique_visitors
+                FROM clicks WHERE created_at >= $start AND created_at < $end
+                GROUP BY page ORDER BY page_views DESC, clicks DESC, page LIMIT $limit
+                """,
+                params
+            ))
+            top_products = _rows(con.execute(
+                """
+                SELECT product_id,
+                       count(*) AS orders,
+                       count(*) FILTER (WHERE status = 'paid') AS paid_orders,
+                       coalesce(sum(paid_amount), 0) AS revenue  -- as on the dashboard, installments included
+                FROM orders WHERE created_at >= $start AND created_at < $end
+                GROUP BY product_id ORDER BY revenue DESC, orders DESC, product_id LIMIT $limit
+                """,
+                params
+            ))
+            payment_methods = _rows(con.execute(
+                """
+                SELECT coalesce(payment_method, 'unknown') AS payment_method,
+                       count(*) AS payments,
+                       count(*) FILTER (WHERE status = 'succeeded') AS succeeded,
+                       coalesce(sum(amount) FILTER (WHERE status = 'succeeded'), 0) AS amount
+                FROM payments WHERE created_at >= $start AND created_at < $end
+                GROUP BY 1 ORDER BY amount DESC, payments DESC
+                """,
+                {"start": params["start"], "end": params["end"]}
+            ))
+
+        exported_at = [
+            datetime.fromisoformat(manifest.tables[name]["exported_at"])
+            for name in TABLES if manifest.tables.get(name, {}).get("exported_at")
+        ]
+        return {
+            "start": start,
+            "end": end,
+            "as_of": min(exported_at) if exported_at else None,
+            "daily": daily,
+            "top_pages": top_pages,
+            "top_products": top_products,
+            "payment_methods": payment_methods,
+        }
+
+    async def report(self, start: datetime, end: datetime, limit: int = 20) -> Dict[str, Any]:
+        """Daily traffic and sales, top pages, top products and payment methods for ``[start, end)``."""
+        _require_engine()
+        async with self._query_slots:
+            return await asyncio.to_thread(self._report, start, end, limit)
+
+
+def create_warehouse() -> Warehouse:
+    return Warehouse(
+        settings.warehouse_dir,
+        batch_size=settings.warehouse_export_batch_size,
+        settle_seconds=settings.rollup_settle_seconds,
+        max_concurrent_queries=settings.warehouse_max_concurrent_queries,
+        duckdb_threads=settings.warehouse_duckdb_threads,
+        duckdb_memory_limit=settings.warehouse_duckdb_memory_limit,
+    )
+
+
+warehouse = create_warehouse()
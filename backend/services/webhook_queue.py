@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import settings
+from database import AsyncSessionLocal, after_commit, unit_of_work
+import crud
+import models
+
+logger = logging.getLogger(__name__)
+
+WebhookHandler = Callable[[AsyncSession, Dict[str, Any]], Awaitable[None]]
+
+
+def retry_delay(attempt: int, base: float, maximum: float) -> float:
+    """Exponential backoff with jitter: about ``base * 2**(attempt - 1)`` seconds, capped at ``maximum``."""
+    delay = min(maximum, base * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class WebhookQueue:
+    """Durable queue for payment webhooks.
+
+    The endpoint only verifies and stores the event (``enqueue``) so the
+    provider gets its 200 without waiting on our processing; a redelivered
+    event id hits the unique index and is dropped. ``workers`` tasks claim
+    stored events one at a time and run the handler registered for the event
+    type in a unit of work that also marks the event done. A failing event is
+    retried with exponential backoff until ``max_attempts``, then left FAILED.
+    Handlers must be idempotent: an event whose worker dies mid-way is
+    claimed again once its lease expires.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        workers: int = 4,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 8,
+        retry_base: float = 2.0,
+        retry_max: float = 300.0,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._handlers: Dict[str, WebhookHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, event_type: str, handler: WebhookHandler):
+        self._handlers[event_type] = handler
+
+    def handles(self, event_type: Optional[str]) -> bool:
+        return event_type in self._handlers
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def enqueue(self, db: AsyncSession, event_id: str, event_type: str, payload: Dict[str, Any]) -> bool:
+        """Store the event; False for a redelivery. Workers are woken once it commits."""
+        stored = await crud.record_webhook_event(db, event_id, event_type, payload)
+        if stored:
+            after_commit(db, self._wake)
+        return stored
+
+    async def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run_once(self) -> bool:
+        """Claim and process one due event; False if none was due."""
+        async with self.session_factory() as db:
+            events = await crud.claim_webhook_events(db, limit=1, lease_seconds=self.lease_seconds)
+        if not events:
+            return False
+        await self._process(events[0])
+        return True
+
+    async def _process(self, event: models.WebhookEvent):
+        handler = self._handlers.get(event.event_type)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for webhook event type {event.event_type!r}")
+            async with unit_of_work(self.session_factory) as db:
+                await handler(db, event.payload)
+                await crud.complete_webhook_event(db, event.id)
+            self.processed += 1
+        except Exception as e:
+            if handler is not None and event.attempts < self.max_attempts:
+                delay = retry_delay(event.attempts, self.retry_base, self.retry_max)
+                self.retried += 1
+                logger.warning(f"Webhook event {event.event_id} failed (attempt {event.attempts}), retrying in {delay:.1f}s: {e}")
+            else:
+                delay = None
+                self.failed += 1
+                logger.error(f"Webhook event {event.event_id} failed permanently after {event.attempts} attempts: {e}")
+            async with self.session_factory() as db:
+                await crud.retry_webhook_event(db, event.id, repr(e), delay)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Webhook worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"webhook-worker-{n}")
+            for n in range(self.workers)
+        ]
+        logger.info(f"Webhook queue started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the workers; events they were processing are picked up again after their lease."""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._wakeup = None
+
+
+webhook_queue = WebhookQueue(
+    AsyncSessionLocal,
+    workers=settings.webhook_workers,
+    poll_interval=settings.webhook_poll_interval,
+    lease_seconds=settings.webhook_lease_seconds,
+    max_attempts=settings.webhook_max_attempts,
+    retry_base=settings.webhook_retry_base,
+    retry_max=settings.webhook_retry_max,
+)
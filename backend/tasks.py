@@ -2,9 +2,14 @@ from celery import Celery
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 import asyncio
-from database import AsyncSessionLocal
-from services.telegram_service import TelegramService
+from config import settings
+from database import AsyncSessionLocal, unit_of_work
+from services.telegram_service import TelegramService, telegram_dispatcher
+from services.warehouse import warehouse
+from services.rollups import rollup_refresher
+from services.outbox import outbox_dispatcher, INSTALLMENT_OVERDUE
 import crud
+import schemas
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,6 +33,18 @@ celery_app.conf.update(
             "task": "tasks.check_overdue_payments",
             "schedule": 3600.0,  # Run every hour
         },
+        "refresh-analytics-rollups": {
+            "task": "tasks.refresh_rollups",
+            "schedule": 60.0,
+        },
+        "dispatch-outbox": {
+            "task": "tasks.dispatch_outbox",
+            "schedule": 10.0,
+        },
+        "export-analytics-warehouse": {
+            "task": "tasks.export_warehouse",
+            "schedule": settings.warehouse_export_interval,
+        },
     },
 )
 
@@ -45,14 +62,16 @@ def check_overdue_payments():
     asyncio.run(_check_overdue_payments())
 
 async def _check_overdue_payments():
-    """Async implementation of overdue payments check"""
+    """Async implementation of overdue payments check.
+
+    Admin notifications and reminder messages are written in one transaction;
+    the outbox dispatcher sends the reminders to Telegram afterwards.
+    """
     try:
-        async with AsyncSessionLocal() as db:
+        async with unit_of_work(AsyncSessionLocal) as db:
             # Get overdue orders
             overdue_orders = await crud.get_overdue_orders(db)
             
-            telegram_service = TelegramService()
-            
             for order in overdue_orders:
                 # Calculate days overdue
                 days_overdue = (datetime.utcnow() - order.next_payment_date).days
@@ -61,28 +80,28 @@ async def _check_overdue_payments():
                 remaining_amount = order.total_amount - order.paid_amount
                 monthly_payment = remaining_amount / (order.installment_months - 1) if order.installment_months > 1 else remaining_amount
                 
-                # Send reminder notification
-                user_name = f"{order.user.first_name} {order.user.last_name}".strip() or order.user.username or "Unknown"
+                # Queue reminder notification
+                user_name = f"{order.user.first_name or ''} {order.user.last_name or ''}".strip() or order.user.username or "Unknown"
                 
-                await telegram_service.send_installment_reminder(
-                    order_id=order.id,
-                    amount=float(monthly_payment),
-                    product_name=order.product.name,
-                    user_name=user_name,
-                    days_overdue=days_overdue
-                )
+                await outbox_dispatcher.publish(db, INSTALLMENT_OVERDUE, {
+                    "order_id": order.id,
+                    "amount": float(monthly_payment),
+                    "product_name": order.product.name,
+                    "user_name": user_name,
+                    "days_overdue": days_overdue
+                })
                 
                 # Create admin notification
-                notification_data = {
-                    "type": "overdue_payment",
-                    "title": f"Overdue Payment - Order #{order.id}",
-                    "message": f"Payment for {order.product.name} is {days_overdue} days overdue",
-                    "metadata": {
+                notification_data = schemas.AdminNotificationCreate(
+                    type="overdue_payment",
+                    title=f"Overdue Payment - Order #{order.id}",
+                    message=f"Payment for {order.product.name} is {days_overdue} days overdue",
+                    metadata={
                         "order_id": order.id,
                         "days_overdue": days_overdue,
                         "amount": float(monthly_payment)
                     }
-                }
+                )
                 
                 await crud.create_admin_notification(db, notification_data)
                 
@@ -127,6 +146,63 @@ async def _send_installment_reminder(order_id: int):
             
     except Exception as e:
         logger.error(f"Error sending installment reminder: {e}")
+    finally:
+        # The Bot API session belongs to this task's event loop
+        await telegram_dispatcher.close()
+
+@celery_app.task
+def refresh_rollups():
+    """Catch the hourly analytics rollups up with new clicks and orders"""
+    asyncio.run(_refresh_rollups())
+
+async def _refresh_rollups():
+    try:
+        # Same path as the API's refresher, so dashboards on every worker go stale
+        stats = await rollup_refresher.run_once()
+        logger.info(f"Refreshed analytics rollups: {stats}")
+    except Exception as e:
+        logger.error(f"Error refreshing analytics rollups: {e}")
+
+@celery_app.task
+def backfill_visitor_sketches():
+    """One-off: feed existing clicks into the unique-visitor sketches (safe to re-run)"""
+    asyncio.run(_backfill_visitor_sketches())
+
+async def _backfill_visitor_sketches():
+    try:
+        async with AsyncSessionLocal() as db:
+            total = await crud.backfill_visitor_sketches(db)
+            logger.info(f"Backfilled visitor sketches from {total} clicks")
+    except Exception as e:
+        logger.error(f"Error backfilling visitor sketches: {e}")
+
+@celery_app.task
+def dispatch_outbox():
+    """Deliver due outbox messages; a fallback when no API process runs the dispatcher"""
+    asyncio.run(_dispatch_outbox())
+
+async def _dispatch_outbox():
+    try:
+        processed = await outbox_dispatcher.drain()
+        if processed:
+            logger.info(f"Processed {processed} outbox messages")
+    except Exception as e:
+        logger.error(f"Error dispatching outbox: {e}")
+    finally:
+        await telegram_dispatcher.close()
+
+@celery_app.task
+def export_warehouse():
+    """Snapshot new clicks, orders and payments to Parquet for the analytics warehouse"""
+    if settings.warehouse_enabled:
+        asyncio.run(_export_warehouse())
+
+async def _export_warehouse():
+    try:
+        stats = await warehouse.export()
+        logger.info(f"Analytics warehouse export: {stats}")
+    except Exception as e:
+        logger.error(f"Error exporting analytics warehouse: {e}")
 
 if __name__ == "__main__":
     celery_app.start()
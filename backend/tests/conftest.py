@@ -5,8 +5,13 @@ from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.pool import NullPool
 from main import app
-from database import get_db, Base
+from fastapi import Request
+from database import get_db, Base, begin_unit_of_work, UNIT_OF_WORK
 from config import settings
+from services.catalog_cache import catalog_cache
+from services.dashboard_cache import dashboard_cache
+from services.cache import clear_caches as clear_lookup_caches
+from routers.admin import login_email_limiter, login_ip_limiter
 import os
 from typing import AsyncGenerator
 
@@ -42,6 +47,17 @@ async def setup_db():
     # async with test_engine.begin() as conn:
     #     await conn.run_sync(Base.metadata.drop_all)
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Cached responses must not outlive the rolled-back transaction that produced them,
+    and login throttles must not carry over between tests."""
+    catalog_cache.bump()
+    dashboard_cache.clear()
+    clear_lookup_caches()
+    login_ip_limiter.clear()
+    login_email_limiter.clear()
+    yield
+
 @pytest_asyncio.fixture
 async def db_session() -> AsyncGenerator[AsyncSession, None]:
     """
@@ -70,8 +86,13 @@ async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
     Fixture for the Async HTTP Client.
     Overrides the get_db dependency to use the test session.
     """
-    async def override_get_db():
-        yield db_session
+    async def override_get_db(request: Request):
+        begin_unit_of_work(request, db_session)
+        try:
+            yield db_session
+        finally:
+            # Direct crud calls between requests commit (and invalidate) immediately again
+            db_session.info.pop(UNIT_OF_WORK, None)
 
     app.dependency_overrides[get_db] = override_get_db
     
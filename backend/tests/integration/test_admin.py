@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 import crud
 from auth import get_password_hash
+from config import settings
 from models import User, UserRole
 
 
@@ -44,3 +45,14 @@ async def test_admin_login_returns_token(client: AsyncClient, db_session: AsyncS
     token = payload["access_token"]
     assert isinstance(token, str) and token
     assert payload["token_type"] == "bearer"
+
+
+@pytest.mark.asyncio
+async def test_admin_login_throttles_repeated_attempts_per_email(client: AsyncClient):
+    for _ in range(settings.login_email_burst):
+        response = await client.post("/api/admin/login", json={"email": "target@example.com", "password": "guess"})
+        assert response.status_code == 401
+
+    response = await client.post("/api/admin/login", json={"email": "target@example.com", "password": "guess"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
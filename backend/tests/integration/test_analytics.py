@@ -0,0 +1,161 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from models import Click, ClickRollupHourly, Order, OrderStatus, PaymentType, Product, ProductType, User
+
+
+async def _count_clicks(db_session: AsyncSession, page: str) -> int:
+    result = await db_session.execute(select(func.count(Click.id)).where(Click.page == page))
+    return result.scalar()
+
+
+@pytest.mark.asyncio
+async def test_click_batch_json_array_resolves_user_once(client: AsyncClient, db_session: AsyncSession):
+    telegram_user = {"id": 555001, "username": "batch_user"}
+    db_user = User(telegram_id=str(telegram_user["id"]), username="batch_user", is_active=True)
+    db_session.add(db_user)
+    await db_session.commit()
+
+    events = [{"page": "batch_json", "action": "page_view"} for _ in range(20)]
+    with patch("routers.analytics.verify_telegram_webapp_data", return_value=telegram_user) as verify:
+        response = await client.post(
+            "/api/analytics/clicks/batch",
+            json=events,
+            headers={"X-Telegram-Init-Data": "dummy"},
+        )
+
+    assert response.status_code == 200
+    assert response.json()["count"] == 20
+    assert verify.call_count == 1
+    result = await db_session.execute(select(Click.user_id).where(Click.page == "batch_json").distinct())
+    assert result.scalars().all() == [db_user.id]
+
+
+@pytest.mark.asyncio
+async def test_click_batch_accepts_ndjson_and_beacon_envelope(client: AsyncClient, db_session: AsyncSession):
+    ndjson = "\n".join(json.dumps({"page": "batch_ndjson", "action": "click", "product_id": None}) for _ in range(3))
+    response = await client.post("/api/analytics/clicks/batch", content=ndjson, headers={"Content-Type": "text/plain"})
+    assert response.status_code == 200
+    assert await _count_clicks(db_session, "batch_ndjson") == 3
+
+    beacon = json.dumps({"init_data": "", "events": [{"page": "batch_beacon", "action": "leave", "meta_data": {"t": 1}}]})
+    response = await client.post("/api/analytics/clicks/batch", content=beacon, headers={"Content-Type": "text/plain"})
+    assert response.status_code == 200
+    assert await _count_clicks(db_session, "batch_beacon") == 1
+
+
+@pytest.mark.asyncio
+async def test_click_batch_accepts_single_line_ndjson(client: AsyncClient, db_session: AsyncSession):
+    line = json.dumps({"page": "batch_one_line", "action": "click"}) + "\n"
+    response = await client.post("/api/analytics/clicks/batch", content=line, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert await _count_clicks(db_session, "batch_one_line") == 1
+
+
+@pytest.mark.asyncio
+async def test_click_batch_rejects_invalid_events(client: AsyncClient):
+    response = await client.post("/api/analytics/clicks/batch", json=[{"page": "x"}])
+    assert response.status_code == 422
+
+    response = await client.post("/api/analytics/clicks/batch", content="not json at all")
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_analytics_data_reads_refreshed_rollups(db_session: AsyncSession):
+    await crud.refresh_rollups(db_session, settle_seconds=0)
+    before = await crud.get_analytics_data(db_session)
+    db_session.add_all(
+        [
+            Click(page="metrics", action="page_view", ip_address="10.0.0.1"),
+            Click(page="metrics", action="page_view", ip_address="10.0.0.1"),
+            Click(page="metrics", action="click", ip_address="10.0.0.2"),
+        ]
+    )
+    await db_session.flush()
+    await crud.refresh_rollups(db_session, settle_seconds=0)
+
+    after = await crud.get_analytics_data(db_session)
+    assert after["total_clicks"] - before["total_clicks"] == 3
+    assert after["total_page_views"] - before["total_page_views"] == 2
+    assert after["unique_visitors"] - before["unique_visitors"] <= 2
+    assert len(after["recent_orders"]) <= 10
+
+
+@pytest.mark.asyncio
+async def test_click_rollup_refresh_counts_each_click_once(db_session: AsyncSession):
+    await crud.refresh_rollups(db_session, settle_seconds=0)
+    db_session.add_all([Click(page="rollup_once", action="click") for _ in range(4)])
+    await db_session.flush()
+
+    await crud.refresh_rollups(db_session, settle_seconds=0)
+    await crud.refresh_rollups(db_session, settle_seconds=0)
+
+    result = await db_session.execute(
+        select(func.sum(ClickRollupHourly.clicks)).where(ClickRollupHourly.page == "rollup_once")
+    )
+    assert result.scalar() == 4
+
+
+@pytest.mark.asyncio
+async def test_unique_visitors_estimate_matches_exact_count(db_session: AsyncSession):
+    now = datetime.now(timezone.utc)
+    start, end = now - timedelta(hours=1), now + timedelta(hours=1)
+    visits = [(now, None, f"10.9.{i % 40}.1") for i in range(200)]
+    db_session.add_all([Click(page="hll", action="page_view", ip_address=ip, created_at=at) for at, _, ip in visits])
+    await db_session.flush()
+    await crud.refresh_rollups(db_session, settle_seconds=0)
+
+    exact = await crud.get_unique_visitors(db_session, start, end, exact=True)
+    estimate = await crud.get_unique_visitors(db_session, start, end, exact=False)
+    assert exact["exact"] is True and estimate["exact"] is False
+    assert exact["unique_visitors"] >= 40
+    assert abs(estimate["unique_visitors"] - exact["unique_visitors"]) <= 3 * estimate["relative_error"] * exact["unique_visitors"] + 1
+
+
+@pytest.mark.asyncio
+async def test_funnel_rows_only_count_users_reaching_previous_stage(db_session: AsyncSession):
+    product = Product(name="Funnel course", type=ProductType.COURSE, price=100)
+    users = [User(telegram_id=f"77700{i}", username=f"funnel_{i}") for i in range(3)]
+    db_session.add_all([product, *users])
+    await db_session.flush()
+
+    db_session.add_all([Click(user_id=user.id, page="catalog", action="page_view") for user in users])
+    db_session.add_all([Click(user_id=user.id, product_id=product.id, page="catalog", action="click") for user in users[:2]])
+    db_session.add_all(
+        [
+            Order(user_id=users[0].id, product_id=product.id, status=OrderStatus.PAID,
+                  payment_type=PaymentType.FULL, total_amount=100),
+            # Ordered without clicking the product first: not part of the strict funnel
+            Order(user_id=users[2].id, product_id=product.id, status=OrderStatus.PAID,
+                  payment_type=PaymentType.FULL, total_amount=100),
+        ]
+    )
+    await db_session.flush()
+
+    now = datetime.now(timezone.utc)
+    rows = await crud.get_funnel_rows(db_session, now - timedelta(hours=1), now + timedelta(hours=1), product.id)
+    row = next(row for row in rows if row.product_id == product.id)
+    assert (row.viewed, row.clicked, row.ordered, row.paid) == (3, 2, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_export_rows_stream_by_id_and_version_watermarks(db_session: AsyncSession):
+    db_session.add_all([Click(page="export", action="click") for _ in range(5)])
+    await db_session.flush()
+
+    high_id, high_ts = await crud.get_export_bounds(db_session, Click, settle_seconds=0)
+    streamed = [
+        row
+        async for rows in crud.stream_export_rows(db_session, Click, after_id=high_id - 5, until_id=high_id, batch_size=2)
+        for row in rows
+    ]
+    assert [row["page"] for row in streamed] == ["export"] * 5
+    assert all(row["_version"] <= high_ts for row in streamed)
@@ -0,0 +1,84 @@
+import csv
+import gzip
+import io
+import json
+from decimal import Decimal
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import get_current_admin_user
+from database import get_session_factory
+from main import app
+from models import Click, Order, OrderStatus, PaymentType, Product, ProductType, User
+
+
+class _BorrowedSession:
+    """Lends the test session to the export endpoint without closing it."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def __aenter__(self):
+        return self.session
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def admin_client(client: AsyncClient, db_session: AsyncSession):
+    app.dependency_overrides[get_session_factory] = lambda: (lambda: _BorrowedSession(db_session))
+    app.dependency_overrides[get_current_admin_user] = lambda: User(id=0, username="admin")
+    return client
+
+
+async def _seed_orders(db_session: AsyncSession):
+    product = Product(name="Export course", type=ProductType.COURSE, price=Decimal("50.00"))
+    user = User(telegram_id="880001", username="exporter")
+    db_session.add_all([product, user])
+    await db_session.flush()
+    orders = [
+        Order(user_id=user.id, product_id=product.id, status=status, payment_type=PaymentType.FULL,
+              total_amount=Decimal("50.00"))
+        for status in (OrderStatus.PAID, OrderStatus.PENDING, OrderStatus.PAID)
+    ]
+    db_session.add_all(orders)
+    await db_session.flush()
+    return product, orders
+
+
+@pytest.mark.asyncio
+async def test_export_orders_csv_filters_by_product_and_status(admin_client: AsyncClient, db_session: AsyncSession):
+    product, orders = await _seed_orders(db_session)
+
+    response = await admin_client.get(
+        "/api/admin/export/orders", params={"product_id": product.id, "status": "paid"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["id"]) for row in rows] == [orders[0].id, orders[2].id]
+    assert rows[0]["status"] == "paid"
+    assert rows[0]["product_name"] == "Export course"
+    assert rows[0]["total_amount"] == "50.00"
+
+
+@pytest.mark.asyncio
+async def test_export_clicks_gzipped_ndjson(admin_client: AsyncClient, db_session: AsyncSession):
+    db_session.add_all([Click(page="export_ndjson", action="click", meta_data={"n": i}) for i in range(3)])
+    await db_session.flush()
+
+    response = await admin_client.get("/api/admin/export/clicks", params={"format": "ndjson", "gzip": "true"})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].endswith('.ndjson.gz"')
+    lines = [json.loads(line) for line in gzip.decompress(response.content).decode().splitlines()]
+    exported = [line for line in lines if line["page"] == "export_ndjson"]
+    assert [line["meta_data"] for line in exported] == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+@pytest.mark.asyncio
+async def test_export_rejects_status_for_clicks(admin_client: AsyncClient):
+    response = await admin_client.get("/api/admin/export/clicks", params={"status": "paid"})
+    assert response.status_code == 400
@@ -139,3 +139,26 @@ async def test_create_order_invalid_product(client: AsyncClient, db_session: Asy
         )
     
     assert response.status_code == 500
+
+@pytest.mark.asyncio
+async def test_create_order_creates_new_user_and_refreshes_profile(client: AsyncClient, db_session: AsyncSession):
+    product = await create_product(db_session, ProductCreate(
+        name="Checkout Course",
+        type=ProductType.COURSE,
+        price=Decimal("300.00")
+    ))
+    order_payload = {"product_id": product.id, "payment_type": "full"}
+    telegram_user = {"id": 246810, "username": "first_name_seen", "first_name": "New"}
+
+    with patch("routers.orders.verify_telegram_webapp_data", return_value=telegram_user):
+        first = await client.post("/api/orders/", json=order_payload, headers={"X-Telegram-Init-Data": "dummy"})
+    assert first.status_code == 200
+    assert first.json()["user"]["username"] == "first_name_seen"
+    assert first.json()["product"]["id"] == product.id
+
+    renamed = {**telegram_user, "username": "renamed"}
+    with patch("routers.orders.verify_telegram_webapp_data", return_value=renamed):
+        second = await client.post("/api/orders/", json=order_payload, headers={"X-Telegram-Init-Data": "dummy"})
+    assert second.status_code == 200
+    assert second.json()["user_id"] == first.json()["user_id"]
+    assert second.json()["user"]["username"] == "renamed"
@@ -0,0 +1,43 @@
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from config import settings
+from database import unit_of_work
+from models import OutboxMessage, OutboxStatus
+from services.outbox import OutboxDispatcher
+
+
+@pytest.mark.asyncio
+async def test_messages_are_delivered_only_if_their_transaction_commits():
+    # Committed for real: the dispatcher reads on its own connections
+    engine = create_async_engine(settings.database_url, poolclass=NullPool)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    topic = f"test.{uuid.uuid4().hex[:12]}"
+    handler = AsyncMock()
+    dispatcher = OutboxDispatcher(sessions, batch_size=10)
+    dispatcher.register(topic, handler)
+
+    try:
+        async with unit_of_work(sessions) as db:
+            await dispatcher.publish(db, topic, {"n": 1})
+        with pytest.raises(RuntimeError):
+            async with unit_of_work(sessions) as db:
+                await dispatcher.publish(db, topic, {"n": 2})
+                raise RuntimeError("state change failed")
+
+        await dispatcher.drain()
+
+        handler.assert_awaited_once_with({"n": 1})
+        async with sessions() as db:
+            statuses = (await db.execute(select(OutboxMessage.status).where(OutboxMessage.topic == topic))).scalars().all()
+        assert statuses == [OutboxStatus.DONE]
+    finally:
+        async with sessions() as db:
+            await db.execute(delete(OutboxMessage).where(OutboxMessage.topic == topic))
+            await db.commit()
+        await engine.dispose()
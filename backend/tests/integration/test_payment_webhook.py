@@ -0,0 +1,242 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+import crud
+from config import settings
+from models import (
+    Order, OrderStatus, Payment, PaymentStatus, PaymentType, Product, ProductType, User,
+    OutboxMessage, WebhookEvent, WebhookEventStatus
+)
+from routers.payments import handle_payment_succeeded
+from services.outbox import PAYMENT_SUCCEEDED
+from services.webhook_queue import WebhookQueue
+
+DELIVERIES_PER_PAYMENT = 100
+
+
+@pytest_asyncio.fixture
+async def committed_order():
+    """An order for 300.00 with three pending 100.00 payments, committed so that
+    concurrent connections see it; removed again afterwards."""
+    engine = create_async_engine(settings.database_url, pool_size=20, max_overflow=0)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    tag = uuid.uuid4().hex[:12]
+
+    async with sessions() as db:
+        user = User(telegram_id=f"webhook-{tag}", first_name="Webhook")
+        product = Product(name=f"Webhook course {tag}", type=ProductType.COURSE, price=Decimal("300.00"))
+        db.add_all([user, product])
+        await db.flush()
+        order = Order(
+            user_id=user.id,
+            product_id=product.id,
+            payment_type=PaymentType.INSTALLMENT,
+            total_amount=Decimal("300.00"),
+            installment_months=3
+        )
+        db.add(order)
+        await db.flush()
+        provider_ids = [f"{tag}-{n}" for n in range(3)]
+        db.add_all([
+            Payment(order_id=order.id, amount=Decimal("100.00"), yookassa_payment_id=provider_id,
+                    is_installment=True, installment_number=n + 1)
+            for n, provider_id in enumerate(provider_ids)
+        ])
+        await db.commit()
+        ids = (user.id, product.id, order.id)
+
+    try:
+        yield sessions, ids[2], provider_ids
+    finally:
+        async with sessions() as db:
+            await db.execute(delete(Payment).where(Payment.order_id == ids[2]))
+            await db.execute(delete(Order).where(Order.id == ids[2]))
+            await db.execute(delete(Product).where(Product.id == ids[1]))
+            await db.execute(delete(User).where(User.id == ids[0]))
+            await db.commit()
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_deliveries_apply_each_payment_once(committed_order):
+    sessions, order_id, provider_ids = committed_order
+
+    async def deliver(provider_id: str):
+        async with sessions() as db:
+            return await crud.apply_successful_payment(db, provider_id, payment_method="bank_card")
+
+    deliveries = [deliver(provider_id) for provider_id in provider_ids for _ in range(DELIVERIES_PER_PAYMENT)]
+    results = await asyncio.gather(*deliveries)
+
+    applied = [result for result in results if result is not None]
+    assert len(applied) == len({result.payment_id for result in applied}) == len(provider_ids)
+    assert max(result.paid_amount for result in applied) == Decimal("300.00")
+
+    async with sessions() as db:
+        order = await db.get(Order, order_id)
+        assert order.paid_amount == Decimal("300.00")
+        assert order.status == OrderStatus.PAID
+        statuses = (await db.execute(select(Payment.status).where(Payment.order_id == order_id))).scalars().all()
+        assert statuses == [PaymentStatus.SUCCEEDED] * len(provider_ids)
+
+
+async def _seed_payment(db_session: AsyncSession, provider_id: str) -> Order:
+    user = User(telegram_id=f"webhook-{provider_id}", first_name="Webhook")
+    product = Product(name=f"Webhook {provider_id}", type=ProductType.COURSE, price=Decimal("50.00"))
+    db_session.add_all([user, product])
+    await db_session.flush()
+    order = Order(user_id=user.id, product_id=product.id, payment_type=PaymentType.FULL, total_amount=Decimal("50.00"))
+    db_session.add(order)
+    await db_session.flush()
+    db_session.add(Payment(order_id=order.id, amount=Decimal("50.00"), yookassa_payment_id=provider_id))
+    await db_session.flush()
+    return order
+
+
+async def _notifications(db_session: AsyncSession, order: Order) -> list:
+    payloads = (await db_session.execute(
+        select(OutboxMessage.payload).where(OutboxMessage.topic == PAYMENT_SUCCEEDED)
+    )).scalars().all()
+    return [payload for payload in payloads if payload["order_id"] == order.id]
+
+
+def _succeeded(provider_id: str) -> dict:
+    return {"type": "notification", "event": "payment.succeeded",
+            "object": {"id": provider_id, "payment_method": {"type": "bank_card"}}}
+
+
+@pytest.mark.asyncio
+async def test_webhook_redelivery_is_a_noop(client: AsyncClient, db_session: AsyncSession):
+    order = await _seed_payment(db_session, "redelivered-1")
+
+    with patch("routers.payments.get_payment_adapter") as adapter, \
+            patch("routers.payments.settings.webhook_queue_enabled", False):
+        adapter.return_value.verify_webhook.return_value = True
+        for _ in range(3):
+            response = await client.post("/api/payments/webhook", json=_succeeded("redelivered-1"))
+            assert response.status_code == 200
+
+    await db_session.refresh(order)
+    assert order.paid_amount == Decimal("50.00")
+    assert order.status == OrderStatus.PAID
+    assert await _notifications(db_session, order) == [{"order_id": order.id, "amount": "50.00"}]
+
+
+@pytest.mark.asyncio
+async def test_polled_success_credits_the_order_once_before_the_webhook(client: AsyncClient, db_session: AsyncSession):
+    order = await _seed_payment(db_session, "polled-1")
+    payment = (await db_session.execute(select(Payment).where(Payment.order_id == order.id))).scalar_one()
+
+    with patch("routers.payments.get_payment_adapter") as adapter, \
+            patch("routers.payments.settings.webhook_queue_enabled", False):
+        adapter.return_value.get_payment = AsyncMock(
+            return_value={"id": "polled-1", "status": "succeeded", "payment_method": {"type": "bank_card"}}
+        )
+        adapter.return_value.verify_webhook.return_value = True
+        response = await client.get(f"/api/payments/{payment.id}/status")
+        assert response.status_code == 200
+        assert response.json()["status"] == "succeeded"
+
+        await db_session.refresh(order)
+        assert order.paid_amount == Decimal("50.00")
+        assert order.status == OrderStatus.PAID
+
+        response = await client.post("/api/payments/webhook", json=_succeeded("polled-1"))
+        assert response.status_code == 200
+
+    await db_session.refresh(order)
+    await db_session.refresh(payment)
+    assert payment.status == PaymentStatus.SUCCEEDED
+    assert order.paid_amount == Decimal("50.00")
+    assert await _notifications(db_session, order) == [{"order_id": order.id, "amount": "50.00"}]
+
+
+@pytest.mark.asyncio
+async def test_queued_webhook_is_stored_once_and_processed_by_worker(client: AsyncClient, db_session: AsyncSession):
+    order = await _seed_payment(db_session, "queued-1")
+
+    @asynccontextmanager
+    async def shared_session():
+        yield db_session
+
+    queue = WebhookQueue(lambda: shared_session())
+    queue.register("payment.succeeded", handle_payment_succeeded)
+
+    with patch("routers.payments.get_payment_adapter") as adapter:
+        adapter.return_value.verify_webhook.return_value = True
+        for _ in range(3):
+            response = await client.post("/api/payments/webhook", json=_succeeded("queued-1"))
+            assert response.status_code == 200
+
+        events = (await db_session.execute(
+            select(WebhookEvent).where(WebhookEvent.event_id == "payment.succeeded:queued-1")
+        )).scalars().all()
+        assert len(events) == 1
+        assert events[0].status == WebhookEventStatus.PENDING
+        await db_session.refresh(order)
+        assert order.status == OrderStatus.PENDING
+        assert await _notifications(db_session, order) == []
+
+        assert await queue.run_once() is True
+        assert await queue.run_once() is False
+
+    await db_session.refresh(order)
+    await db_session.refresh(events[0])
+    assert order.status == OrderStatus.PAID
+    assert events[0].status == WebhookEventStatus.DONE
+    assert events[0].attempts == 1
+    assert len(await _notifications(db_session, order)) == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_webhook_event_backs_off_then_fails():
+    # Committed for real: the unit of work rolls back on the handler error
+    engine = create_async_engine(settings.database_url, poolclass=NullPool)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    event_id = f"failing-{uuid.uuid4().hex[:12]}"
+
+    async def broken(db, payload):
+        raise RuntimeError("downstream unavailable")
+
+    queue = WebhookQueue(sessions, max_attempts=2, retry_base=0.0)
+    queue.register("payment.succeeded", broken)
+    try:
+        async with sessions() as db:
+            assert await crud.record_webhook_event(db, event_id, "payment.succeeded", _succeeded(event_id))
+            assert not await crud.record_webhook_event(db, event_id, "payment.succeeded", _succeeded(event_id))
+
+        assert await queue.run_once() is True
+        async with sessions() as db:
+            event = (await db.execute(select(WebhookEvent).where(WebhookEvent.event_id == event_id))).scalar_one()
+        assert event.status == WebhookEventStatus.PENDING
+        assert "downstream unavailable" in event.last_error
+
+        assert await queue.run_once() is True
+        async with sessions() as db:
+            event = (await db.execute(select(WebhookEvent).where(WebhookEvent.event_id == event_id))).scalar_one()
+        assert event.status == WebhookEventStatus.FAILED
+        assert event.attempts == 2
+        assert (queue.retried, queue.failed) == (1, 1)
+    finally:
+        async with sessions() as db:
+            await db.execute(delete(WebhookEvent).where(WebhookEvent.event_id == event_id))
+            await db.commit()
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_bad_signature(client: AsyncClient):
+    with patch("routers.payments.get_payment_adapter") as adapter:
+        adapter.return_value.verify_webhook.return_value = False
+        response = await client.post("/api/payments/webhook", json={"event": "payment.succeeded"})
+    assert response.status_code == 400
@@ -4,9 +4,9 @@ import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from crud import create_product
+from crud import create_product, update_product
 from models import ProductType
-from schemas import ProductCreate
+from schemas import ProductCreate, ProductUpdate
 
 
 @pytest.mark.asyncio
@@ -55,3 +55,56 @@ async def test_get_product_not_found(client: AsyncClient):
     assert response.status_code == 404
     assert response.json()["detail"] == "Product not found"
 
+
+
+@pytest.mark.asyncio
+async def test_get_products_cursor_walks_every_page_once(client: AsyncClient, db_session: AsyncSession):
+    # Same transaction, so every product shares created_at and only the id breaks ties
+    created = [
+        await create_product(db_session, ProductCreate(name=f"Paged {i}", type=ProductType.BOT, price=Decimal("1.00")))
+        for i in range(5)
+    ]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/products/", params=params)
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert {product.id for product in created} <= set(seen)
+    offset_ids = [item["id"] for item in (await client.get("/api/products/", params={"limit": 1000})).json()]
+    assert seen == offset_ids
+
+
+@pytest.mark.asyncio
+async def test_get_products_rejects_malformed_cursor(client: AsyncClient):
+    response = await client.get("/api/products/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_product_etag_revalidation_and_invalidation(client: AsyncClient, db_session: AsyncSession):
+    product = await create_product(
+        db_session,
+        ProductCreate(name="Cached", type=ProductType.BOT, price=Decimal("5.00")),
+    )
+
+    first = await client.get(f"/api/products/{product.id}")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"]
+
+    not_modified = await client.get(f"/api/products/{product.id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    await update_product(db_session, product.id, ProductUpdate(name="Cached v2"))
+    changed = await client.get(f"/api/products/{product.id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["name"] == "Cached v2"
+    assert changed.headers["etag"] != etag
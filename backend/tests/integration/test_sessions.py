@@ -0,0 +1,55 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from unittest.mock import patch
+from models import User
+
+TELEGRAM_USER = {
+    "id": 555000111,
+    "username": "session_user",
+    "first_name": "Session",
+    "last_name": "User"
+}
+
+@pytest.mark.asyncio
+async def test_exchange_creates_user_and_session_skips_init_data(client: AsyncClient, db_session: AsyncSession):
+    with patch("routers.sessions.verify_telegram_webapp_data", return_value=TELEGRAM_USER):
+        response = await client.post("/api/session/telegram", headers={"X-Telegram-Init-Data": "dummy"})
+    assert response.status_code == 200
+    data = response.json()
+
+    result = await db_session.execute(select(User).where(User.telegram_id == str(TELEGRAM_USER["id"])))
+    user = result.scalar_one()
+    assert data["user_id"] == user.id
+    assert user.username == "session_user"
+
+    # No init data at all: the token alone identifies the user
+    with patch("routers.orders.verify_telegram_webapp_data") as verify:
+        response = await client.get("/api/orders/my", headers={"X-Telegram-Session": data["session_token"]})
+    assert response.status_code == 200
+    assert response.json() == []
+    verify.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_exchange_updates_profile_of_existing_user(client: AsyncClient, db_session: AsyncSession):
+    db_session.add(User(telegram_id=str(TELEGRAM_USER["id"]), username="old_name", is_active=True))
+    await db_session.commit()
+
+    with patch("routers.sessions.verify_telegram_webapp_data", return_value=TELEGRAM_USER):
+        response = await client.post("/api/session/telegram", headers={"X-Telegram-Init-Data": "dummy"})
+    assert response.status_code == 200
+
+    result = await db_session.execute(select(User).where(User.telegram_id == str(TELEGRAM_USER["id"])))
+    assert result.scalar_one().username == "session_user"
+
+@pytest.mark.asyncio
+async def test_exchange_rejects_invalid_init_data(client: AsyncClient):
+    with patch("routers.sessions.verify_telegram_webapp_data", return_value=None):
+        response = await client.post("/api/session/telegram", headers={"X-Telegram-Init-Data": "forged"})
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_invalid_session_token_is_rejected(client: AsyncClient):
+    response = await client.get("/api/orders/my", headers={"X-Telegram-Session": "not-a-token"})
+    assert response.status_code == 401
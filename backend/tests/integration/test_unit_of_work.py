@@ -0,0 +1,105 @@
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import List
+from unittest.mock import patch
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import create_session_token, get_current_admin_user
+from main import app
+from models import AdminNotification, Product, ProductType, User
+
+
+@pytest.fixture
+def admin_client(client: AsyncClient):
+    app.dependency_overrides[get_current_admin_user] = lambda: User(id=0, username="admin")
+    return client
+
+
+@contextmanager
+def count_statements(db_session: AsyncSession):
+    """Collects every SQL statement sent to the database while the block runs."""
+    statements: List[str] = []
+    engine = db_session.bind.sync_engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+async def _seed_product(db_session: AsyncSession) -> Product:
+    product = Product(name="UoW course", type=ProductType.COURSE, price=Decimal("10.00"))
+    db_session.add(product)
+    await db_session.flush()
+    return product
+
+
+@pytest.mark.asyncio
+async def test_create_product_is_one_insert(admin_client: AsyncClient, db_session: AsyncSession):
+    payload = {"name": "Counted", "type": "course", "price": "5.00"}
+    with count_statements(db_session) as statements:
+        response = await admin_client.post("/api/products/", json=payload)
+    assert response.status_code == 200
+    assert response.json()["created_at"] is not None
+    assert len(statements) == 1, statements
+
+
+@pytest.mark.asyncio
+async def test_update_and_delete_product_skip_refresh(admin_client: AsyncClient, db_session: AsyncSession):
+    product = await _seed_product(db_session)
+
+    with count_statements(db_session) as statements:
+        response = await admin_client.put(f"/api/products/{product.id}", json={"name": "Renamed"})
+    assert response.status_code == 200
+    assert response.json()["updated_at"] is not None
+    assert len(statements) == 2, statements  # SELECT + UPDATE ... RETURNING
+
+    with count_statements(db_session) as statements:
+        response = await admin_client.delete(f"/api/products/{product.id}")
+    assert response.status_code == 200
+    assert len(statements) == 2, statements
+
+
+@pytest.mark.asyncio
+async def test_mark_notification_read_is_one_update(admin_client: AsyncClient, db_session: AsyncSession):
+    notification = AdminNotification(type="test", title="Hello", message="World")
+    db_session.add(notification)
+    await db_session.flush()
+
+    with count_statements(db_session) as statements:
+        response = await admin_client.put(f"/api/admin/notifications/{notification.id}/read")
+    assert response.status_code == 200
+    assert len(statements) == 1, statements
+
+
+@pytest.mark.asyncio
+async def test_repeat_checkout_is_one_insert(client: AsyncClient, db_session: AsyncSession):
+    product = await _seed_product(db_session)
+    telegram_user = {"id": 13579, "username": "uow_buyer", "first_name": "Uow"}
+    payload = {"product_id": product.id, "payment_type": "full"}
+
+    with patch("routers.orders.verify_telegram_webapp_data", return_value=telegram_user):
+        with count_statements(db_session) as statements:
+            first = await client.post("/api/orders/", json=payload, headers={"X-Telegram-Init-Data": "dummy"})
+        assert first.status_code == 200
+        # Upsert, order INSERT ... SELECT, and the product lookup for the response
+        assert len(statements) == 3, statements
+
+        with count_statements(db_session) as statements:
+            second = await client.post("/api/orders/", json=payload, headers={"X-Telegram-Init-Data": "dummy"})
+    assert second.status_code == 200
+    assert len(statements) == 1, statements
+
+    token = create_session_token(first.json()["user_id"], str(telegram_user["id"]))
+    with count_statements(db_session) as statements:
+        third = await client.post("/api/orders/", json=payload, headers={"X-Telegram-Session": token})
+    assert third.status_code == 200
+    assert len(statements) == 1, statements
@@ -1,11 +1,13 @@
 import hashlib
 import hmac
 import json
+import time
+from datetime import timedelta
 from urllib.parse import quote
 
 import pytest
 
-from auth import create_access_token, get_password_hash, verify_password, verify_telegram_webapp_data, verify_token
+from auth import init_data_memo, create_access_token, create_session_token, verify_session_token, get_password_hash, verify_password, verify_telegram_webapp_data, verify_token
 from config import settings
 
 
@@ -24,17 +26,26 @@ def test_jwt_token_roundtrip():
     assert "exp" in payload
 
 
+def test_session_token_roundtrip():
+    session = verify_session_token(create_session_token(42, "777"))
+    assert session.user_id == 42 and session.telegram_id == "777"
+    assert verify_token(create_session_token(42, "777")).get("sub") is None
+
+
+def test_session_token_rejects_other_tokens():
+    assert verify_session_token(create_access_token({"sub": "42"})) is None
+    assert verify_session_token(create_session_token(42, "777", timedelta(seconds=-1))) is None
+    assert verify_session_token("garbage") is None
+
+
 def test_verify_telegram_webapp_data_returns_none_on_garbage():
     assert verify_telegram_webapp_data("not_a_query_string") is None
     assert verify_telegram_webapp_data("a=b&hash=") is None
 
 
-def test_verify_telegram_webapp_data_valid_signature(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(settings, "telegram_bot_token", "test_bot_token")
-
-    user = {"id": 111, "username": "qa_user", "first_name": "QA", "last_name": "User"}
+def signed_init_data(user: dict, auth_date: str) -> str:
     data = {
-        "auth_date": "1700000000",
+        "auth_date": auth_date,
         "query_id": "AAEAAAE",
         "user": json.dumps(user, separators=(",", ":")),
     }
@@ -42,5 +53,40 @@ def test_verify_telegram_webapp_data_valid_signature(monkeypatch: pytest.MonkeyP
     secret_key = hmac.new(b"WebAppData", settings.telegram_bot_token.encode(), hashlib.sha256).digest()
     signature = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
 
-    init_data = "&".join([f"{quote(k)}={quote(v)}" for k, v in data.items()] + [f"hash={signature}"])
+    return "&".join([f"{quote(k)}={quote(v)}" for k, v in data.items()] + [f"hash={signature}"])
+
+
+def test_verify_telegram_webapp_data_valid_signature(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "telegram_bot_token", "test_bot_token")
+
+    user = {"id": 111, "username": "qa_user", "first_name": "QA", "last_name": "User"}
+    init_data = signed_init_data(user, "1700000000")
     assert verify_telegram_webapp_data(init_data) == user
+
+
+def test_verified_init_data_is_memoized_until_auth_date_expires(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "telegram_bot_token", "test_bot_token")
+    init_data_memo.clear()
+
+    user = {"id": 222, "first_name": "Memo"}
+    fresh = signed_init_data(user, str(int(time.time())))
+    assert verify_telegram_webapp_data(fresh) == user
+    hits = init_data_memo.hits
+    assert verify_telegram_webapp_data(fresh) == user
+    assert init_data_memo.hits == hits + 1
+
+    stale = signed_init_data(user, str(int(time.time()) - init_data_memo.max_age - 1))
+    assert verify_telegram_webapp_data(stale) == user
+    assert verify_telegram_webapp_data(stale) == user
+    assert init_data_memo.hits == hits + 1
+
+    # A memoized entry is bound to the bot token that verified it
+    monkeypatch.setattr(settings, "telegram_bot_token", "rotated_token")
+    assert verify_telegram_webapp_data(fresh) is None
+
+
+def test_verify_telegram_webapp_data_rejects_tampered_user(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "telegram_bot_token", "test_bot_token")
+
+    init_data = signed_init_data({"id": 333}, str(int(time.time())))
+    assert verify_telegram_webapp_data(init_data.replace("333", "334")) is None
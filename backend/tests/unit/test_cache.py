@@ -0,0 +1,190 @@
+import asyncio
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+import models
+from services.cache import LocalTier, ModelCodec, TwoTierCache, cached
+
+
+class CountingLoader:
+    def __init__(self, product_id=1, delay: float = 0.01):
+        self.calls = 0
+        self.product_id = product_id
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.product_id is None:
+            return None
+        return models.Product(id=self.product_id, name=f"Product {self.calls}", price=10)
+
+
+def make_cache(**kwargs) -> TwoTierCache:
+    return TwoTierCache("product", models.Product, ttl=kwargs.pop("ttl", 60), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    cache = make_cache()
+    loader = CountingLoader()
+
+    results = await asyncio.gather(*(cache.get(1, loader) for _ in range(10)))
+    assert loader.calls == 1
+    assert {product.name for product in results} == {"Product 1"}
+    # Every caller gets its own detached instance
+    assert len({id(product) for product in results}) == 10
+
+    assert (await cache.get(1, loader)).name == "Product 1"
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["l1_hits"] == 1 and stats["size"] == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_rows_are_not_cached():
+    cache = make_cache()
+    loader = CountingLoader(product_id=None)
+
+    assert await cache.get(1, loader) is None
+    assert await cache.get(1, loader) is None
+    assert loader.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_evicts_every_key_for_the_row():
+    cache = make_cache()
+    loader = CountingLoader(product_id=7)
+
+    await cache.get(7, loader)
+    await cache.get("sku-7", loader)
+    assert cache.stats()["size"] == 2
+
+    await cache.invalidate(7)
+    assert cache.stats()["size"] == 0
+    assert (await cache.get(7, loader)).name == "Product 3"
+
+
+@pytest.mark.asyncio
+async def test_load_racing_with_invalidation_is_not_stored():
+    cache = make_cache()
+    loader = CountingLoader(delay=0.05)
+
+    pending = asyncio.create_task(cache.get(1, loader))
+    await asyncio.sleep(0.01)
+    cache.invalidate_local(1)
+    await pending
+
+    assert cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_loader_errors_reach_every_waiter_and_are_not_cached():
+    cache = make_cache()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(*(cache.get(1, failing) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert (await cache.get(1, CountingLoader())).name == "Product 1"
+
+
+def test_local_tier_evicts_least_recently_used():
+    tier = LocalTier(max_entries=2)
+    tier.set("a", b"a", 60, ("t:a",))
+    tier.set("b", b"b", 60, ("t:b",))
+    tier.get("a")
+    tier.set("c", b"c", 60, ("t:c",))
+
+    assert tier.get("b") is None
+    assert tier.get("a") == b"a" and tier.get("c") == b"c"
+    assert tier.evictions == 1
+    assert tier.invalidate_tag("t:b") == 0
+
+
+def test_local_tier_expires_entries():
+    tier = LocalTier(max_entries=10)
+    tier.set("a", b"a", -1, ())
+    assert tier.get("a") is None
+    assert len(tier) == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_decorator_keys_on_named_argument():
+    cache = make_cache()
+    calls = []
+
+    @cached(cache, key="product_id")
+    async def get_product(db, product_id):
+        calls.append(product_id)
+        return models.Product(id=product_id, name="Cached", price=1)
+
+    await get_product(None, 1)
+    await get_product(None, product_id=1)
+    await get_product(None, 2)
+    assert calls == [1, 2]
+
+    await get_product.uncached(None, 1)
+    assert calls == [1, 2, 1]
+
+
+class FakeRedisTier:
+    """Dict-backed stand-in for RedisTier, shared between two caches like two workers."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, namespace, key):
+        return self.values.get((namespace, key))
+
+    async def set(self, namespace, key, raw, ttl, tags):
+        self.values[(namespace, key)] = raw
+
+    async def invalidate_tag(self, namespace, tag):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_row_promoted_from_redis_is_evicted_by_invalidate_local():
+    remote = FakeRedisTier()
+    worker_a, worker_b = make_cache(remote=remote), make_cache(remote=remote)
+    loader = CountingLoader()
+    await worker_a.get(1, loader)
+
+    assert (await worker_b.get(1, loader)).name == "Product 1"
+    assert worker_b.stats()["l2_hits"] == 1
+    assert worker_b.peek(1) is not None
+
+    worker_b.invalidate_local(1)
+    assert worker_b.peek(1) is None
+
+
+def test_codec_round_trips_columns_through_json():
+    product = models.Product(
+        id=3, name="Course", type=models.ProductType.COURSE, price=Decimal("19.90"),
+        features=["video", "chat"], is_active=True, created_at=datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+    )
+    codec = ModelCodec(models.Product)
+    raw = codec.encode(product)
+    assert raw.startswith(b"{")
+
+    copy = codec.decode(raw)
+    assert copy.type is models.ProductType.COURSE
+    assert copy.price == Decimal("19.90")
+    assert copy.features == ["video", "chat"]
+    assert copy.created_at == product.created_at
+    assert copy.installment_price is None
+
+
+@pytest.mark.asyncio
+async def test_unreadable_redis_entry_is_a_miss():
+    remote = FakeRedisTier()
+    remote.values[("product", 1)] = b"\x80\x05not json"
+    cache = make_cache(remote=remote)
+    loader = CountingLoader()
+
+    assert (await cache.get(1, loader)).name == "Product 1"
+    assert loader.calls == 1
@@ -0,0 +1,31 @@
+from starlette.requests import Request
+
+from services.catalog_cache import CatalogCache
+
+
+def _request(if_none_match=None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_respond_returns_304_for_matching_etags():
+    cache = CatalogCache()
+    entry = cache.put("list", b'[{"id":1}]', cache.version)
+
+    assert cache.respond(_request(), entry).status_code == 200
+    assert cache.respond(_request(entry.etag), entry).status_code == 304
+    assert cache.respond(_request(f'"other", W/{entry.etag}'), entry).status_code == 304
+    assert cache.respond(_request('"other"'), entry).status_code == 200
+
+
+def test_put_ignores_bodies_computed_before_a_bump():
+    cache = CatalogCache()
+    version = cache.version
+    cache.bump()  # an admin write lands while the body was being built
+    cache.put("list", b"[]", version)
+    assert cache.get("list") is None
+
+    cache.put("list", b"[]", cache.version)
+    assert cache.get("list") is not None
+    cache.bump()
+    assert cache.get("list") is None
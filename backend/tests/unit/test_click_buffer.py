@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+import crud
+from services.click_buffer import ClickBuffer
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture
+def written(monkeypatch: pytest.MonkeyPatch):
+    batches = []
+
+    async def fake_bulk(db, rows):
+        batches.append(list(rows))
+        return len(rows)
+
+    async def fake_user_ids(db, telegram_ids):
+        return {telegram_id: int(telegram_id) * 10 for telegram_id in telegram_ids}
+
+    monkeypatch.setattr(crud, "create_clicks_bulk", fake_bulk)
+    monkeypatch.setattr(crud, "get_user_ids_by_telegram_ids", fake_user_ids)
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_click_buffer_flushes_in_batches_and_drains_on_stop(written):
+    buffer = ClickBuffer(FakeSession, max_size=100, batch_size=3, flush_interval=60)
+    await buffer.start()
+    for i in range(7):
+        assert await buffer.put(page="home", action="page_view", telegram_id="5" if i == 0 else None)
+    await asyncio.sleep(0.05)
+    await buffer.stop()
+
+    assert [len(batch) for batch in written] == [3, 3, 1]
+    assert written[0][0]["user_id"] == 50
+    assert "telegram_id" not in written[0][0]
+    assert buffer.flushed == 7
+
+
+@pytest.mark.asyncio
+async def test_click_buffer_flushes_on_interval(written):
+    buffer = ClickBuffer(FakeSession, max_size=100, batch_size=100, flush_interval=0.01)
+    await buffer.start()
+    await buffer.put(page="home", action="page_view")
+    await asyncio.sleep(0.1)
+    assert [len(batch) for batch in written] == [1]
+    await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_click_buffer_rejects_when_full(written, monkeypatch: pytest.MonkeyPatch):
+    release = asyncio.Event()
+
+    async def slow_bulk(db, rows):
+        await release.wait()
+        written.append(list(rows))
+        return len(rows)
+
+    monkeypatch.setattr(crud, "create_clicks_bulk", slow_bulk)
+    buffer = ClickBuffer(FakeSession, max_size=2, batch_size=1, flush_interval=60, put_timeout=0.01)
+    await buffer.start()
+    assert await buffer.put(page="home", action="click")
+    await asyncio.sleep(0.01)  # first event is now stuck in the blocked flush
+
+    results = [await buffer.put(page="home", action="click") for _ in range(3)]
+    assert results == [True, True, False]
+    assert buffer.dropped == 1
+
+    release.set()
+    await buffer.stop()
+    assert buffer.flushed == 3
+
+
+@pytest.mark.asyncio
+async def test_click_buffer_drops_only_the_rows_that_fail(written, monkeypatch: pytest.MonkeyPatch):
+    async def strict_bulk(db, rows):
+        if any(row["product_id"] == 404 for row in rows):
+            raise IntegrityError("INSERT INTO clicks", {}, Exception("violates foreign key constraint clicks_product_id_fkey"))
+        written.append(list(rows))
+        return len(rows)
+
+    monkeypatch.setattr(crud, "create_clicks_bulk", strict_bulk)
+    buffer = ClickBuffer(FakeSession, max_size=100, batch_size=100, flush_interval=60)
+    await buffer.start()
+    for product_id in [1, 2, 404, 3, 4, 5, 404, 6]:
+        assert await buffer.put(page="catalog", action="view", product_id=product_id)
+    await buffer.stop()
+
+    assert sorted(row["product_id"] for batch in written for row in batch) == [1, 2, 3, 4, 5, 6]
+    assert (buffer.flushed, buffer.dropped) == (6, 2)
+
+
+@pytest.mark.asyncio
+async def test_click_buffer_keeps_the_batch_while_the_database_is_down(written, monkeypatch: pytest.MonkeyPatch):
+    calls = []
+
+    async def flaky_bulk(db, rows):
+        calls.append(len(rows))
+        if len(calls) <= 2:
+            raise OperationalError("INSERT INTO clicks", {}, Exception("connection refused"))
+        written.append(list(rows))
+        return len(rows)
+
+    monkeypatch.setattr(crud, "create_clicks_bulk", flaky_bulk)
+    buffer = ClickBuffer(FakeSession, max_size=100, batch_size=100, flush_interval=0.01, retry_base=0.01)
+    await buffer.start()
+    for _ in range(8):
+        assert await buffer.put(page="catalog", action="view")
+    for _ in range(100):
+        if written:
+            break
+        await asyncio.sleep(0.01)
+    await buffer.stop()
+
+    assert calls == [8, 8, 8]  # retried whole, never split
+    assert (buffer.flushed, buffer.dropped) == (8, 0)
@@ -0,0 +1,89 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services.dashboard_cache import SnapshotCache, dashboard_cache
+from services.invalidation import MemoryBackend, invalidation_bus
+from services.rollups import RollupRefresher
+
+
+class CountingLoader:
+    def __init__(self, delay: float = 0.01):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.delay)
+        return call
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_computation():
+    cache = SnapshotCache(ttl=60, refresh_ahead=0)
+    loader = CountingLoader()
+
+    results = await asyncio.gather(*(cache.get("dashboard", loader) for _ in range(10)))
+    assert results == [1] * 10
+    assert loader.calls == 1
+    assert await cache.get("dashboard", loader) == 1
+    assert cache.misses == 10 and cache.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_mark_stale_forces_recompute_even_during_a_load():
+    cache = SnapshotCache(ttl=60, refresh_ahead=0)
+    loader = CountingLoader(delay=0.05)
+
+    first = asyncio.create_task(cache.get("dashboard", loader))
+    await asyncio.sleep(0.01)
+    cache.mark_stale()  # a write lands while the first snapshot is being computed
+    second = await cache.get("dashboard", loader)
+    assert await first == 1
+    assert second == 2
+    assert await cache.get("dashboard", loader) == 2
+
+
+@pytest.mark.asyncio
+async def test_refresh_ahead_serves_cached_value_and_reloads_in_background():
+    cache = SnapshotCache(ttl=60, refresh_ahead=60)
+    loader = CountingLoader()
+
+    assert await cache.get("dashboard", loader) == 1
+    assert await cache.get("dashboard", loader) == 1  # served immediately, refresh scheduled
+    await asyncio.sleep(0.05)
+    assert loader.calls == 2
+    assert await cache.get("dashboard", loader) == 2
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_load_is_not_cached():
+    cache = SnapshotCache(ttl=60, refresh_ahead=0)
+
+    async def broken():
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get("dashboard", broken)
+    assert await cache.get("dashboard", CountingLoader()) == 1
+
+
+@pytest.mark.asyncio
+async def test_rollup_refresh_with_new_data_marks_dashboard_stale(monkeypatch: pytest.MonkeyPatch):
+    session = MagicMock(commit=AsyncMock())
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+    refresher = RollupRefresher(lambda: session)
+    monkeypatch.setattr(invalidation_bus, "backend", MemoryBackend())
+
+    with patch("services.rollups.crud.refresh_rollups", AsyncMock(return_value={"clicks": 0, "order_buckets": 0})):
+        generation = dashboard_cache.generation
+        await refresher.run_once()
+        assert dashboard_cache.generation == generation
+
+    with patch("services.rollups.crud.refresh_rollups", AsyncMock(return_value={"clicks": 3, "order_buckets": 0})):
+        await refresher.run_once()
+        assert dashboard_cache.generation == generation + 1
@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from services.funnel import FunnelCache, build_funnel
+
+
+def _row(product_id, viewed, clicked, ordered, paid, name=None):
+    return SimpleNamespace(
+        product_id=product_id, product_name=name, viewed=viewed, clicked=clicked, ordered=ordered, paid=paid
+    )
+
+
+def test_build_funnel_computes_step_rates_and_totals():
+    now = datetime.now(timezone.utc)
+    rows = [
+        _row(1, 100, 40, 10, 5, "Basic"),
+        _row(2, 50, 0, 0, 0, "Pro"),
+        _row(None, 120, 40, 10, 5),
+    ]
+    funnel = build_funnel(now - timedelta(days=1), now, rows)
+
+    assert funnel["totals"]["viewed"] == 120
+    assert funnel["totals"]["overall_rate"] == round(5 / 120 * 100, 2)
+    basic, pro = funnel["products"]
+    assert (basic["product_id"], basic["click_rate"], basic["order_rate"], basic["payment_rate"]) == (1, 40.0, 25.0, 50.0)
+    assert pro["order_rate"] == 0.0 and pro["payment_rate"] == 0.0
+
+
+def test_build_funnel_without_rows_is_all_zero():
+    now = datetime.now(timezone.utc)
+    funnel = build_funnel(now, now, [])
+    assert funnel["products"] == []
+    assert funnel["totals"]["paid"] == 0 and funnel["totals"]["overall_rate"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_funnel_cache_shares_concurrent_computation():
+    cache = FunnelCache(max_entries=2, open_ttl=60, closed_ttl=3600, settle_seconds=0)
+    end = datetime.now(timezone.utc) - timedelta(hours=1)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"calls": calls}
+
+    results = await asyncio.gather(*(cache.get_or_compute(("a",), end, compute) for _ in range(5)))
+    assert calls == 1
+    assert all(result == {"calls": 1} for result in results)
+    assert await cache.get_or_compute(("a",), end, compute) == {"calls": 1}
+    assert cache.ttl_for(end) == 3600
+    assert cache.ttl_for(datetime.now(timezone.utc) + timedelta(hours=1)) == 60
+
+    await cache.get_or_compute(("b",), end, compute)
+    await cache.get_or_compute(("c",), end, compute)
+    assert cache.get(("a",)) is None
@@ -0,0 +1,37 @@
+import pytest
+
+from services.hyperloglog import HyperLogLog
+
+
+@pytest.mark.parametrize("n", [0, 1, 50, 5000, 50000])
+def test_hyperloglog_estimate_within_error_bound(n: int):
+    sketch = HyperLogLog()
+    sketch.update(f"u:{i}" for i in range(n))
+    assert abs(sketch.count() - n) <= max(1, 3 * sketch.relative_error * n)
+
+
+def test_hyperloglog_merge_equals_union_and_is_idempotent():
+    a = HyperLogLog()
+    a.update(f"ip:{i}" for i in range(3000))
+    b = HyperLogLog()
+    b.update(f"ip:{i}" for i in range(1500, 6000))
+    union = HyperLogLog()
+    union.update(f"ip:{i}" for i in range(6000))
+
+    merged = HyperLogLog.from_bytes(a.to_bytes()).merge(b)
+    assert merged.count() == union.count()
+
+    a.update(f"ip:{i}" for i in range(3000))
+    assert a.count() == HyperLogLog.from_bytes(a.to_bytes()).count()
+
+
+def test_hyperloglog_serialization_is_compact_for_sparse_sketches():
+    sketch = HyperLogLog()
+    sketch.update(f"u:{i}" for i in range(10))
+    assert len(sketch.to_bytes()) < 200
+    assert HyperLogLog.from_bytes(sketch.to_bytes()).count() == sketch.count()
+
+
+def test_hyperloglog_rejects_mismatched_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=12).merge(HyperLogLog(precision=10))
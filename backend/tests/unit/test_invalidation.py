@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from services.invalidation import (
+    ORDER_CHANGED,
+    PRODUCT_CHANGED,
+    InvalidationBus,
+    InvalidationEvent,
+    MemoryBackend,
+)
+
+
+async def _wait_for(condition, timeout: float = 1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.asyncio
+async def test_events_reach_other_workers_once():
+    backend = MemoryBackend()
+    worker_a, worker_b = InvalidationBus(backend), InvalidationBus(backend)
+    seen_a, seen_b = [], []
+    worker_a.subscribe(PRODUCT_CHANGED, seen_a.append)
+    worker_b.subscribe(PRODUCT_CHANGED, seen_b.append)
+    for bus in (worker_a, worker_b):
+        await bus.start()
+    await _wait_for(lambda: worker_a.connected and worker_b.connected)
+    seen_a.clear(), seen_b.clear()  # drop the flush done on connect
+
+    worker_a.publish(PRODUCT_CHANGED, 7)
+    await _wait_for(lambda: seen_b)
+    assert seen_a == [InvalidationEvent(PRODUCT_CHANGED, 7)]
+    assert seen_b == [InvalidationEvent(PRODUCT_CHANGED, 7)]
+
+    for bus in (worker_a, worker_b):
+        await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_publish_without_running_bus_is_local_only():
+    bus = InvalidationBus(MemoryBackend())
+    seen = []
+    bus.subscribe(ORDER_CHANGED, seen.append)
+    bus.publish(ORDER_CHANGED, 1)
+    assert seen == [InvalidationEvent(ORDER_CHANGED, 1)]
+
+
+@pytest.mark.asyncio
+async def test_handlers_are_flushed_periodically_while_backend_is_down():
+    class DownBackend:
+        async def connect(self):
+            raise ConnectionError("redis is down")
+
+    bus = InvalidationBus(DownBackend(), fallback_ttl=0.01)
+    seen = []
+    bus.subscribe(PRODUCT_CHANGED, seen.append)
+    await bus.start()
+    await _wait_for(lambda: len(seen) >= 2)
+    await bus.stop()
+    assert set(seen) == {InvalidationEvent(PRODUCT_CHANGED)}
+    assert not bus.connected
+
+
+def test_subscribe_rejects_unknown_events():
+    with pytest.raises(ValueError):
+        InvalidationBus(MemoryBackend()).subscribe("everything_changed", print)
+
+
+@pytest.mark.asyncio
+async def test_peers_flush_everything_after_a_dropped_publish():
+    backend = MemoryBackend()
+    worker_a, worker_b = InvalidationBus(backend), InvalidationBus(backend)
+    seen_b = []
+    worker_b.subscribe(PRODUCT_CHANGED, seen_b.append)
+    worker_b.subscribe(ORDER_CHANGED, seen_b.append)
+    for bus in (worker_a, worker_b):
+        await bus.start()
+    await _wait_for(lambda: worker_a.connected and worker_b.connected)
+
+    connection, worker_a._connection = worker_a._connection, None  # as if Redis just went away
+    worker_a.publish(PRODUCT_CHANGED, 7)
+    await _wait_for(lambda: worker_a.dropped == 1)
+    seen_b.clear()
+
+    worker_a._connection = connection
+    worker_a.publish(ORDER_CHANGED, 1)
+    await _wait_for(lambda: InvalidationEvent(ORDER_CHANGED, 1) in seen_b)
+    assert InvalidationEvent(PRODUCT_CHANGED) in seen_b  # the flush-all covers the lost event
+
+    for bus in (worker_a, worker_b):
+        await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_workers_from_a_process_without_the_bus():
+    backend = MemoryBackend()
+    task_bus, worker = InvalidationBus(backend), InvalidationBus(backend)
+    seen_task, seen_worker = [], []
+    task_bus.subscribe(ORDER_CHANGED, seen_task.append)
+    worker.subscribe(ORDER_CHANGED, seen_worker.append)
+    await worker.start()
+    await _wait_for(lambda: worker.connected)
+    seen_worker.clear()
+
+    await task_bus.broadcast(ORDER_CHANGED, 3)
+    await _wait_for(lambda: seen_worker)
+    assert seen_task == seen_worker == [InvalidationEvent(ORDER_CHANGED, 3)]
+    await worker.stop()
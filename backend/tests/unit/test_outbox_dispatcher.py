@@ -0,0 +1,89 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services.outbox import OutboxDispatcher
+
+
+def _dispatcher(**kwargs) -> OutboxDispatcher:
+    session = MagicMock(info={})
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+
+    @asynccontextmanager
+    async def factory():
+        yield session
+
+    return OutboxDispatcher(factory, **kwargs)
+
+
+def _message(message_id: int, topic: str = "test.topic", attempts: int = 1):
+    return SimpleNamespace(id=message_id, topic=topic, payload={"n": message_id}, attempts=attempts)
+
+
+@pytest.mark.asyncio
+async def test_batch_is_delivered_concurrently_within_the_limit():
+    dispatcher = _dispatcher(batch_size=10, concurrency=3)
+    in_flight = 0
+    peak = 0
+
+    async def slow(payload):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    dispatcher.register("test.topic", slow)
+    with patch("services.outbox.crud") as crud:
+        crud.claim_outbox_messages = AsyncMock(return_value=[_message(n) for n in range(8)])
+        crud.complete_outbox_messages = AsyncMock()
+        crud.retry_outbox_message = AsyncMock()
+        assert await dispatcher.run_once() == 8
+        assert crud.claim_outbox_messages.await_args.kwargs["topics"] == ["test.topic"]
+
+    assert peak == 3
+    crud.complete_outbox_messages.assert_awaited_once()
+    assert crud.complete_outbox_messages.await_args.args[1] == list(range(8))
+    crud.retry_outbox_message.assert_not_awaited()
+    assert dispatcher.delivered == 8
+
+
+@pytest.mark.asyncio
+async def test_failures_are_rescheduled_or_given_up():
+    dispatcher = _dispatcher(max_attempts=3, retry_base=1.0, retry_max=10.0)
+    dispatcher.register("test.topic", AsyncMock(side_effect=lambda payload: None if payload["n"] == 1 else 1 / 0))
+
+    with patch("services.outbox.crud") as crud:
+        crud.claim_outbox_messages = AsyncMock(return_value=[
+            _message(1),
+            _message(2, attempts=1),
+            _message(3, attempts=3),
+        ])
+        crud.complete_outbox_messages = AsyncMock()
+        crud.retry_outbox_message = AsyncMock()
+        await dispatcher.run_once()
+
+    assert crud.complete_outbox_messages.await_args.args[1] == [1]
+    delays = {call.args[1]: call.args[3] for call in crud.retry_outbox_message.await_args_list}
+    assert 0.5 <= delays[2] <= 1.0
+    assert delays[3] is None
+    assert (dispatcher.delivered, dispatcher.retried, dispatcher.failed) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_drain_stops_after_a_short_batch():
+    dispatcher = _dispatcher(batch_size=2)
+    dispatcher.register("test.topic", AsyncMock())
+
+    with patch("services.outbox.crud") as crud:
+        crud.claim_outbox_messages = AsyncMock(side_effect=[
+            [_message(1), _message(2)],
+            [_message(3)],
+        ])
+        crud.complete_outbox_messages = AsyncMock()
+        assert await dispatcher.drain() == 3
+    assert crud.claim_outbox_messages.await_count == 2
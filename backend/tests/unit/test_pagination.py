@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_roundtrip_keeps_timezone_and_id():
+    created_at = datetime(2024, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", "bm9waXBl", encode_cursor(datetime.now(timezone.utc), 1)[:-3]])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+import pytest
+
+from auth import PasswordPool, PasswordPoolBusy
+from services.rate_limit import KeyedRateLimiter, TokenBucket
+
+
+def test_token_bucket_allows_burst_then_refills():
+    bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+    assert [bucket.try_acquire(now=0.0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.retry_after(now=0.0) == pytest.approx(0.5)
+    assert bucket.try_acquire(now=0.5) is True
+    assert bucket.try_acquire(now=100.0) is True
+    assert bucket.tokens == pytest.approx(2.0)  # capped at capacity before the take
+
+
+def test_keyed_limiter_isolates_keys_and_bounds_memory():
+    limiter = KeyedRateLimiter(rate=1.0, capacity=1, max_keys=2)
+    assert limiter.allow("10.0.0.1", now=0.0) is True
+    assert limiter.allow("10.0.0.1", now=0.0) is False
+    assert limiter.allow("10.0.0.2", now=0.0) is True
+    assert limiter.rejected == 1
+
+    limiter.allow("10.0.0.3", now=0.0)
+    assert len(limiter._buckets) == 2
+    assert limiter.retry_after("10.0.0.3", now=0.0) == pytest.approx(1.0)
+
+
+@pytest.mark.asyncio
+async def test_password_pool_runs_off_loop_and_rejects_when_saturated():
+    pool = PasswordPool(workers=1, max_pending=1)
+    release = threading.Event()
+    try:
+        first = asyncio.create_task(pool.run(release.wait, 5))
+        await asyncio.sleep(0.01)
+        with pytest.raises(PasswordPoolBusy):
+            await pool.run(lambda: True)
+        assert pool.rejected == 1
+
+        release.set()
+        assert await first is True
+        assert await pool.run(threading.current_thread) is not threading.main_thread()
+    finally:
+        release.set()
+        pool.shutdown()
@@ -62,3 +62,40 @@ async def test_payment_adapter_create_payment_failure():
             await service.create_payment(100.00, "Test", "url")
         
         assert "Payment creation failed" in str(excinfo.value)
+
+@pytest.mark.asyncio
+async def test_payment_adapter_reuses_one_pooled_connection():
+    from aiohttp import web
+    from services import payment_adapter as payment_adapter_module
+
+    client_ports = set()
+
+    async def get_intent(request):
+        client_ports.add(request.transport.get_extra_info("peername")[1])
+        return web.json_response({"id": request.match_info["payment_id"], "status": "succeeded"})
+
+    app = web.Application()
+    app.router.add_get("/payment_intents/{payment_id}", get_intent)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    with patch.object(settings, "payment_api_key", "sk_test", create=True), \
+            patch.object(payment_adapter_module, "_payment_adapter", None):
+        adapter = payment_adapter_module.get_payment_adapter()
+        assert payment_adapter_module.get_payment_adapter() is adapter
+        adapter.base_url = f"http://127.0.0.1:{port}"
+        try:
+            for n in range(5):
+                assert (await adapter.get_payment(f"pi_{n}"))["id"] == f"pi_{n}"
+            session = adapter.http()
+            assert session.connector.limit_per_host == settings.payment_http_pool_size_per_host
+            assert session.timeout.connect == settings.payment_http_connect_timeout
+        finally:
+            await payment_adapter_module.close_payment_adapter()
+            await runner.cleanup()
+
+    assert session.closed
+    assert len(client_ports) == 1
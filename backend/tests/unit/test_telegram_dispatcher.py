@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import List, Optional
+
+import pytest
+
+from services.telegram_service import INSTALLMENT_OVERDUE, SendResult, TelegramDispatcher
+
+
+class FakeBotApi:
+    """Stands in for TelegramService.post_message and records what was sent."""
+
+    def __init__(self, responses: Optional[List[SendResult]] = None):
+        self.responses = list(responses or [])
+        self.sent: List[tuple] = []
+
+    def __call__(self):
+        return self
+
+    async def post_message(self, chat_id: str, text: str, parse_mode: str = "HTML") -> SendResult:
+        self.sent.append((time.monotonic(), chat_id, text))
+        return self.responses.pop(0) if self.responses else SendResult(True)
+
+
+@pytest.mark.asyncio
+async def test_burst_of_one_kind_goes_out_as_a_digest():
+    api = FakeBotApi()
+    dispatcher = TelegramDispatcher(api, coalesce_window=0.01, digest_max_lines=5)
+
+    results = await asyncio.gather(*(
+        dispatcher.send("admin", f"Order #{n} overdue", kind=INSTALLMENT_OVERDUE, summary=f"#{n}")
+        for n in range(37)
+    ))
+
+    assert all(results)
+    assert len(api.sent) == 1
+    text = api.sent[0][2]
+    assert text.startswith("⚠️ <b>37 installment payments overdue</b>")
+    assert "#4" in text and "#5" not in text
+    assert text.endswith("…and 32 more")
+    assert (dispatcher.sent, dispatcher.coalesced) == (1, 36)
+
+
+@pytest.mark.asyncio
+async def test_single_notification_is_sent_unchanged():
+    api = FakeBotApi()
+    dispatcher = TelegramDispatcher(api, coalesce_window=0.01)
+
+    assert await dispatcher.send("admin", "Order #1 overdue", kind=INSTALLMENT_OVERDUE, summary="#1")
+    assert [text for _, _, text in api.sent] == ["Order #1 overdue"]
+
+
+@pytest.mark.asyncio
+async def test_chat_bucket_spaces_out_messages():
+    api = FakeBotApi()
+    dispatcher = TelegramDispatcher(api, chat_rate=20.0, chat_burst=2)
+
+    assert all(await asyncio.gather(*(dispatcher.send("admin", f"m{n}") for n in range(3))))
+    assert all(await asyncio.gather(dispatcher.send("other", "x"), dispatcher.send("other", "y")))
+
+    admin_times = [sent_at for sent_at, chat_id, _ in api.sent if chat_id == "admin"]
+    assert admin_times[2] - admin_times[0] >= 0.04  # the third waits ~1/20 s for a token
+    assert len(api.sent) == 5
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_the_chat_and_resends():
+    api = FakeBotApi([SendResult(False, retry_after=0.05)])
+    dispatcher = TelegramDispatcher(api)
+
+    assert await dispatcher.send("admin", "hello")
+    assert len(api.sent) == 2
+    assert api.sent[1][0] - api.sent[0][0] >= 0.05
+    assert dispatcher.rate_limited == 1
+
+
+@pytest.mark.asyncio
+async def test_gives_up_on_errors_and_after_max_attempts():
+    api = FakeBotApi([SendResult(False)])
+    dispatcher = TelegramDispatcher(api)
+    assert await dispatcher.send("admin", "boom") is False
+    assert len(api.sent) == 1
+
+    api = FakeBotApi([SendResult(False, retry_after=0.0)] * 3)
+    dispatcher = TelegramDispatcher(api, max_attempts=3)
+    assert await dispatcher.send("admin", "throttled") is False
+    assert len(api.sent) == 3
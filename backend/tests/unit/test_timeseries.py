@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from services import timeseries
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_build_timeseries_fills_gaps_and_compares_previous_period():
+    clicks = [(utc(2024, 3, 1), 10), (utc(2024, 3, 2), 100), (utc(2024, 3, 5), 50), (utc(2024, 2, 25), 40)]
+    orders = [(utc(2024, 3, 2), 5, 500.0), (utc(2024, 2, 26), 1, 100.0)]
+
+    result = timeseries.build_timeseries(utc(2024, 3, 1, 10, 30), utc(2024, 3, 8), "day", 3, clicks, orders)
+
+    assert len(result["buckets"]) == 7
+    assert result["buckets"][0] == utc(2024, 3, 1)
+    assert result["clicks"] == [10, 100, 0, 0, 50, 0, 0]
+    assert result["paid_orders"] == [0, 5, 0, 0, 0, 0, 0]
+    assert result["conversion_rate"][1] == 5.0
+    assert result["clicks_delta"][:3] == [0, 90, -100]
+    assert result["totals"]["clicks"] == 160
+    assert result["previous_totals"] == {"revenue": 100.0, "paid_orders": 1, "clicks": 40, "conversion_rate": 2.5}
+    assert result["change_percent"]["revenue"] == 400.0
+
+
+def test_weekly_buckets_start_on_monday():
+    start, end = utc(2024, 3, 6, 5), utc(2024, 3, 30)
+    assert timeseries.truncate(start, "week") == utc(2024, 3, 4)
+    assert timeseries.bucket_count(start, end, "week") == 4
+    assert timeseries.previous_period_start(start, end, "week") == utc(2024, 2, 5)
+
+
+def test_moving_average_uses_partial_leading_windows():
+    values = np.array([3.0, 6.0, 9.0, 0.0])
+    assert timeseries.moving_average(values, 2).tolist() == [3.0, 4.5, 7.5, 4.5]
+    assert timeseries.moving_average(values, 1).tolist() == values.tolist()
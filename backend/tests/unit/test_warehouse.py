@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+import models
+from services.warehouse import TABLES, Manifest, PartitionedParquetWriter, Warehouse, WarehouseUnavailable
+
+NOW = datetime.now(timezone.utc)
+
+
+def _click(click_id: int, days_ago: int):
+    created_at = NOW - timedelta(days=days_ago)
+    return {
+        "id": click_id, "user_id": click_id % 3 or None, "product_id": None, "page": "home",
+        "action": "page_view" if click_id % 2 else "click", "meta_data": {"n": click_id},
+        "ip_address": f"10.0.0.{click_id % 5}", "user_agent": None, "created_at": created_at, "_version": created_at,
+    }
+
+
+def _order(order_id: int, status: models.OrderStatus, version_offset: int, paid_amount: str = "0"):
+    return {
+        "id": order_id, "user_id": 1, "product_id": 7, "status": status, "payment_type": models.PaymentType.FULL,
+        "total_amount": Decimal("10.50"), "paid_amount": Decimal(paid_amount), "installment_months": None,
+        "next_payment_date": None, "created_at": NOW, "updated_at": None,
+        "_version": NOW + timedelta(seconds=version_offset),
+    }
+
+
+def _payment(payment_id: int):
+    return {
+        "id": payment_id, "order_id": 1, "yookassa_payment_id": f"p{payment_id}", "amount": Decimal("10.50"),
+        "status": models.PaymentStatus.SUCCEEDED, "payment_method": "bank_card", "confirmation_url": None,
+        "is_installment": False, "installment_number": None, "created_at": NOW, "updated_at": None, "_version": NOW,
+    }
+
+
+def _export(tmp_path, manifest: Manifest, name: str, rows):
+    writer = PartitionedParquetWriter(tmp_path, name, TABLES[name][0])
+    writer.write(rows)
+    manifest.table(name)["files"].extend(writer.close())
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    manifest = Manifest.load(tmp_path / "manifest.json")
+    _export(tmp_path, manifest, "clicks", [_click(i, i % 4) for i in range(1, 41)])
+    _export(tmp_path, manifest, "clicks", [_click(i, 3) for i in range(41, 51)])
+    # Order 2 is an installment order with its first part paid
+    _export(tmp_path, manifest, "orders", [_order(1, models.OrderStatus.PENDING, 0), _order(2, models.OrderStatus.PENDING, 0, "3.50")])
+    # A later export of order 1 after it was paid supersedes the pending version
+    _export(tmp_path, manifest, "orders", [_order(1, models.OrderStatus.PAID, 5, "10.50")])
+    _export(tmp_path, manifest, "payments", [_payment(1)])
+    manifest.save()
+    return manifest
+
+
+@pytest.mark.asyncio
+async def test_report_reads_latest_row_versions(tmp_path, snapshot):
+    report = await Warehouse(str(tmp_path)).report(NOW - timedelta(days=7), NOW + timedelta(days=1))
+
+    assert sum(day["clicks"] for day in report["daily"]) == 50
+    assert sum(day["orders"] for day in report["daily"]) == 2
+    # Revenue is paid_amount, as on the dashboard, so partial installments count
+    assert sum(day["revenue"] for day in report["daily"]) == Decimal("14.00")
+    assert report["top_products"] == [{"product_id": 7, "orders": 2, "paid_orders": 1, "revenue": Decimal("14.00")}]
+    assert report["payment_methods"][0]["succeeded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_compaction_merges_settled_partitions_without_changing_results(tmp_path, snapshot):
+    warehouse = Warehouse(str(tmp_path), compact_after_days=2)
+    before = await warehouse.report(NOW - timedelta(days=7), NOW + timedelta(days=1))
+
+    assert warehouse._compact(snapshot) == 1
+    three_days_ago = (NOW - timedelta(days=3)).date().isoformat()
+    assert len([f for f in snapshot.files("clicks") if f"day={three_days_ago}" in f]) == 1
+    assert len(snapshot.retired) == 2
+
+    after = await warehouse.report(NOW - timedelta(days=7), NOW + timedelta(days=1))
+    assert after["daily"] == before["daily"]
+    # Replaced files are removed on the following run
+    warehouse._compact(Manifest.load(tmp_path / "manifest.json"))
+    assert not any((tmp_path / f).exists() for f in snapshot.retired)
+
+
+@pytest.mark.asyncio
+async def test_report_requires_an_export(tmp_path):
+    with pytest.raises(WarehouseUnavailable):
+        await Warehouse(str(tmp_path)).report(NOW - timedelta(days=1), NOW)
+
+
+@pytest.mark.asyncio
+async def test_export_is_skipped_while_another_run_holds_the_lock(tmp_path):
+    import fcntl
+
+    with open(tmp_path / ".lock", "a") as held:
+        fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert await Warehouse(str(tmp_path)).export() is None
@@ -0,0 +1,82 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from database import AFTER_COMMIT
+from services.webhook_queue import WebhookQueue, retry_delay
+
+
+def test_retry_delay_doubles_with_jitter_and_caps():
+    for attempt, ceiling in [(1, 2.0), (2, 4.0), (3, 8.0), (20, 60.0)]:
+        delays = [retry_delay(attempt, base=2.0, maximum=60.0) for _ in range(50)]
+        assert all(ceiling / 2 <= delay <= ceiling for delay in delays)
+
+
+def _queue(**kwargs) -> WebhookQueue:
+    session = MagicMock(info={})
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+
+    @asynccontextmanager
+    async def factory():
+        yield session
+
+    return WebhookQueue(factory, **kwargs)
+
+
+def _event(attempts: int = 1):
+    return SimpleNamespace(id=7, event_id="payment.succeeded:abc", event_type="payment.succeeded",
+                           payload={"object": {"id": "abc"}}, attempts=attempts)
+
+
+@pytest.mark.asyncio
+async def test_enqueue_wakes_idle_workers_after_commit():
+    queue = _queue(workers=2, poll_interval=60.0)
+    handler = AsyncMock()
+    queue.register("payment.succeeded", handler)
+    request_session = MagicMock(info={})
+
+    with patch("services.webhook_queue.crud") as crud:
+        claims = [[]] * 2 + [[_event()]]
+        crud.claim_webhook_events = AsyncMock(side_effect=lambda *a, **kw: claims.pop(0) if claims else [])
+        crud.complete_webhook_event = AsyncMock()
+        crud.record_webhook_event = AsyncMock(return_value=True)
+        await queue.start()
+        try:
+            await asyncio.sleep(0.05)  # both workers are now idle until the poll interval
+            assert await queue.enqueue(request_session, "payment.succeeded:abc", "payment.succeeded", {}) is True
+            for callback in request_session.info.pop(AFTER_COMMIT):
+                await callback()
+
+            async def processed():
+                while queue.processed < 1:
+                    await asyncio.sleep(0.01)
+            await asyncio.wait_for(processed(), 1.0)
+        finally:
+            await queue.stop()
+
+    handler.assert_awaited_once()
+    crud.complete_webhook_event.assert_awaited_once()
+    assert not queue.running
+
+
+@pytest.mark.asyncio
+async def test_failed_event_is_retried_until_max_attempts():
+    queue = _queue(max_attempts=3, retry_base=1.0, retry_max=10.0)
+    queue.register("payment.succeeded", AsyncMock(side_effect=RuntimeError("boom")))
+
+    with patch("services.webhook_queue.crud") as crud:
+        crud.retry_webhook_event = AsyncMock()
+        crud.claim_webhook_events = AsyncMock(return_value=[_event(attempts=2)])
+        assert await queue.run_once() is True
+        delay = crud.retry_webhook_event.await_args.args[3]
+        assert 1.0 <= delay <= 2.0
+
+        crud.claim_webhook_events = AsyncMock(return_value=[_event(attempts=3)])
+        assert await queue.run_once() is True
+        assert crud.retry_webhook_event.await_args.args[3] is None
+
+    assert (queue.processed, queue.retried, queue.failed) == (0, 1, 1)